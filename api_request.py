@@ -1,64 +1,282 @@
 import requests
+import codecs
+import contextlib
 import json
 import re
+import sys
 import time
 from datetime import datetime
-from dotenv import load_dotenv
-import os
+from capture_store import configure_captures, get_capture_store
+from identity_resolver import get_resolver
+from metrics import metrics
+from output_sinks import DEFAULT_OUTPUT_FILE, build_sinks
+from resilience import CircuitOpenError, ClientSnapshot
+from simpat_loader import get_directory
+from unifi_config import get_config
+from unifi_records import ClientRecord
+from unifi_session import get_session_manager
 
-# Cargar variables de entorno
-load_dotenv()
+SIMPAT_USERS_FILE = 'simpat_users.json'
+# Vínculos MAC → usuario aprendidos por el resolvedor de identidad
+SIMPAT_BINDINGS_FILE = 'simpat_bindings.json'
 
-# Obtener configuración desde variables de entorno
-UNIFI_URL = os.getenv('UNIFI_URL')
-USERNAME = os.getenv('UNIFI_USERNAME')
-PASSWORD = os.getenv('UNIFI_PASSWORD')
+# Endpoint JSON con la lista de estaciones (clientes) conectadas
+CLIENTS_API_PATH = '/api/s/{site}/stat/sta'
+# Página SPA de clientes, solo se usa como respaldo
+CLIENTS_HTML_PATH = '/network/{site}/clients/main'
 
-# Asegurar que la URL tenga el esquema https:// y puerto correcto
-if UNIFI_URL and not UNIFI_URL.startswith(('http://', 'https://')):
-    UNIFI_URL = f'https://{UNIFI_URL}'
+def load_simpat_directory():
+    """
+    Retorna el directorio compartido de usuarios Simpat (recargado si el archivo cambió)
+    """
+    return get_directory(SIMPAT_USERS_FILE)
 
-# Asegurar que tenga el puerto 8443 si no se especifica puerto
-if UNIFI_URL and ':8443' not in UNIFI_URL and ':443' not in UNIFI_URL and ':80' not in UNIFI_URL:
-    UNIFI_URL = f'{UNIFI_URL}:8443'
+def load_identity_resolver():
+    """
+    Retorna el resolvedor de identidad compartido (vínculos MAC → usuario)
+    """
+    return get_resolver(SIMPAT_BINDINGS_FILE)
 
 def load_simpat_ips():
     """
-    Carga las IPs de usuarios Simpat desde el archivo JSON
+    Retorna las IPs de usuarios Simpat ({ip: {hostname, userID}}) desde el directorio
+    compartido; el archivo JSON solo se vuelve a parsear si cambió
     """
-    simpat_ips = {}
+    return get_directory(SIMPAT_USERS_FILE).simpat_ips
+
+def iter_json_array_items(chunks, key='data'):
+    """
+    Decodifica de forma incremental los elementos del arreglo `key` de una respuesta JSON.
+    Recibe los fragmentos (bytes) de la respuesta y produce cada elemento en cuanto
+    está completo, sin esperar a tener el cuerpo entero en memoria.
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder('utf-8')()
+    marker = re.compile(r'"%s"\s*:\s*\[' % re.escape(key))
+    chunks = iter(chunks)
+    buffer = ''
+    pos = None  # Posición actual dentro del arreglo, None hasta encontrarlo
+    finished = False
     
-    try:
-        with open('simpat_users.json', 'r', encoding='utf-8') as f:
-            data = json.load(f)
+    while True:
+        if pos is None:
+            match = marker.search(buffer)
+            if match:
+                pos = match.end()
         
-        if 'users' in data:
-            for user in data['users']:
-                ip = user.get('ip')
-                hostname = user.get('hostname')
-                user_id = user.get('userID')
+        if pos is not None:
+            # Saltar separadores entre elementos
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+                pos += 1
+            
+            if pos < len(buffer):
+                if buffer[pos] == ']':
+                    return
+                try:
+                    item, end = decoder.raw_decode(buffer, pos)
+                except ValueError:
+                    end = None  # Elemento incompleto, hace falta leer más
                 
-                if ip:
-                    simpat_ips[ip] = {
-                        'hostname': hostname,
-                        'userID': user_id
-                    }
+                # Un valor que termina justo al final del buffer puede estar truncado
+                if end is not None and (end < len(buffer) or finished):
+                    yield item
+                    pos = end
+                    continue
         
-        print(f"📂 Cargados {len(simpat_ips)} usuarios de Simpat")
-        return simpat_ips
+        if finished:
+            if pos is None:
+                raise ValueError(f'La respuesta no contiene el arreglo "{key}"')
+            raise ValueError(f'Arreglo "{key}" incompleto en la respuesta')
         
-    except FileNotFoundError:
-        print("⚠️ Archivo simpat_users.json no encontrado")
-        return {}
+        try:
+            chunk = next(chunks)
+        except StopIteration:
+            finished = True
+            chunk = b''
+        
+        # Descartar lo ya consumido antes de anexar el nuevo fragmento
+        if pos is not None:
+            buffer = buffer[pos:]
+            pos = 0
+        buffer += utf8.decode(chunk, final=finished)
+
+def _progress(quiet):
+    """
+    Función para los mensajes de progreso: print, o nada con `quiet`.
+    Los errores y advertencias se imprimen siempre.
+    """
+    return _silent if quiet else print
+
+def _silent(*args, **kwargs):
+    pass
+
+def _metered_chunks(chunks, source, wait, deadline=None):
+    """
+    Cuenta los bytes recibidos y acumula en wait[0] el tiempo esperando a la red;
+    con `deadline` (time.monotonic) corta la descarga al vencer el plazo
+    """
+    chunks = iter(chunks)
+    while True:
+        started = time.perf_counter()
+        try:
+            chunk = next(chunks)
+        except StopIteration:
+            return
+        finally:
+            wait[0] += time.perf_counter() - started
+        metrics.inc('bytes_received', len(chunk), source=source)
+        if deadline is not None and time.monotonic() >= deadline:
+            raise requests.Timeout('Se agotó el plazo leyendo la respuesta')
+        yield chunk
+
+def _captured_chunks(chunks, raw):
+    """
+    Copia en `raw` los fragmentos que pasan hacia el parser
+    """
+    for chunk in chunks:
+        raw += chunk
+        yield chunk
+
+def fetch_clients_json(manager, site=None, timeout=None, deadline=None, quiet=False):
+    """
+    Obtiene la lista de clientes conectados desde la API JSON de UniFi (stat/sta).
+    Sin `site` se usa UNIFI_SITE; sin `timeout`, los timeouts (conexión, lectura) del gestor de sesión.
+    Con `deadline` (time.monotonic) login, reintentos y descarga quedan dentro de ese plazo.
+    Con `quiet` no se imprime el progreso.
+    Con capturas activadas la respuesta se guarda aunque no sea 200 o el cuerpo llegue
+    truncado: son justamente las que hace falta reproducir.
+    """
+    site = site or get_config().site
+    path = CLIENTS_API_PATH.format(site=site)
+    captures = get_capture_store()
+    raw = bytearray()
+    status = None
+    error = None
+    try:
+        with metrics.timer('fetch', source='json'):
+            # El circuito cuenta como falla un corte o un cuerpo truncado durante la lectura
+            with manager.stream(path, timeout=timeout, deadline=deadline) as response:
+                status = response.status_code
+                if status != 200:
+                    if captures:
+                        raw += response.content
+                    print(f"❌ Error accediendo a la API de clientes: {status}")
+                    metrics.inc('errors', stage='fetch_json')
+                    return None
+                
+                # La decodificación se intercala con la descarga: el parseo es el tiempo que no se espera a la red
+                wait = [0.0]
+                started = time.perf_counter()
+                chunks = _metered_chunks(response.iter_content(chunk_size=65536), 'json', wait, deadline)
+                if captures:
+                    chunks = _captured_chunks(chunks, raw)
+                clients = list(iter_json_array_items(chunks))
+                # El parseo termina en el "]": leer el resto para cerrar el cuerpo completo
+                for _ in chunks:
+                    pass
+                metrics.observe('parse', time.perf_counter() - started - wait[0], strategy='json_stream')
     except Exception as e:
-        print(f"❌ Error cargando simpat_users.json: {e}")
-        return {}
+        error = f'{type(e).__name__}: {e}'
+        raise
+    finally:
+        if captures and status is not None:
+            captures.save(bytes(raw), kind='json', source=path, status=status, error=error)
+    
+    _progress(quiet)(f"✅ API de clientes accesible ({len(clients)} estaciones)")
+    return clients
 
-def scrape_unifi_clients():
+def scrape_clients_html(manager, site=None, quiet=False):
     """
-    Realiza web scraping de la interfaz web de UniFi para obtener clientes conectados
+    Respaldo: descarga la página de clientes de UniFi y extrae los datos del HTML.
+    Con `quiet` no se imprime el progreso.
     """
-    if not UNIFI_URL or not USERNAME or not PASSWORD:
+    say = _progress(quiet)
+    site = site or get_config().site
+    path = CLIENTS_HTML_PATH.format(site=site)
+    say("🔍 Accediendo a la página de clientes...")
+    with metrics.timer('fetch', source='html'):
+        response = manager.get(path)
+        content = response.content
+    metrics.inc('bytes_received', len(content), source='html')
+    
+    # Guardar respuesta para análisis, también las de error (solo con capturas activadas;
+    # idénticas se guardan una vez)
+    captures = get_capture_store()
+    if captures:
+        digest = captures.save(content, kind='html', source=path, status=response.status_code)
+        if digest:
+            print(f"📄 Respuesta capturada: {digest[:12]} (python capture_store.py replay {digest[:12]})")
+    
+    if response.status_code != 200:
+        print(f"❌ Error accediendo a clientes: {response.status_code}")
+        metrics.inc('errors', stage='fetch_html')
+        return None
+    
+    say("✅ Página de clientes accesible")
+    say(f"📊 Tamaño: {len(response.text)} caracteres")
+    
+    # Buscar datos de clientes en el HTML
+    say("🔍 Buscando datos de clientes en el HTML...")
+    clients = extract_clients_from_html(response.text)
+    
+    if not clients:
+        print("⚠️ No se encontraron clientes en el HTML")
+        metrics.inc('errors', stage='parse')
+        print("📄 Primeros 1000 caracteres de la respuesta:")
+        print("-" * 60)
+        print(response.text[:1000])
+    
+    return clients
+
+def match_simpat_clients(records, directory, resolver=None):
+    """
+    Filtra los clientes que pertenecen a un usuario de Simpat y los enlaza a su SimpatUser.
+    Con `resolver` se identifican por MAC (con la IP como respaldo); sin él, solo por IP.
+    """
+    if resolver is not None:
+        return resolver.resolve(records, directory)
+    
+    users_by_ip = directory.by_ip_int
+    simpat_clients = []
+    
+    for record in records:
+        user = users_by_ip.get(record.ip_int) if record.ip_int else None
+        if user is not None:
+            record.simpat_user = user
+            simpat_clients.append(record)
+    
+    return simpat_clients
+
+# Último sondeo bueno del proceso; se sirve (marcado como viejo) mientras el circuito esté abierto
+_last_good = None
+
+def stale_snapshot(manager, paths):
+    """
+    Copia del último sondeo bueno marcada como vieja, si algún circuito de `paths` está abierto
+    """
+    if _last_good is None or not any(manager.circuit_open(path) for path in paths):
+        return None
+    
+    metrics.inc('stale_snapshots')
+    fetched_at = datetime.fromtimestamp(_last_good.fetched_at).strftime('%H:%M:%S')
+    print(f"⚠️ Controlador no disponible: se sirven los {len(_last_good)} clientes del sondeo de las "
+          f"{fetched_at} (datos viejos)")
+    return _last_good.as_stale()
+
+def collect_simpat_clients(mode='json', quiet=False):
+    """
+    Obtiene los clientes conectados de UniFi y filtra los usuarios de Simpat.
+    mode='json' consulta la API stat/sta y usa el HTML solo como respaldo;
+    mode='html' fuerza el scraping de la interfaz web.
+    Retorna un ClientSnapshot con los clientes de Simpat o None si la consulta falla.
+    Mientras el circuito del controlador esté abierto retorna el último snapshot
+    bueno con `stale=True`. Con `quiet` solo se imprimen errores y advertencias.
+    """
+    global _last_good
+    say = _progress(quiet)
+    
+    config = get_config()
+    if not config.complete:
         print("❌ Error: Faltan variables de entorno")
         print("💡 Asegúrate de tener en tu archivo .env:")
         print("   UNIFI_URL=https://tu_ip:8443")
@@ -66,216 +284,258 @@ def scrape_unifi_clients():
         print("   UNIFI_PASSWORD=tu_contraseña")
         return None
     
-    session = requests.Session()
-    session.verify = False  # Deshabilitar verificación SSL para desarrollo
+    # Sesión compartida: reutiliza la cookie en caché y las conexiones keep-alive
+    manager = get_session_manager(config.url, config.username, config.password)
+    paths = [CLIENTS_HTML_PATH.format(site=config.site)]
+    if mode == 'json':
+        paths.append(CLIENTS_API_PATH.format(site=config.site))
     
+    started = time.perf_counter()
     try:
-        print(f"🌐 Conectando a UniFi: {UNIFI_URL}")
+        say(f"🌐 Conectando a UniFi: {config.url}")
         
-        # Paso 1: Autenticación
-        print("🔐 Autenticándose...")
-        login_url = f'{UNIFI_URL}/api/auth/login'
-        login_data = {
-            'username': USERNAME,
-            'password': PASSWORD
-        }
-        
-        login_response = session.post(login_url, json=login_data, timeout=10)
-        
-        if login_response.status_code != 200:
-            print(f"❌ Error de autenticación: {login_response.status_code}")
+        # Paso 1: Autenticación (solo si no hay sesión válida en caché)
+        if not manager.ensure_authenticated():
             return None
         
-        print("✅ Autenticación exitosa")
-        
-        # Paso 2: Obtener la página principal de clientes
-        print("🔍 Accediendo a la página de clientes...")
-        clients_url = f'{UNIFI_URL}/network/default/clients/main'
-        
-        # Esperar 5 segundos antes del scraping
-        print("⏳ Esperando 5 segundos para que la página se cargue completamente...")
-        time.sleep(5)
-        
-        response = session.get(clients_url, timeout=10)
-        
-        if response.status_code != 200:
-            print(f"❌ Error accediendo a clientes: {response.status_code}")
-            return None
-        
-        print("✅ Página de clientes accesible")
-        
-        # Paso 3: Guardar respuesta para análisis
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        html_filename = f"unifi_response_{timestamp}.html"
-        
-        with open(html_filename, 'w', encoding='utf-8') as f:
-            f.write(response.text)
+        # Paso 2: Obtener clientes desde la API JSON (o HTML como respaldo)
+        clients = None
+        if mode == 'json':
+            say("🔍 Consultando API de clientes...")
+            try:
+                clients = fetch_clients_json(manager, quiet=quiet)
+            except (requests.RequestException, ValueError, CircuitOpenError) as e:
+                print(f"⚠️ Error leyendo la API de clientes: {e}")
+                metrics.inc('errors', stage='fetch_json')
+                clients = None
+            
+            if clients is None:
+                print("↩️ Usando scraping HTML como respaldo...")
         
-        print(f"📄 Respuesta guardada en: {html_filename}")
-        print(f"📊 Tamaño: {len(response.text)} caracteres")
+        if clients is None:
+            clients = scrape_clients_html(manager, quiet=quiet)
+            if not clients:
+                return stale_snapshot(manager, paths)
         
-        # Paso 4: Buscar datos de clientes en el HTML
-        print("🔍 Buscando datos de clientes en el HTML...")
-        clients = extract_clients_from_html(response.text)
+        say(f"✅ Encontrados {len(clients)} clientes")
+        metrics.inc('clients_found', len(clients))
         
-        if not clients:
-            print("⚠️ No se encontraron clientes en el HTML")
-            print("📄 Primeros 1000 caracteres de la respuesta:")
-            print("-" * 60)
-            print(response.text[:1000])
-            return None
+        # Paso 3: Filtrar clientes de Simpat
+        with metrics.timer('parse', strategy='records'):
+            records = [ClientRecord.from_api(client, site=config.site, controller=config.url) for client in clients]
+        with metrics.timer('match'):
+            simpat_clients = match_simpat_clients(records, load_simpat_directory(), load_identity_resolver())
+        metrics.inc('matches', len(simpat_clients))
         
-        print(f"✅ Encontrados {len(clients)} clientes")
+        say(f"🎯 Clientes de Simpat encontrados: {len(simpat_clients)}")
         
-        # Paso 5: Filtrar clientes de Simpat
-        simpat_ips = load_simpat_ips()
-        simpat_clients = []
+        _last_good = ClientSnapshot(simpat_clients)
+        return _last_good
         
-        for client in clients:
-            client_ip = client.get('ip') or client.get('ip_address')
-            if client_ip in simpat_ips:
-                client['simpat_user'] = simpat_ips[client_ip]
-                simpat_clients.append(client)
+    except Exception as e:
+        print(f"❌ Error durante el scraping: {e}")
+        metrics.inc('errors', stage='poll')
+        return stale_snapshot(manager, paths)
+    finally:
+        metrics.observe('poll', time.perf_counter() - started)
+
+def scrape_unifi_clients(mode='json', output=DEFAULT_OUTPUT_FILE, quiet=False):
+    """
+    Consulta única: obtiene los clientes de Simpat conectados y los envía a las salidas.
+    Con `output="-"` stdout queda reservado para los registros NDJSON y con `quiet` no
+    se escribe nada en él: en ambos casos el progreso y los errores van a stderr.
+    """
+    stdout = sys.stdout
+    diagnostics = contextlib.redirect_stdout(sys.stderr) if output == '-' or quiet else contextlib.nullcontext()
+    with diagnostics:
+        simpat_clients = collect_simpat_clients(mode=mode)
         
-        print(f"🎯 Clientes de Simpat encontrados: {len(simpat_clients)}")
+        if simpat_clients is not None:
+            with metrics.timer('output'):
+                display_results(simpat_clients, output=output, quiet=quiet, stdout=stdout)
         
-        # Paso 6: Mostrar resultados
-        display_results(simpat_clients)
+        metrics.end_poll(mode=mode, ok=simpat_clients is not None,
+                         stale=bool(simpat_clients is not None and simpat_clients.stale))
+    
+    return simpat_clients
+
+# Marcadores del estado embebido en la página. Cada uno termina justo antes del
+# valor JSON, que se decodifica con raw_decode desde esa posición.
+EMBEDDED_STATE_RE = re.compile(
+    r'window\.__INITIAL_STATE__\s*=\s*(?=\{)'
+    r'|window\.__DATA__\s*=\s*(?=\{)'
+    r'|var\s+clients\s*=\s*(?=\[)'
+    r'|(?<!")clients:\s*(?=\[)'
+    r'|"clients":\s*(?=\[)'
+    r'|"devices":\s*(?=\[)',
+    re.IGNORECASE
+)
+# Etiquetas de tabla relevantes (<tr>, </tr>, <td>), recorridas en una sola pasada
+TABLE_TAG_RE = re.compile(r'<(/?)(tr|td)\b[^>]*>', re.IGNORECASE)
+IP_RE = re.compile(r'\b(?:[0-9]{1,3}\.){3}[0-9]{1,3}\b')
+IGNORED_IP_PREFIXES = ('127.', '169.254.', '224.', '255.')
+# Cada JSON inválido cuesta O(posición) al armar el error; se acota el número de
+# intentos fallidos para que el peor caso siga siendo lineal en el tamaño de la página
+MAX_EMBEDDED_DECODE_FAILURES = 32
+
+_json_decoder = json.JSONDecoder()
+
+def _clients_from_json_value(data):
+    """
+    Obtiene la lista de clientes de un valor JSON embebido (lista o dict contenedor)
+    """
+    if isinstance(data, list):
+        return data
+    if isinstance(data, dict):
+        for key in ['clients', 'data', 'items', 'devices']:
+            if key in data and isinstance(data[key], list):
+                return data[key]
+    return []
+
+def extract_embedded_clients(html_content):
+    """
+    Busca el estado JSON embebido en una sola pasada lineal sobre el HTML
+    """
+    pos = 0
+    failures = 0
+    while failures < MAX_EMBEDDED_DECODE_FAILURES:
+        match = EMBEDDED_STATE_RE.search(html_content, pos)
+        if not match:
+            break
         
-        return simpat_clients
+        try:
+            data, end = _json_decoder.raw_decode(html_content, match.end())
+        except ValueError:
+            failures += 1
+            pos = match.end()
+            continue
         
-    except Exception as e:
-        print(f"❌ Error durante el scraping: {e}")
-        return None
-    finally:
-        session.close()
+        clients = _clients_from_json_value(data)
+        if clients:
+            return clients
+        # Los marcadores dentro de un valor ya decodificado no se vuelven a analizar
+        pos = end
+    
+    return []
 
-def extract_clients_from_html(html_content):
+def extract_table_clients(html_content):
     """
-    Extrae datos de clientes del HTML usando múltiples estrategias
+    Extrae clientes de filas de tabla (nombre, IP, estado en las tres primeras celdas)
     """
     clients = []
+    cells = None
     
-    print("🔍 Estrategia 1: Buscando JSON embebido...")
-    # Estrategia 1: Buscar JSON embebido en scripts
-    json_patterns = [
-        r'window\.__INITIAL_STATE__\s*=\s*({.*?});',
-        r'window\.__DATA__\s*=\s*({.*?});',
-        r'var\s+clients\s*=\s*(\[.*?\]);',
-        r'clients:\s*(\[.*?\])',
-        r'"clients":\s*(\[.*?\])',
-        r'"devices":\s*(\[.*?\])',
-    ]
+    for match in TABLE_TAG_RE.finditer(html_content):
+        closing, tag = match.group(1), match.group(2).lower()
+        
+        if tag == 'tr':
+            if not closing:
+                cells = []
+            elif cells is not None:
+                if len(cells) >= 3:
+                    clients.append({
+                        'name': cells[0],
+                        'ip': cells[1],
+                        'status': cells[2]
+                    })
+                cells = None
+        elif not closing and cells is not None and len(cells) < 3:
+            # Solo cuentan celdas con texto plano seguido directamente de </td>
+            text_end = html_content.find('<', match.end())
+            if text_end > match.end() and html_content[text_end:text_end + 5].lower() == '</td>':
+                text = html_content[match.end():text_end].strip()
+                if text:
+                    cells.append(text)
     
-    for pattern in json_patterns:
-        matches = re.findall(pattern, html_content, re.DOTALL | re.IGNORECASE)
-        for match in matches:
-            try:
-                data = json.loads(match)
-                if isinstance(data, list):
-                    clients.extend(data)
-                elif isinstance(data, dict):
-                    for key in ['clients', 'data', 'items', 'devices']:
-                        if key in data and isinstance(data[key], list):
-                            clients.extend(data[key])
-                            break
-                
-                if clients:
-                    print(f"✅ Encontrados {len(clients)} clientes en JSON embebido")
-                    return clients
-            except:
-                continue
+    return clients
+
+def extract_ip_clients(html_content):
+    """
+    Crea clientes básicos a partir de las IPs que aparecen en el texto
+    """
+    unique_ips = dict.fromkeys(IP_RE.findall(html_content))
+    # Filtrar IPs comunes del sistema
+    return [
+        {
+            'ip': ip,
+            'name': f'Dispositivo-{ip.split(".")[-1]}',
+            'status': 'unknown'
+        }
+        for ip in unique_ips if not ip.startswith(IGNORED_IP_PREFIXES)
+    ]
+
+def extract_clients_from_html(html_content):
+    """
+    Extrae datos de clientes del HTML usando múltiples estrategias.
+    Cada estrategia es una pasada lineal con patrones precompilados; las
+    siguientes solo se ejecutan si la anterior no encontró clientes.
+    """
+    print("🔍 Estrategia 1: Buscando JSON embebido...")
+    with metrics.timer('parse', strategy='embedded'):
+        clients = extract_embedded_clients(html_content)
+    if clients:
+        print(f"✅ Encontrados {len(clients)} clientes en JSON embebido")
+        return clients
     
     print("🔍 Estrategia 2: Buscando en tablas HTML...")
-    # Estrategia 2: Buscar en tablas HTML
-    table_pattern = r'<tr[^>]*>.*?<td[^>]*>([^<]+)</td>.*?<td[^>]*>([^<]+)</td>.*?<td[^>]*>([^<]+)</td>.*?</tr>'
-    table_matches = re.findall(table_pattern, html_content, re.DOTALL | re.IGNORECASE)
-    
-    for match in table_matches:
-        if len(match) >= 3:
-            client = {
-                'name': match[0].strip(),
-                'ip': match[1].strip(),
-                'status': match[2].strip()
-            }
-            clients.append(client)
-    
+    with metrics.timer('parse', strategy='table'):
+        clients = extract_table_clients(html_content)
     if clients:
         print(f"✅ Encontrados {len(clients)} clientes en tablas HTML")
         return clients
     
     print("🔍 Estrategia 3: Buscando IPs en el texto...")
-    # Estrategia 3: Buscar IPs directamente en el texto
-    ip_pattern = r'\b(?:[0-9]{1,3}\.){3}[0-9]{1,3}\b'
-    ip_matches = re.findall(ip_pattern, html_content)
-    
-    unique_ips = list(set(ip_matches))
-    # Filtrar IPs comunes del sistema
-    filtered_ips = [ip for ip in unique_ips if not ip.startswith(('127.', '169.254.', '224.', '255.'))]
-    
-    if filtered_ips:
-        print(f"🔍 Encontradas {len(filtered_ips)} IPs únicas: {', '.join(filtered_ips)}")
-        
-        # Crear clientes básicos con las IPs encontradas
-        for ip in filtered_ips:
-            client = {
-                'ip': ip,
-                'name': f'Dispositivo-{ip.split(".")[-1]}',
-                'status': 'unknown'
-            }
-            clients.append(client)
+    with metrics.timer('parse', strategy='ip'):
+        clients = extract_ip_clients(html_content)
+    if clients:
+        print(f"🔍 Encontradas {len(clients)} IPs únicas: {', '.join(client['ip'] for client in clients)}")
     
     return clients
 
-def display_results(clients):
+def display_results(clients, output=DEFAULT_OUTPUT_FILE, quiet=False, stdout=None):
     """
-    Muestra los resultados de clientes encontrados
+    Envía los clientes encontrados a las salidas configuradas: consola con emojis
+    (salvo `quiet`) y registros NDJSON en `output` ("-" para `stdout`, None para ninguno)
     """
     if not clients:
-        print("❌ No se encontraron clientes de Simpat")
+        if not quiet:
+            print("❌ No se encontraron clientes de Simpat", file=sys.stderr if output == '-' else sys.stdout)
         return
     
-    print(f"\n📱 CLIENTES DE SIMPAT CONECTADOS: {len(clients)}")
-    print("=" * 60)
-    
-    # Crear contenido para archivo
-    output_content = []
-    output_content.append("CLIENTES CONECTADOS DE SIMPAT")
-    output_content.append("=" * 50)
-    output_content.append(f"Fecha: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    output_content.append(f"Total de clientes: {len(clients)}")
-    output_content.append("")
-    
-    for i, client in enumerate(clients, 1):
-        simpat_info = client.get('simpat_user', {})
-        
-        # Mostrar en consola
-        print(f"{i:2d}. 📱 {client.get('name', 'Sin nombre')}")
-        print(f"     🌐 IP: {client.get('ip', 'Sin IP')}")
-        print(f"     🔗 MAC: {client.get('mac', 'Sin MAC')}")
-        print(f"     👤 Simpat: {simpat_info.get('hostname', 'N/A')}")
-        print(f"     🆔 UserID: {simpat_info.get('userID', 'N/A')}")
-        print()
-        
-        # Agregar al archivo
-        output_content.append(f"{i:2d}. {client.get('name', 'Sin nombre')}")
-        output_content.append(f"     IP: {client.get('ip', 'Sin IP')}")
-        output_content.append(f"     MAC: {client.get('mac', 'Sin MAC')}")
-        output_content.append(f"     Simpat: {simpat_info.get('hostname', 'N/A')}")
-        output_content.append(f"     UserID: {simpat_info.get('userID', 'N/A')}")
-        output_content.append("")
-    
-    # Guardar en archivo
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"clientes_simpat_{timestamp}.txt"
-    
+    sinks = build_sinks(output, quiet, stdout)
     try:
-        with open(filename, 'w', encoding='utf-8') as f:
-            for line in output_content:
-                f.write(line + '\n')
-        print(f"✅ Resultados guardados en: {filename}")
-    except Exception as e:
-        print(f"❌ Error guardando archivo: {e}")
+        for sink in sinks:
+            sink.begin(clients)
+        for client in clients:
+            for sink in sinks:
+                sink.write(client)
+    finally:
+        for sink in sinks:
+            try:
+                sink.close()
+            except OSError as e:
+                print(f"❌ Error guardando resultados: {e}")
+    
+    if not quiet and output and output != '-':
+        print(f"✅ Resultados agregados a: {output}")
 
 if __name__ == "__main__":
-    scrape_unifi_clients()
\ No newline at end of file
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Clientes de Simpat conectados a UniFi")
+    parser.add_argument('--mode', choices=['json', 'html'], default='json',
+                        help="Fuente de datos: API JSON (por defecto) o scraping HTML")
+    parser.add_argument('--output', default=DEFAULT_OUTPUT_FILE,
+                        help=f"Archivo NDJSON de resultados, '-' para stdout o '' para ninguno "
+                             f"(por defecto {DEFAULT_OUTPUT_FILE})")
+    parser.add_argument('--quiet', action='store_true',
+                        help="No muestra la lista de clientes; el progreso y los errores van a stderr")
+    parser.add_argument('--metrics-log', metavar='FILE',
+                        help="Agrega el desglose de tiempos y conteos del sondeo a este archivo JSONL")
+    parser.add_argument('--capture-dir', metavar='DIR',
+                        help="Guarda las respuestas crudas (deduplicadas y comprimidas) en este directorio")
+    args = parser.parse_args()
+    
+    metrics.configure_log(args.metrics_log)
+    configure_captures(args.capture_dir)
+    scrape_unifi_clients(mode=args.mode, output=args.output, quiet=args.quiet)
\ No newline at end of file
@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+Benchmarks de las rutas críticas de parseo y matching, sin controlador.
+
+Mide extract_clients_from_html (con las capturas HTML del repositorio),
+load_simpat_ips / el parseo de simpat_users.json, el matching de clientes
+contra usuarios Simpat (por IP y por MAC), las búsquedas de SimpatLoader y las
+tasas de transferencia (throughput.py), a escala 1x, 100x y 10000x sobre datos
+sintéticos.
+
+Los tiempos absolutos dependen de la máquina, así que cada caso se expresa en
+unidades de una carga de referencia de Python puro medida en la misma corrida.
+La línea base (benchmark_baseline.json) es local: no se versiona y se genera en
+cada máquina con --update-baseline. Solo se evalúan los casos que tardan al
+menos MIN_GATED_SECONDS; en los de microsegundos domina el ruido. Termina con
+código 1 si algún caso evaluado es más lento que la línea base más la tolerancia,
+o si no hay línea base (salvo con --update-baseline): sin ella no hay comparación.
+
+    python benchmark_hot_paths.py --update-baseline   # guarda la línea base de esta máquina
+    python benchmark_hot_paths.py                     # compara contra ella
+"""
+
+import contextlib
+import glob
+import io
+import json
+import os
+import sys
+import tempfile
+import timeit
+
+import api_request
+from identity_resolver import IdentityResolver
+from simpat_loader import SimpatDirectory, SimpatLoader
+from throughput import ThroughputTracker
+from unifi_records import ClientRecord, int_to_ip
+
+DEFAULT_BASELINE_FILE = 'benchmark_baseline.json'
+DEFAULT_SCALES = (1, 100, 10000)
+DEFAULT_TOLERANCE = 0.5  # 50% más lento que la línea base se considera regresión
+DEFAULT_REPEAT = 5
+# Casos más rápidos que esto se muestran pero no deciden el resultado
+MIN_GATED_SECONDS = 100e-6
+REFERENCE_CASE = 'reference'
+LOOKUPS_PER_RUN = 1000
+BASE_IP = 0x0A000002  # 10.0.0.2
+
+def _quiet(func):
+    """
+    Ejecuta `func` descartando los print de las funciones medidas
+    """
+    def wrapper():
+        with contextlib.redirect_stdout(io.StringIO()):
+            return func()
+    return wrapper
+
+def measure(func, repeat=DEFAULT_REPEAT):
+    """
+    Retorna el mejor tiempo por llamada (segundos) de `func` entre `repeat` repeticiones
+    """
+    timer = timeit.Timer(_quiet(func))
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+def reference_work():
+    """
+    Carga fija de Python puro (diccionarios, bucles y cadenas) con la que se normalizan los tiempos
+    """
+    table = {f'10.0.0.{i}': i for i in range(256)}
+    total = 0
+    for _ in range(20):
+        for key, value in table.items():
+            total += value if key.endswith('1') else len(key)
+    return total
+
+def load_fixtures():
+    """
+    Lee las capturas HTML y los usuarios de ejemplo del repositorio
+    """
+    html_files = sorted(glob.glob('unifi_response_*.html') + glob.glob('api_response_*.html'))
+    pages = []
+    for html_file in html_files:
+        with open(html_file, 'r', encoding='utf-8') as f:
+            pages.append(f.read())
+
+    with open(api_request.SIMPAT_USERS_FILE, 'r', encoding='utf-8') as f:
+        users = json.load(f)['users']
+
+    return pages, users
+
+def synthetic_users(users, scale):
+    """
+    Replica los usuarios de ejemplo `scale` veces con IP e ID únicos
+    """
+    synthetic = []
+    for i in range(len(users) * scale):
+        user = users[i % len(users)]
+        synthetic.append({
+            'ip': int_to_ip(BASE_IP + i),
+            'hostname': f"{user['hostname']} {i}",
+            'userID': f"{user['userID']}-{i}",
+        })
+    return synthetic
+
+def synthetic_clients(user_count, scale):
+    """
+    Clientes sintéticos: la mitad con IP de un usuario Simpat y la otra mitad sin coincidencia
+    """
+    clients = []
+    for i in range(user_count * scale):
+        ip_int = BASE_IP + (i // 2 if i % 2 == 0 else user_count * scale + i)
+        clients.append(ClientRecord(mac_int=0x001122000000 + i, ip_int=ip_int, hostname=f'host-{i}'))
+    return clients
+
+def run_benchmarks(scales=DEFAULT_SCALES):
+    """
+    Ejecuta todos los casos y retorna {caso: segundos por operación}, incluida la
+    carga de referencia (la mejor de antes y después, por si la máquina cambió de ritmo)
+    """
+    pages, users = load_fixtures()
+    results = {}
+    reference = measure(reference_work)
+    users_file_before = api_request.SIMPAT_USERS_FILE
+
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            _run_scales(scales, pages, users, results, tmp_dir)
+    finally:
+        api_request.SIMPAT_USERS_FILE = users_file_before
+
+    results[REFERENCE_CASE] = min(reference, measure(reference_work))
+    return results
+
+def _run_scales(scales, pages, users, results, tmp_dir):
+    """
+    Casos de cada escala; los archivos sintéticos van en `tmp_dir`
+    """
+    for scale in scales:
+        print(f"📏 Escala {scale}x...")
+
+        # extract_clients_from_html sobre las capturas replicadas
+        page = ''.join(pages) * scale
+        results[f'extract_clients_from_html[{scale}x]'] = measure(
+            lambda: api_request.extract_clients_from_html(page))
+
+        # Parseo en frío del archivo de usuarios y load_simpat_ips en caliente
+        users_file = os.path.join(tmp_dir, f'simpat_users_{scale}.json')
+        with open(users_file, 'w', encoding='utf-8') as f:
+            json.dump({'users': synthetic_users(users, scale)}, f)
+
+        results[f'parse_simpat_users[{scale}x]'] = measure(
+            lambda: SimpatDirectory(users_file).refresh())
+
+        api_request.SIMPAT_USERS_FILE = users_file
+        results[f'load_simpat_ips[{scale}x]'] = measure(api_request.load_simpat_ips)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            directory = api_request.load_simpat_directory()
+            loader = SimpatLoader(users_file)
+
+        # Matching de clientes contra usuarios Simpat
+        clients = synthetic_clients(len(users), scale)
+        results[f'match_simpat_clients[{scale}x]'] = measure(
+            lambda: api_request.match_simpat_clients(clients, directory))
+        
+        # Matching por MAC con vínculos ya aprendidos (estado estable)
+        resolver = IdentityResolver(bindings_file=None)
+        with contextlib.redirect_stdout(io.StringIO()):
+            resolver.resolve(clients, directory)
+        results[f'resolve_identities[{scale}x]'] = measure(
+            lambda: resolver.resolve(clients, directory))
+
+        # Tasas de transferencia y top de consumo sobre dos sondeos alineados
+        tracker = ThroughputTracker()
+        tracker.record(clients, 0.0)
+        tracker.record(clients, 30.0)
+        results[f'throughput_rates[{scale}x]'] = measure(tracker.rates)
+        results[f'throughput_top_talkers[{scale}x]'] = measure(lambda: tracker.top_talkers(10))
+
+        # Búsquedas del loader (LOOKUPS_PER_RUN por operación)
+        sample = directory.users[::max(1, len(directory.users) // LOOKUPS_PER_RUN)][:LOOKUPS_PER_RUN]
+        sample_ips = [user.ip_address for user in sample]
+        sample_ids = [user.id for user in sample]
+        sample_names = [user.name for user in sample]
+
+        results[f'loader_get_user_by_ip[{scale}x]'] = measure(
+            lambda: [loader.get_user_by_ip(ip) for ip in sample_ips])
+        results[f'loader_get_user_by_id[{scale}x]'] = measure(
+            lambda: [loader.get_user_by_id(user_id) for user_id in sample_ids])
+        results[f'loader_get_user_by_name[{scale}x]'] = measure(
+            lambda: [loader.get_user_by_name(name) for name in sample_names])
+        results[f'loader_get_users_by_ip_range[{scale}x]'] = measure(
+            lambda: loader.get_users_by_ip_range('10.0.0.0/28'))
+
+def relative(results):
+    """
+    Tiempos en unidades de la carga de referencia: {caso: veces la referencia}
+    """
+    reference = results[REFERENCE_CASE]
+    return {case: seconds / reference for case, seconds in results.items() if case != REFERENCE_CASE}
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    Compara los tiempos relativos contra la línea base; retorna la lista de casos con regresión.
+    Los casos por debajo de MIN_GATED_SECONDS se muestran pero no cuentan.
+    """
+    regressions = []
+    current = relative(results)
+    print(f"\n🧮 Referencia: {results[REFERENCE_CASE] * 1e6:.1f}µs")
+    print(f"\n{'Caso':<45} {'Actual':>12} {'Relativo':>10} {'Base':>10} {'Cambio':>9}")
+    print("=" * 90)
+
+    for case, ratio in current.items():
+        seconds = results[case]
+        base = baseline.get(case)
+        row = f"{case:<45} {seconds * 1e6:>10.1f}µs {ratio:>9.3f}x"
+        if base is None:
+            print(f"{row} {'—':>10} {'nuevo':>9}")
+            continue
+
+        change = ratio / base - 1
+        marker = ''
+        if seconds < MIN_GATED_SECONDS:
+            marker = ' (no evaluado)'
+        elif change > tolerance:
+            regressions.append(case)
+            marker = ' ❌'
+        print(f"{row} {base:>9.3f}x {change:>+8.0%}{marker}")
+
+    return regressions
+
+def load_baseline(baseline_file):
+    """
+    Lee la línea base relativa; un archivo ausente o con el formato anterior (segundos) se ignora
+    """
+    if not os.path.exists(baseline_file):
+        return None
+    with open(baseline_file, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if data.get('unit') != REFERENCE_CASE:
+        print(f"⚠️ {baseline_file} tiene tiempos absolutos de otra versión; regenérela con --update-baseline")
+        return None
+    return data['cases']
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmarks de parseo y matching de clientes Simpat")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE_FILE,
+                        help=f"Archivo de línea base (por defecto {DEFAULT_BASELINE_FILE})")
+    parser.add_argument('--scales', default=','.join(str(scale) for scale in DEFAULT_SCALES),
+                        help="Escalas separadas por coma (por defecto 1,100,10000)")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help="Fracción de lentitud tolerada antes de fallar (por defecto 0.5)")
+    parser.add_argument('--update-baseline', action='store_true',
+                        help="Guarda los resultados como nueva línea base")
+    args = parser.parse_args()
+
+    scales = [int(scale) for scale in args.scales.split(',') if scale.strip()]
+    results = run_benchmarks(scales)
+    baseline = load_baseline(args.baseline)
+
+    if args.update_baseline:
+        compare(results, baseline or {}, args.tolerance)
+        cases = dict(baseline or {})
+        cases.update(relative(results))
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump({'unit': REFERENCE_CASE, 'cases': cases}, f, indent=2, sort_keys=True)
+        print(f"\n💾 Línea base actualizada: {args.baseline}")
+        return 0
+
+    if baseline is None:
+        compare(results, {}, args.tolerance)
+        print(f"\n❌ Sin línea base en {args.baseline}: genérela en esta máquina con --update-baseline")
+        return 1
+
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f"\n❌ {len(regressions)} regresiones (tolerancia {args.tolerance:.0%})")
+        return 1
+
+    print("\n✅ Sin regresiones")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+Capturas de respuestas crudas del controlador, con espacio en disco acotado.
+
+Opcional: solo se guarda algo si se configura un directorio (--capture-dir).
+Cada respuesta se identifica por el SHA-256 de su contenido, así que una
+respuesta idéntica a otra ya guardada solo actualiza el índice. Los archivos
+se comprimen con zstd (si está instalado `zstandard`) o gzip, y tras cada
+captura se borran las que superan la antigüedad máxima y luego las más viejas
+hasta quedar bajo el tamaño máximo.
+
+El índice (`index.json`) lista cada captura: tipo (html/json), ruta de
+origen, código HTTP y error de lectura (si el cuerpo llegó cortado o no se
+pudo parsear), primera y última vez vista, veces vista y tamaños.
+
+    python capture_store.py list
+    python capture_store.py replay 3fa2c1
+    python capture_store.py show 3fa2c1 > respuesta.html
+    python capture_store.py import unifi_response_*.html
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+DEFAULT_CAPTURE_DIR = 'unifi_capturas'
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024
+DEFAULT_MAX_AGE_DAYS = 7
+INDEX_FILE = 'index.json'
+
+class CaptureStore:
+    """
+    Directorio de capturas comprimidas y deduplicadas, con retención por tamaño y antigüedad
+    """
+
+    def __init__(self, directory=DEFAULT_CAPTURE_DIR, max_bytes=DEFAULT_MAX_BYTES,
+                 max_age_days=DEFAULT_MAX_AGE_DAYS, compression=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age_days * 86400 if max_age_days else None
+        self.compression = compression or ('zstd' if zstandard else 'gzip')
+        if self.compression == 'zstd' and zstandard is None:
+            print("⚠️ zstandard no está instalado, se usa gzip")
+            self.compression = 'gzip'
+        self.index_file = os.path.join(directory, INDEX_FILE)
+        self.entries = {}  # sha256 -> entrada del índice
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.load()
+
+    def load(self):
+        """
+        Carga el índice; las entradas cuyo archivo ya no existe se descartan
+        """
+        try:
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+        except FileNotFoundError:
+            entries = []
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"⚠️ Índice de capturas ilegible, se empieza uno nuevo: {e}")
+            entries = []
+
+        self.entries = {
+            entry['sha256']: entry for entry in entries
+            if os.path.exists(os.path.join(self.directory, entry['file']))
+        }
+
+    def _save_index(self):
+        tmp_file = f'{self.index_file}.tmp'
+        entries = sorted(self.entries.values(), key=lambda entry: entry['last_seen'])
+        try:
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(entries, f, ensure_ascii=False, indent=1)
+            os.replace(tmp_file, self.index_file)
+        except OSError as e:
+            print(f"⚠️ No se pudo guardar el índice de capturas: {e}")
+
+    def _compress(self, content):
+        if self.compression == 'zstd':
+            return zstandard.ZstdCompressor(level=10).compress(content), '.zst'
+        return gzip.compress(content, compresslevel=6), '.gz'
+
+    def save(self, content, kind='html', source=None, timestamp=None, status=None, error=None):
+        """
+        Guarda una respuesta (bytes); retorna su SHA-256, o None si no se pudo escribir.
+        Si ya existía solo se actualiza el índice. `status` es el código HTTP y `error`
+        el motivo por el que la respuesta no se pudo leer o parsear, si lo hubo.
+        """
+        if isinstance(content, str):
+            content = content.encode('utf-8')
+        timestamp = time.time() if timestamp is None else timestamp
+        digest = hashlib.sha256(content).hexdigest()
+
+        with self._lock:
+            entry = self.entries.get(digest)
+            if entry is not None:
+                entry['last_seen'] = max(entry['last_seen'], timestamp)
+                entry['count'] += 1
+                entry['status'] = status
+                entry['error'] = error
+            else:
+                data, extension = self._compress(content)
+                file_name = f'{digest[:32]}.{kind}{extension}'
+                try:
+                    with open(os.path.join(self.directory, file_name), 'wb') as f:
+                        f.write(data)
+                except OSError as e:
+                    print(f"⚠️ No se pudo guardar la captura: {e}")
+                    return None
+                self.entries[digest] = {
+                    'sha256': digest,
+                    'file': file_name,
+                    'kind': kind,
+                    'source': source,
+                    'status': status,
+                    'error': error,
+                    'first_seen': timestamp,
+                    'last_seen': timestamp,
+                    'count': 1,
+                    'size': len(content),
+                    'stored_size': len(data),
+                }
+            self._prune(timestamp)
+            self._save_index()
+        return digest
+
+    def _remove(self, digest):
+        entry = self.entries.pop(digest)
+        try:
+            os.remove(os.path.join(self.directory, entry['file']))
+        except FileNotFoundError:
+            pass
+
+    def _prune(self, now):
+        removed = 0
+        if self.max_age:
+            for digest in [d for d, entry in self.entries.items() if now - entry['last_seen'] > self.max_age]:
+                self._remove(digest)
+                removed += 1
+
+        if self.max_bytes:
+            total = sum(entry['stored_size'] for entry in self.entries.values())
+            # Se conserva siempre la captura más reciente aunque sola supere el límite
+            for entry in sorted(self.entries.values(), key=lambda entry: entry['last_seen'])[:-1]:
+                if total <= self.max_bytes:
+                    break
+                total -= entry['stored_size']
+                self._remove(entry['sha256'])
+                removed += 1
+        return removed
+
+    def prune(self, now=None):
+        """
+        Aplica la retención; retorna cuántas capturas se borraron
+        """
+        with self._lock:
+            removed = self._prune(time.time() if now is None else now)
+            if removed:
+                self._save_index()
+        return removed
+
+    def find(self, ref):
+        """
+        Entrada del índice por SHA-256 o un prefijo único; "last" es la más reciente
+        """
+        with self._lock:
+            entries = list(self.entries.values())
+        if ref == 'last':
+            return max(entries, key=lambda entry: entry['last_seen'], default=None)
+        matches = [entry for entry in entries if entry['sha256'].startswith(ref)]
+        return matches[0] if len(matches) == 1 else None
+
+    def read(self, entry):
+        """
+        Contenido original (bytes) de una captura
+        """
+        path = os.path.join(self.directory, entry['file'])
+        with open(path, 'rb') as f:
+            data = f.read()
+        if entry['file'].endswith('.zst'):
+            if zstandard is None:
+                raise RuntimeError('La captura está comprimida con zstd y zstandard no está instalado')
+            return zstandard.ZstdDecompressor().decompress(data, max_output_size=entry['size'])
+        return gzip.decompress(data)
+
+    @property
+    def total_bytes(self):
+        return sum(entry['stored_size'] for entry in self.entries.values())
+
+_store = None
+
+def configure_captures(directory, max_bytes=DEFAULT_MAX_BYTES, max_age_days=DEFAULT_MAX_AGE_DAYS):
+    """
+    Activa las capturas del proceso en `directory` (None para desactivarlas)
+    """
+    global _store
+    _store = CaptureStore(directory, max_bytes, max_age_days) if directory else None
+    return _store
+
+def get_capture_store():
+    """
+    Almacén de capturas del proceso, o None si no están activadas
+    """
+    return _store
+
+def replay_capture(store, entry):
+    """
+    Vuelve a pasar una captura por el parser correspondiente; retorna los clientes extraídos
+    """
+    from api_request import extract_clients_from_html, iter_json_array_items
+
+    content = store.read(entry)
+    if entry['kind'] == 'json':
+        return list(iter_json_array_items([content]))
+    return extract_clients_from_html(content.decode('utf-8', errors='replace'))
+
+def _format_time(timestamp):
+    return datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S')
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Capturas de respuestas crudas del controlador")
+    parser.add_argument('--dir', default=DEFAULT_CAPTURE_DIR,
+                        help=f"Directorio de capturas (por defecto {DEFAULT_CAPTURE_DIR})")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    subparsers.add_parser('list', help="Lista las capturas del índice")
+
+    replay = subparsers.add_parser('replay', help="Pasa una captura por el parser")
+    replay.add_argument('ref', help="SHA-256, prefijo único o 'last'")
+
+    show = subparsers.add_parser('show', help="Escribe el contenido original en stdout")
+    show.add_argument('ref', help="SHA-256, prefijo único o 'last'")
+
+    imports = subparsers.add_parser('import', help="Agrega archivos de respuesta existentes (ej. unifi_response_*.html)")
+    imports.add_argument('files', nargs='+')
+
+    prune = subparsers.add_parser('prune', help="Aplica la retención")
+    prune.add_argument('--max-mb', type=float, default=DEFAULT_MAX_BYTES / 1024 / 1024,
+                       help="Tamaño máximo en disco (MB)")
+    prune.add_argument('--max-age-days', type=float, default=DEFAULT_MAX_AGE_DAYS,
+                       help="Antigüedad máxima desde la última vez vista (días)")
+
+    args = parser.parse_args()
+    # Las consultas no aplican retención: se ve el directorio tal como está
+    store = CaptureStore(args.dir, max_bytes=None, max_age_days=None)
+
+    if args.command == 'list':
+        entries = sorted(store.entries.values(), key=lambda entry: entry['last_seen'])
+        print(f"\n🗂️ Capturas en {args.dir}: {len(entries)} ({store.total_bytes / 1024:.1f} KB en disco)")
+        print("=" * 60)
+        for entry in entries:
+            status = entry.get('status') or '-'
+            print(f"   {entry['sha256'][:12]}  {entry['kind']:<4} {status:<4} {_format_time(entry['last_seen'])}  "
+                  f"x{entry['count']:<4} {entry['size'] / 1024:8.1f} KB → {entry['stored_size'] / 1024:.1f} KB"
+                  f"  {entry['source'] or ''}")
+            if entry.get('error'):
+                print(f"      ⚠️ {entry['error']}")
+        return
+
+    if args.command == 'import':
+        failed = False
+        for file_name in args.files:
+            with open(file_name, 'rb') as f:
+                content = f.read()
+            kind = 'json' if file_name.endswith('.json') else 'html'
+            digest = store.save(content, kind=kind, source=file_name, timestamp=os.path.getmtime(file_name))
+            if digest is None:
+                print(f"❌ {file_name} no se pudo importar", file=sys.stderr)
+                failed = True
+                continue
+            print(f"📥 {file_name} → {digest[:12]}")
+        if failed:
+            sys.exit(1)
+        return
+
+    if args.command == 'prune':
+        store.max_bytes = int(args.max_mb * 1024 * 1024)
+        store.max_age = args.max_age_days * 86400
+        print(f"🧹 Capturas borradas: {store.prune()}")
+        return
+
+    entry = store.find(args.ref)
+    if entry is None:
+        print(f"❌ No hay una captura única para '{args.ref}'", file=sys.stderr)
+        sys.exit(1)
+
+    if args.command == 'show':
+        sys.stdout.buffer.write(store.read(entry))
+        return
+
+    try:
+        clients = replay_capture(store, entry)
+    except ValueError as e:
+        # Respuestas de error o truncadas: se capturan justamente para ver cómo fallan
+        print(f"❌ La captura {entry['sha256'][:12]} (HTTP {entry.get('status') or '-'}) no se pudo parsear: {e}")
+        sys.exit(1)
+    print(f"\n🔁 Captura {entry['sha256'][:12]} ({entry['kind']}, {_format_time(entry['last_seen'])}): "
+          f"{len(clients)} clientes")
+    for client in clients[:20]:
+        print(f"   📱 {client.get('name') or client.get('hostname') or 'Sin nombre'} - {client.get('ip') or 'Sin IP'}")
+    if len(clients) > 20:
+        print(f"   ... y {len(clients) - 20} más")
+
+if __name__ == "__main__":
+    main()
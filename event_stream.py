@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""
+Clientes conectados a partir del websocket de eventos del controlador.
+
+En lugar de descargar la lista completa en cada sondeo, se escucha
+/wss/s/{site}/events y se aplica cada evento al estado en memoria:
+
+  - EVT_*_Connected: el cliente se agrega (o se actualiza su AP).
+  - EVT_*_Disconnected: el cliente se quita.
+  - EVT_*_Roam: cambia el AP del cliente.
+  - sta:sync: datos completos de estaciones (IP incluida), se reemplazan.
+
+Cada `resync_interval` segundos, y tras cada reconexión (pudieron perderse
+eventos), se vuelve a cargar la lista completa desde stat/sta.
+
+Requiere el paquete opcional websocket-client; sin él se hace solo la
+resincronización periódica, es decir, un sondeo normal.
+
+    python event_stream.py --resync 300
+"""
+
+import json
+import ssl
+import threading
+import time
+from datetime import datetime
+
+import requests
+
+try:
+    import websocket
+except ImportError:
+    websocket = None
+
+from api_request import fetch_clients_json, load_identity_resolver, load_simpat_directory, match_simpat_clients
+from metrics import metrics
+from resilience import CircuitOpenError, ClientSnapshot, RetryPolicy
+from unifi_config import get_config
+from unifi_records import ClientRecord, mac_to_int
+from unifi_session import UnifiAuthError, get_session_manager
+
+EVENTS_WS_PATH = '/wss/s/{site}/events'
+DEFAULT_RESYNC_INTERVAL = 300
+# Sin websocket-client: cada cuánto se sondea la lista completa
+DEFAULT_FALLBACK_INTERVAL = 30
+
+# Inalámbricos (WU), invitados (WG) y cableados (LU)
+CONNECT_EVENTS = frozenset({'EVT_WU_Connected', 'EVT_WG_Connected', 'EVT_LU_Connected'})
+DISCONNECT_EVENTS = frozenset({'EVT_WU_Disconnected', 'EVT_WG_Disconnected', 'EVT_LU_Disconnected'})
+ROAM_EVENTS = frozenset({'EVT_WU_Roam', 'EVT_WG_Roam'})
+
+# Clientes desconectados que se recuerdan para restaurar su IP al reconectarse
+MAX_DEPARTED = 1000
+
+# Reconexión del websocket: de 1 a 30 segundos con jitter
+RECONNECT_POLICY = RetryPolicy(base_delay=1.0, max_delay=30.0)
+
+class ClientState:
+    """
+    Clientes conectados de un sitio, por MAC, actualizados evento por evento
+    """
+
+    def __init__(self, site, controller=None):
+        self.site = site
+        self.controller = controller
+        self.records = {}  # mac_int -> ClientRecord
+        self.departed = {}  # mac_int -> ClientRecord, en orden de salida
+        self.synced_at = None
+
+    def reset(self, stations):
+        """
+        Reemplaza el estado con la lista completa de stat/sta
+        """
+        records = {}
+        for station in stations:
+            record = ClientRecord.from_api(station, site=self.site, controller=self.controller)
+            if record.mac_int:
+                records[record.mac_int] = record
+        for mac_int, record in self.records.items():
+            if mac_int not in records:
+                self._depart(mac_int, record)
+        self.records = records
+        self.synced_at = time.time()
+
+    def _depart(self, mac_int, record):
+        self.departed.pop(mac_int, None)
+        self.departed[mac_int] = record
+        if len(self.departed) > MAX_DEPARTED:
+            del self.departed[next(iter(self.departed))]
+
+    def _upsert(self, mac_int, **fields):
+        record = self.records.get(mac_int)
+        if record is None:
+            # Los eventos de conexión no traen la IP: se parte de lo último conocido hasta el sta:sync
+            record = self.departed.pop(mac_int, None) or ClientRecord(
+                mac_int=mac_int, site=self.site, controller=self.controller)
+            self.records[mac_int] = record
+        for name, value in fields.items():
+            if value:
+                setattr(record, name, value)
+        return record
+
+    def apply_event(self, event):
+        """
+        Aplica un evento del controlador; retorna el tipo de cambio o None si no afecta a los clientes
+        """
+        key = event.get('key')
+        mac_int = mac_to_int(event.get('user'))
+        if not mac_int:
+            return None
+
+        if key in CONNECT_EVENTS:
+            self._upsert(mac_int, ap_mac_int=mac_to_int(event.get('ap')), hostname=event.get('hostname'))
+            return 'connected'
+        if key in DISCONNECT_EVENTS:
+            record = self.records.pop(mac_int, None)
+            if record is None:
+                return None
+            self._depart(mac_int, record)
+            return 'disconnected'
+        if key in ROAM_EVENTS:
+            self._upsert(mac_int, ap_mac_int=mac_to_int(event.get('ap_to')))
+            return 'roamed'
+        return None
+
+    def apply_station(self, station):
+        """
+        Reemplaza los datos de una estación (mensaje sta:sync)
+        """
+        record = ClientRecord.from_api(station, site=self.site, controller=self.controller)
+        if not record.mac_int:
+            return None
+        self.records[record.mac_int] = record
+        return 'synced'
+
+    def apply_message(self, message):
+        """
+        Aplica un mensaje del websocket ({"meta": {"message": ...}, "data": [...]});
+        retorna la lista de cambios aplicados
+        """
+        kind = (message.get('meta') or {}).get('message')
+        if kind == 'events':
+            apply = self.apply_event
+        elif kind == 'sta:sync':
+            apply = self.apply_station
+        else:
+            return []
+
+        changes = []
+        for item in message.get('data') or []:
+            change = apply(item)
+            if change:
+                changes.append(change)
+                metrics.inc('events', kind=change)
+        return changes
+
+    def simpat_clients(self):
+        """
+        Clientes de Simpat en el estado actual (identificados por MAC, con la IP como respaldo)
+        """
+        clients = match_simpat_clients(list(self.records.values()), load_simpat_directory(),
+                                       load_identity_resolver())
+        return ClientSnapshot(clients)
+
+def events_url(base_url, site):
+    """
+    URL ws(s):// del websocket de eventos de un sitio
+    """
+    scheme, _, rest = base_url.partition('://')
+    return f"{'wss' if scheme == 'https' else 'ws'}://{rest}{EVENTS_WS_PATH.format(site=site)}"
+
+class EventSubscriber:
+    """
+    Mantiene un ClientState al día con el websocket de eventos y resincronizaciones periódicas.
+    `on_change(clients, reason)` recibe el ClientSnapshot de Simpat tras cada cambio;
+    `reason` es 'resync' o 'event'.
+    """
+
+    def __init__(self, manager, site, on_change, resync_interval=DEFAULT_RESYNC_INTERVAL,
+                 fallback_interval=DEFAULT_FALLBACK_INTERVAL):
+        self.manager = manager
+        self.site = site
+        self.on_change = on_change
+        self.resync_interval = resync_interval
+        self.fallback_interval = fallback_interval
+        self.state = ClientState(site, manager.base_url)
+
+    def resync(self):
+        """
+        Carga la lista completa de clientes; retorna False si falló
+        """
+        try:
+            if not self.manager.ensure_authenticated():
+                return False
+            stations = fetch_clients_json(self.manager, self.site)
+        except (requests.RequestException, ValueError, CircuitOpenError, UnifiAuthError) as e:
+            print(f"⚠️ Error en la resincronización: {e}")
+            metrics.inc('errors', stage='resync')
+            return False
+        if stations is None:
+            return False
+
+        metrics.inc('resyncs')
+        self.state.reset(stations)
+        self.on_change(self.state.simpat_clients(), 'resync')
+        return True
+
+    def _connect(self):
+        """
+        Abre el websocket con la cookie y el CSRF de la sesión; ante un 401 repite el login una vez
+        """
+        url = events_url(self.manager.base_url, self.site)
+        sslopt = None if self.manager.session.verify else {'cert_reqs': ssl.CERT_NONE}
+        for attempt in range(2):
+            cookie = '; '.join(f'{cookie.name}={cookie.value}' for cookie in self.manager.session.cookies)
+            header = [f'X-CSRF-Token: {self.manager.csrf_token}'] if self.manager.csrf_token else []
+            try:
+                return websocket.create_connection(url, cookie=cookie, header=header, sslopt=sslopt,
+                                                   timeout=self.manager.timeout[0])
+            except websocket.WebSocketBadStatusException as e:
+                if e.status_code != 401 or attempt or not self.manager.login():
+                    raise
+
+    def _listen(self, ws, stop):
+        """
+        Aplica los mensajes hasta que toque resincronizar, se pida detener o se cierre el websocket
+        """
+        ws.settimeout(1.0)
+        next_resync = time.monotonic() + self.resync_interval
+        while not stop.is_set():
+            if time.monotonic() >= next_resync:
+                self.resync()
+                next_resync = time.monotonic() + self.resync_interval
+            try:
+                raw = ws.recv()
+            except websocket.WebSocketTimeoutException:
+                continue
+            if not raw:
+                continue
+            try:
+                message = json.loads(raw)
+            except ValueError:
+                continue
+            if self.state.apply_message(message):
+                self.on_change(self.state.simpat_clients(), 'event')
+
+    def run(self, stop=None):
+        """
+        Escucha hasta que se active `stop` (o Ctrl+C), reconectando con backoff
+        """
+        stop = stop or threading.Event()
+        if websocket is None:
+            print(f"⚠️ websocket-client no está instalado: se sondea cada {self.fallback_interval}s")
+            while not stop.is_set():
+                self.resync()
+                stop.wait(self.fallback_interval)
+            return
+
+        attempt = 0
+        while not stop.is_set():
+            # Tras (re)conectar se resincroniza: los eventos de la desconexión se perdieron
+            if not self.resync():
+                stop.wait(RECONNECT_POLICY.delay(attempt))
+                attempt += 1
+                continue
+            try:
+                ws = self._connect()
+            except (websocket.WebSocketException, OSError) as e:
+                delay = RECONNECT_POLICY.delay(attempt)
+                print(f"⚠️ No se pudo abrir el websocket de eventos ({e}); reintento en {delay:.1f}s")
+                metrics.inc('errors', stage='websocket')
+                attempt += 1
+                stop.wait(delay)
+                continue
+
+            print(f"📡 Escuchando eventos de {self.site}")
+            attempt = 0
+            try:
+                self._listen(ws, stop)
+            except (websocket.WebSocketException, OSError) as e:
+                print(f"⚠️ Websocket de eventos cerrado: {e}")
+                metrics.inc('errors', stage='websocket')
+            finally:
+                ws.close()
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Presencia de Simpat en tiempo real con el websocket de eventos")
+    parser.add_argument('--resync', type=float, default=DEFAULT_RESYNC_INTERVAL,
+                        help=f"Segundos entre resincronizaciones completas (por defecto {DEFAULT_RESYNC_INTERVAL})")
+    args = parser.parse_args()
+
+    config = get_config()
+    if not config.complete:
+        print("❌ Faltan variables de entorno")
+        return
+
+    present = {}
+
+    def on_change(clients, reason):
+        current = {client.simpat_user.id: client.simpat_user.name for client in clients}
+        stamp = datetime.now().strftime('%H:%M:%S')
+        for user_id in current.keys() - present.keys():
+            print(f"🟢 {stamp} {current[user_id]}")
+        for user_id in present.keys() - current.keys():
+            print(f"🔴 {stamp} {present[user_id]}")
+        if reason == 'resync':
+            print(f"🔄 {stamp} Resincronizado: {len(current)} usuarios presentes")
+        present.clear()
+        present.update(current)
+
+    manager = get_session_manager(config.url, config.username, config.password)
+    try:
+        EventSubscriber(manager, config.site, on_change, resync_interval=args.resync).run()
+    except KeyboardInterrupt:
+        print("\n👋 Suscripción de eventos detenida")
+
+if __name__ == "__main__":
+    main()
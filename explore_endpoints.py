@@ -3,100 +3,157 @@
 Script para explorar todos los endpoints disponibles en UniFi
 """
 
-import requests
-import urllib3
-import os
 import json
-from dotenv import load_dotenv
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from unifi_config import get_config
+from unifi_session import UnifiSessionManager
 
-# Cargar variables de entorno
-load_dotenv()
+DEFAULT_WORKERS = 8
+DEFAULT_PROBE_TIMEOUT = 5
 
-# Deshabilitar advertencias SSL
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+def build_endpoints(site='default'):
+    """
+    Lista de endpoints a probar para un sitio
+    """
+    return [
+        # Endpoints clásicos de UniFi
+        f'/api/s/{site}/stat/sta',           # Clientes conectados
+        f'/api/s/{site}/stat/device',        # Dispositivos
+        f'/api/s/{site}/stat/user',          # Usuarios
+        f'/api/s/{site}/stat/client',        # Clientes
+        f'/api/s/{site}/stat/networkconf',   # Configuración de red
+        f'/api/s/{site}/stat/wlanconf',      # Configuración WiFi
+        f'/api/s/{site}/stat/health',        # Estado del sistema
+        
+        # Endpoints nuevos de UniFi Network
+        f'/network/{site}/clients/main',     # Clientes principales
+        f'/network/{site}/devices',          # Dispositivos
+        f'/network/{site}/insights',         # Insights
+        f'/network/{site}/events',           # Eventos
+        
+        # Endpoints de sistema
+        '/api/self',                         # Información del sistema
+        '/api/status',                       # Estado
+        '/api/sites',                        # Sitios
+    ]
+
+def probe_endpoint(manager, endpoint, timeout=DEFAULT_PROBE_TIMEOUT):
+    """
+    Prueba un endpoint y mide TTFB, tiempo total, bytes y cantidad de elementos.
+    Retorna (resultado, datos JSON o None).
+    """
+    result = {
+        'endpoint': endpoint,
+        'status': None,
+        'ttfb_ms': None,
+        'total_ms': None,
+        'bytes': 0,
+        'elements': None,
+        'json': False,
+        'error': None,
+    }
+    data = None
+    started = time.perf_counter()
+    
+    try:
+        # En modo stream la llamada regresa al recibir los encabezados (TTFB)
+        with manager.stream(endpoint, timeout=timeout, retry=False) as response:
+            result['ttfb_ms'] = round((time.perf_counter() - started) * 1000, 1)
+            content = response.content
+        
+        result['total_ms'] = round((time.perf_counter() - started) * 1000, 1)
+        result['status'] = response.status_code
+        result['bytes'] = len(content)
+        
+        if response.status_code == 200:
+            try:
+                data = json.loads(content)
+                result['json'] = True
+            except ValueError:
+                data = None
+            
+            items = data.get('data') if isinstance(data, dict) else data
+            if isinstance(items, list):
+                result['elements'] = len(items)
+    except Exception as e:
+        result['total_ms'] = round((time.perf_counter() - started) * 1000, 1)
+        result['error'] = str(e)
+    
+    return result, data
 
-def explore_endpoints():
+def print_probe_result(result):
     """
-    Explora todos los endpoints posibles de UniFi
+    Muestra una línea por endpoint con su estado y tiempos
     """
-    # Obtener configuración
-    unifi_url = os.getenv('UNIFI_URL')
-    username = os.getenv('UNIFI_USERNAME')
-    password = os.getenv('UNIFI_PASSWORD')
+    endpoint = result['endpoint']
+    timing = f"TTFB {result['ttfb_ms']} ms, total {result['total_ms']} ms, {result['bytes']} bytes"
     
-    if not unifi_url or not username or not password:
+    if result['error']:
+        print(f"❌ {endpoint:<35} - Error: {result['error'][:30]}")
+    elif result['status'] == 200:
+        if result['json']:
+            data_count = result['elements'] if result['elements'] is not None else 'N/A'
+            print(f"✅ {endpoint:<35} - {data_count} elementos ({timing})")
+        else:
+            print(f"✅ {endpoint:<35} - Respuesta no JSON ({timing})")
+    elif result['status'] == 404:
+        print(f"❌ {endpoint:<35} - No encontrado ({timing})")
+    else:
+        print(f"⚠️ {endpoint:<35} - Status {result['status']} ({timing})")
+
+def save_report(report, report_file):
+    """
+    Exporta el reporte de latencias a JSON
+    """
+    try:
+        with open(report_file, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\n💾 Reporte guardado en: {report_file}")
+    except OSError as e:
+        print(f"❌ Error guardando reporte: {e}")
+
+def explore_endpoints(report_file=None, workers=DEFAULT_WORKERS, timeout=DEFAULT_PROBE_TIMEOUT):
+    """
+    Explora todos los endpoints posibles de UniFi en paralelo y reporta sus latencias
+    """
+    # Obtener configuración (URL ya normalizada con esquema y puerto)
+    config = get_config()
+    unifi_url = config.url
+    site = config.site
+    
+    if not config.complete:
         print("❌ Faltan variables de entorno")
         return
     
-    # Asegurar que la URL tenga el esquema https:// y puerto correcto
-    if not unifi_url.startswith(('http://', 'https://')):
-        unifi_url = f'https://{unifi_url}'
-    if ':8443' not in unifi_url and ':443' not in unifi_url and ':80' not in unifi_url:
-        unifi_url = f'{unifi_url}:8443'
-    
-    session = requests.Session()
+    # Gestor propio de la exploración, con un pool del tamaño de los workers; la cookie/CSRF
+    # sigue viniendo del caché en disco, y cerrarlo no afecta al gestor compartido del proceso
+    manager = UnifiSessionManager(unifi_url, config.username, config.password, pool_size=max(10, workers))
     
     try:
-        # Autenticación
+        # Autenticación (solo si no hay sesión válida en caché)
         print(f"🌐 Conectando a: {unifi_url}")
-        login_url = f'{unifi_url}/api/auth/login'
-        login_payload = {'username': username, 'password': password}
-        
-        login_response = session.post(login_url, json=login_payload, verify=False, timeout=10)
-        if login_response.status_code != 200:
-            print(f"❌ Error de autenticación: {login_response.status_code}")
+        if not manager.ensure_authenticated():
             return
         
-        print("✅ Autenticación exitosa")
+        endpoints = build_endpoints(site)
         
-        # Lista de endpoints a probar
-        endpoints = [
-            # Endpoints clásicos de UniFi
-            '/api/s/default/stat/sta',           # Clientes conectados
-            '/api/s/default/stat/device',        # Dispositivos
-            '/api/s/default/stat/user',          # Usuarios
-            '/api/s/default/stat/client',        # Clientes
-            '/api/s/default/stat/networkconf',   # Configuración de red
-            '/api/s/default/stat/wlanconf',      # Configuración WiFi
-            '/api/s/default/stat/health',        # Estado del sistema
-            
-            # Endpoints nuevos de UniFi Network
-            '/network/default/clients/main',     # Clientes principales
-            '/network/default/devices',          # Dispositivos
-            '/network/default/insights',         # Insights
-            '/network/default/events',           # Eventos
-            
-            # Endpoints de sistema
-            '/api/self',                         # Información del sistema
-            '/api/status',                       # Estado
-            '/api/sites',                        # Sitios
-        ]
-        
-        print(f"\n🔍 Explorando {len(endpoints)} endpoints...")
+        print(f"\n🔍 Explorando {len(endpoints)} endpoints ({workers} en paralelo)...")
         print("=" * 60)
         
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            probes = list(executor.map(lambda endpoint: probe_endpoint(manager, endpoint, timeout), endpoints))
+        wall_time_ms = round((time.perf_counter() - started) * 1000, 1)
+        
         working_endpoints = []
+        for result, data in probes:
+            print_probe_result(result)
+            if result['status'] == 200 and result['json']:
+                working_endpoints.append((result['endpoint'], data))
         
-        for endpoint in endpoints:
-            try:
-                url = f'{unifi_url}{endpoint}'
-                response = session.get(url, verify=False, timeout=5)
-                
-                if response.status_code == 200:
-                    try:
-                        data = response.json()
-                        data_count = len(data.get('data', [])) if isinstance(data.get('data'), list) else 'N/A'
-                        print(f"✅ {endpoint:<35} - {data_count} elementos")
-                        working_endpoints.append((endpoint, data))
-                    except:
-                        print(f"✅ {endpoint:<35} - Respuesta no JSON")
-                elif response.status_code == 404:
-                    print(f"❌ {endpoint:<35} - No encontrado")
-                else:
-                    print(f"⚠️ {endpoint:<35} - Status {response.status_code}")
-                    
-            except Exception as e:
-                print(f"❌ {endpoint:<35} - Error: {str(e)[:30]}")
+        print(f"\n⏱️ Tiempo total: {wall_time_ms} ms")
         
         # Mostrar detalles de endpoints que funcionan
         if working_endpoints:
@@ -117,10 +174,34 @@ def explore_endpoints():
                         print(f"   📄 Estructura: {list(data.keys())}")
                 print(f"   📏 Tamaño respuesta: {len(str(data))} caracteres")
         
+        report = {
+            'controller': unifi_url,
+            'site': site,
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'wall_time_ms': wall_time_ms,
+            'endpoints': [result for result, _ in probes],
+        }
+        
+        if report_file:
+            save_report(report, report_file)
+        
+        return report
+        
     except Exception as e:
         print(f"❌ Error general: {e}")
     finally:
-        session.close()
+        manager.close()
 
 if __name__ == "__main__":
-    explore_endpoints()
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Explora los endpoints de UniFi y mide sus latencias")
+    parser.add_argument('--json', dest='report_file',
+                        help="Exporta el reporte de latencias a este archivo JSON")
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help="Pruebas simultáneas")
+    parser.add_argument('--timeout', type=float, default=DEFAULT_PROBE_TIMEOUT,
+                        help="Timeout por endpoint en segundos")
+    args = parser.parse_args()
+    
+    explore_endpoints(args.report_file, args.workers, args.timeout)
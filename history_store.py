@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Historial de conexiones en SQLite (modo WAL).
+
+Cada sondeo extiende los intervalos de presencia abiertos (usuario, MAC, IP, AP,
+first_seen, last_seen) en lugar de escribir un archivo nuevo. Los intervalos se
+cortan a medianoche, así que ninguno dura más de un día: las consultas por rango
+de tiempo recorren solo el índice de first_seen acotado y las horas por día se
+agrupan por la columna `day`.
+
+    python history_store.py between "2025-09-09 08:00" "2025-09-09 18:00"
+    python history_store.py hours 2025-09-01 2025-09-30
+"""
+
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+DEFAULT_DB_FILE = 'simpat_history.db'
+# Si un cliente no se ve durante más de esto, el siguiente avistamiento abre un intervalo nuevo
+DEFAULT_MAX_GAP = 300
+SECONDS_PER_DAY = 86400
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS intervals (
+    id INTEGER PRIMARY KEY,
+    day TEXT NOT NULL,
+    user_id TEXT,
+    hostname TEXT,
+    mac TEXT,
+    ip TEXT,
+    ap_mac TEXT,
+    site TEXT,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_intervals_first_seen ON intervals(first_seen);
+CREATE INDEX IF NOT EXISTS idx_intervals_day_user ON intervals(day, user_id);
+"""
+
+def day_of(timestamp):
+    return datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d')
+
+def next_midnight(timestamp):
+    day = datetime.fromtimestamp(timestamp).date() + timedelta(days=1)
+    return datetime(day.year, day.month, day.day).timestamp()
+
+def parse_time(value):
+    """
+    Convierte 'YYYY-MM-DD', 'YYYY-MM-DD HH:MM[:SS]' o un epoch a timestamp
+    """
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+class OpenInterval:
+    """
+    Intervalo aún abierto de un cliente (en memoria)
+    """
+    __slots__ = ('row_id', 'ip', 'ap_mac', 'user_id', 'day', 'last_seen')
+
+    def __init__(self, row_id, ip, ap_mac, user_id, day, last_seen):
+        self.row_id = row_id
+        self.ip = ip
+        self.ap_mac = ap_mac
+        self.user_id = user_id
+        self.day = day
+        self.last_seen = last_seen
+
+class HistoryStore:
+    """
+    Almacén append-only de intervalos de presencia
+    """
+
+    def __init__(self, db_file=DEFAULT_DB_FILE, max_gap=DEFAULT_MAX_GAP):
+        self.db_file = db_file
+        self.max_gap = max_gap
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(db_file, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+        self._open = {}
+        self._load_open_intervals()
+
+    def _load_open_intervals(self):
+        """
+        Recupera los intervalos recientes para continuarlos tras un reinicio
+        """
+        since = time.time() - self.max_gap
+        rows = self.conn.execute(
+            'SELECT id, day, user_id, mac, ip, ap_mac, last_seen FROM intervals '
+            'WHERE first_seen >= ? AND last_seen >= ? ORDER BY last_seen',
+            (since - SECONDS_PER_DAY, since)
+        )
+        for row in rows:
+            key = row['mac'] or row['ip']
+            self._open[key] = OpenInterval(row['id'], row['ip'], row['ap_mac'], row['user_id'],
+                                           row['day'], row['last_seen'])
+
+    def _insert(self, cursor, record, key, user, timestamp):
+        day = day_of(timestamp)
+        cursor.execute(
+            'INSERT INTO intervals (day, user_id, hostname, mac, ip, ap_mac, site, first_seen, last_seen) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (day, user.id if user else None, user.name if user else record.display_name,
+             record.mac or None, record.ip, record.ap_mac or None, record.site, timestamp, timestamp)
+        )
+        self._open[key] = OpenInterval(cursor.lastrowid, record.ip, record.ap_mac,
+                                       user.id if user else None, day, timestamp)
+
+    def record_poll(self, clients, timestamp=None):
+        """
+        Registra un sondeo: extiende los intervalos vigentes y abre los nuevos en una sola transacción
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        day = day_of(timestamp)
+        updates = []
+
+        with self._lock, self.conn:
+            cursor = self.conn.cursor()
+            for record in clients:
+                key = record.mac or record.ip
+                if not key:
+                    continue
+                user = record.simpat_user
+                user_id = user.id if user else None
+                current = self._open.get(key)
+
+                continuous = (
+                    current is not None
+                    and timestamp - current.last_seen <= self.max_gap
+                    and current.ip == record.ip
+                    and current.ap_mac == record.ap_mac
+                    and current.user_id == user_id
+                )
+
+                if continuous and current.day == day:
+                    current.last_seen = timestamp
+                    updates.append((timestamp, current.row_id))
+                    continue
+
+                if continuous:
+                    # Cruzó la medianoche: se cierra el día anterior y el nuevo intervalo empieza a las 00:00
+                    midnight = next_midnight(current.last_seen)
+                    updates.append((midnight, current.row_id))
+                    self._insert(cursor, record, key, user, midnight)
+                    current = self._open[key]
+                    if timestamp > midnight:
+                        current.last_seen = timestamp
+                        updates.append((timestamp, current.row_id))
+                    continue
+
+                self._insert(cursor, record, key, user, timestamp)
+
+            cursor.executemany('UPDATE intervals SET last_seen = ? WHERE id = ?', updates)
+
+            # Olvidar los intervalos que ya no pueden continuar
+            stale = [key for key, interval in self._open.items() if timestamp - interval.last_seen > self.max_gap]
+            for key in stale:
+                del self._open[key]
+
+    def connected_between(self, start, end):
+        """
+        Intervalos que se solapan con [start, end], ordenados por inicio
+        """
+        start, end = parse_time(start), parse_time(end)
+        with self._lock:
+            rows = self.conn.execute(
+                'SELECT day, user_id, hostname, mac, ip, ap_mac, site, first_seen, last_seen '
+                'FROM intervals WHERE first_seen BETWEEN ? AND ? AND last_seen >= ? '
+                'ORDER BY first_seen',
+                (start - SECONDS_PER_DAY, end, start)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def users_connected_between(self, start, end):
+        """
+        Usuarios de Simpat conectados en algún momento entre start y end: {userID: hostname}
+        """
+        users = {}
+        for interval in self.connected_between(start, end):
+            if interval['user_id']:
+                users.setdefault(interval['user_id'], interval['hostname'])
+        return users
+
+    def hours_per_user_per_day(self, start_day, end_day):
+        """
+        Horas conectadas por usuario y día: [{day, user_id, hostname, hours}].
+        Los intervalos simultáneos del mismo usuario (varios dispositivos) no se suman dos veces.
+        """
+        with self._lock:
+            rows = self.conn.execute(
+                'SELECT day, user_id, hostname, first_seen, last_seen FROM intervals '
+                'WHERE day BETWEEN ? AND ? AND user_id IS NOT NULL '
+                'ORDER BY day, user_id, first_seen',
+                (start_day, end_day)
+            ).fetchall()
+
+        totals = {}
+        spans = {}
+        for row in rows:
+            key = (row['day'], row['user_id'])
+            span = spans.get(key)
+            if span is None:
+                totals[key] = {'day': row['day'], 'user_id': row['user_id'],
+                               'hostname': row['hostname'], 'seconds': 0.0}
+                spans[key] = [row['first_seen'], row['last_seen']]
+            elif row['first_seen'] > span[1]:
+                totals[key]['seconds'] += span[1] - span[0]
+                span[0], span[1] = row['first_seen'], row['last_seen']
+            else:
+                span[1] = max(span[1], row['last_seen'])
+
+        result = []
+        for key, total in totals.items():
+            span = spans[key]
+            seconds = total.pop('seconds') + span[1] - span[0]
+            total['hours'] = round(seconds / 3600, 2)
+            result.append(total)
+        return result
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Consultas al historial de conexiones de Simpat")
+    parser.add_argument('--db', default=DEFAULT_DB_FILE, help=f"Base de datos (por defecto {DEFAULT_DB_FILE})")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    between = subparsers.add_parser('between', help="Quién estuvo conectado entre T1 y T2")
+    between.add_argument('start')
+    between.add_argument('end')
+
+    hours = subparsers.add_parser('hours', help="Horas por usuario por día")
+    hours.add_argument('start_day', help="YYYY-MM-DD")
+    hours.add_argument('end_day', help="YYYY-MM-DD")
+
+    args = parser.parse_args()
+    store = HistoryStore(args.db)
+
+    if args.command == 'between':
+        users = store.users_connected_between(args.start, args.end)
+        print(f"\n👥 Usuarios conectados entre {args.start} y {args.end}: {len(users)}")
+        print("=" * 60)
+        for user_id, hostname in sorted(users.items(), key=lambda item: item[1] or ''):
+            print(f"   👤 {hostname} ({user_id})")
+    else:
+        rows = store.hours_per_user_per_day(args.start_day, args.end_day)
+        print(f"\n⏱️ Horas por usuario por día ({args.start_day} a {args.end_day})")
+        print("=" * 60)
+        for row in rows:
+            print(f"   {row['day']}  {row['hostname']:<30} {row['hours']:>6.2f} h")
+
+    store.close()
+
+if __name__ == "__main__":
+    main()
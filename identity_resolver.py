@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""
+Resolución de identidad de clientes por MAC, tolerante a la rotación de DHCP.
+
+La IP de un cliente solo identifica al usuario mientras dure su concesión DHCP;
+la MAC identifica al equipo. El resolvedor aprende vínculos MAC → usuario la
+primera vez que un equipo aparece con la IP registrada de un usuario, y desde
+entonces lo identifica por su MAC aunque cambie de IP (o no tenga IP). La IP
+solo se usa como respaldo para equipos que aún no tienen vínculo.
+
+Conflictos que se reportan:
+  - ip_reused: una IP registrada aparece en una MAC desconocida mientras esa
+    misma IP está vinculada a otra MAC vigente (o tiene MAC fija); el cliente no
+    se asigna. Un usuario con varias IP registradas puede tener un equipo en cada una.
+  - ip_mismatch: una MAC vinculada a un usuario tiene la IP registrada de otro;
+    gana la MAC.
+
+Los vínculos se guardan en simpat_bindings.json. Una MAC fija en
+simpat_users.json (campo "mac") tiene prioridad sobre los vínculos aprendidos.
+
+    python identity_resolver.py list
+    python identity_resolver.py bind aa:bb:cc:dd:ee:ff USER-ID
+    python identity_resolver.py unbind aa:bb:cc:dd:ee:ff
+    python identity_resolver.py conflicts
+"""
+
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+from unifi_records import int_to_ip, int_to_mac, ip_to_int, mac_to_int
+
+DEFAULT_BINDINGS_FILE = 'simpat_bindings.json'
+# Un vínculo que no se ve en este tiempo se olvida y la IP vuelve a poder enseñar uno nuevo
+DEFAULT_BINDING_TTL = 7 * 86400
+# Cada cuánto se persiste last_seen aunque no haya vínculos nuevos
+SAVE_INTERVAL = 600
+MAX_STORED_CONFLICTS = 200
+
+class Binding:
+    """
+    Vínculo aprendido entre una MAC y un usuario de Simpat; `ip_int` es la IP
+    registrada del usuario que ese equipo ocupa (u ocupó por última vez)
+    """
+    __slots__ = ('mac_int', 'user_id', 'ip_int', 'first_seen', 'last_seen', 'source')
+
+    def __init__(self, mac_int, user_id, ip_int=0, first_seen=0.0, last_seen=0.0, source='learned'):
+        self.mac_int = mac_int
+        self.user_id = user_id
+        self.ip_int = ip_int
+        self.first_seen = first_seen
+        self.last_seen = last_seen
+        self.source = source
+
+    def to_dict(self):
+        return {
+            'mac': int_to_mac(self.mac_int),
+            'user_id': self.user_id,
+            'ip': int_to_ip(self.ip_int) or None,
+            'first_seen': self.first_seen,
+            'last_seen': self.last_seen,
+            'source': self.source,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(mac_to_int(data.get('mac')), data.get('user_id'), ip_to_int(data.get('ip')),
+                   data.get('first_seen', 0.0), data.get('last_seen', 0.0), data.get('source', 'learned'))
+
+class IdentityResolver:
+    """
+    Asigna clientes a usuarios de Simpat por MAC (índice hash) con la IP como respaldo
+    """
+
+    def __init__(self, bindings_file=DEFAULT_BINDINGS_FILE, binding_ttl=DEFAULT_BINDING_TTL):
+        self.bindings_file = bindings_file
+        self.binding_ttl = binding_ttl
+        self.bindings = {}     # mac_int -> Binding
+        self._user_macs = {}   # user_id -> {mac_int: Binding}
+        self.conflicts = []    # Conflictos del último resolve()
+        self.history = []      # Conflictos recientes (persistidos)
+        self._reported = set()
+        self._dirty = False
+        self._saved_at = time.time()
+        self._oldest_seen = float('inf')  # last_seen más antiguo de los aprendidos (cota)
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        """
+        Lee los vínculos guardados; descarta los vencidos
+        """
+        if not self.bindings_file:
+            return
+        try:
+            with open(self.bindings_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            print(f"⚠️ No se pudieron leer los vínculos de identidad: {e}")
+            return
+
+        now = time.time()
+        for entry in data.get('bindings', []):
+            binding = Binding.from_dict(entry)
+            if binding.mac_int and binding.user_id and self._live(binding, now):
+                self._add(binding)
+        self.history = data.get('conflicts', [])[-MAX_STORED_CONFLICTS:]
+
+    def save(self):
+        """
+        Guarda vínculos y conflictos recientes (escritura atómica)
+        """
+        if not self.bindings_file:
+            return
+        data = {
+            'bindings': [binding.to_dict() for binding in self.bindings.values()],
+            'conflicts': self.history[-MAX_STORED_CONFLICTS:],
+        }
+        tmp_file = f'{self.bindings_file}.tmp'
+        try:
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=1)
+            os.replace(tmp_file, self.bindings_file)
+            self._dirty = False
+            self._saved_at = time.time()
+        except OSError as e:
+            print(f"⚠️ No se pudieron guardar los vínculos de identidad: {e}")
+
+    def _add(self, binding):
+        previous = self.bindings.get(binding.mac_int)
+        if previous is not None:
+            self._user_macs.get(previous.user_id, {}).pop(binding.mac_int, None)
+        self.bindings[binding.mac_int] = binding
+        self._user_macs.setdefault(binding.user_id, {})[binding.mac_int] = binding
+        if binding.source != 'manual' and binding.last_seen < self._oldest_seen:
+            self._oldest_seen = binding.last_seen
+        self._dirty = True
+
+    def _remove(self, mac_int):
+        binding = self.bindings.pop(mac_int, None)
+        if binding is not None:
+            self._user_macs.get(binding.user_id, {}).pop(mac_int, None)
+            self._dirty = True
+        return binding
+
+    def _live(self, binding, timestamp):
+        """
+        ¿El vínculo sigue vigente? Los manuales no vencen
+        """
+        return binding.source == 'manual' or timestamp - binding.last_seen <= self.binding_ttl
+
+    def _expire(self, timestamp):
+        """
+        Olvida los vínculos aprendidos que no se ven hace más del TTL, incluidos los
+        de usuarios que ya no están en el directorio. Solo recorre los vínculos si el
+        más antiguo pudo vencer: last_seen solo avanza, así que casi siempre no hace nada.
+        """
+        if timestamp - self.binding_ttl <= self._oldest_seen:
+            return
+        expired = [mac_int for mac_int, binding in self.bindings.items()
+                   if not self._live(binding, timestamp)]
+        for mac_int in expired:
+            self._remove(mac_int)
+        self._oldest_seen = min((binding.last_seen for binding in self.bindings.values()
+                                 if binding.source != 'manual'), default=float('inf'))
+
+    def bind(self, mac, user_id, timestamp=None):
+        """
+        Vincula manualmente una MAC a un usuario (no vence)
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        with self._lock:
+            self._add(Binding(mac_to_int(mac), user_id, 0, timestamp, timestamp, 'manual'))
+            self.save()
+
+    def unbind(self, mac):
+        with self._lock:
+            removed = self._remove(mac_to_int(mac))
+            self.save()
+        return removed
+
+    def _ip_holder(self, user_id, ip_int, timestamp):
+        """
+        MAC vigente vinculada a esa IP registrada del usuario, o 0 si está libre
+        """
+        for binding in self._user_macs.get(user_id, {}).values():
+            if binding.ip_int == ip_int and self._live(binding, timestamp):
+                return binding.mac_int
+        return 0
+
+    def _conflict(self, kind, record, user, other_user, timestamp):
+        conflict = {
+            'type': kind,
+            'timestamp': datetime.fromtimestamp(timestamp).isoformat(timespec='seconds'),
+            'mac': record.mac or None,
+            'ip': record.ip or None,
+            'name': record.display_name,
+            'user_id': user.id if user else None,
+            'ip_user_id': other_user.id if other_user else None,
+        }
+        self.conflicts.append(conflict)
+
+        # Cada conflicto se anuncia una sola vez por proceso
+        key = (kind, record.mac_int, record.ip_int)
+        if key not in self._reported:
+            self._reported.add(key)
+            self.history.append(conflict)
+            self._dirty = True
+            if kind == 'ip_reused':
+                print(f"⚠️ Conflicto: la IP {record.ip} de {other_user.name} la usa un equipo desconocido "
+                      f"({record.mac}, {record.display_name or 'sin nombre'}); no se asigna")
+            else:
+                print(f"⚠️ Conflicto: {record.mac} es de {user.name} pero tiene la IP de {other_user.name} "
+                      f"({record.ip}); se asigna por MAC")
+
+    def resolve(self, records, directory, timestamp=None):
+        """
+        Enlaza cada cliente a su SimpatUser y retorna los que pertenecen a Simpat.
+        Cada cliente cuesta un par de búsquedas en diccionarios.
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        # Una sola versión del directorio para todo el lote
+        index = directory.index
+        by_id = index.by_id
+        by_ip_int = index.by_ip_int
+        by_mac_int = index.by_mac_int
+        bindings = self.bindings
+        cutoff = timestamp - self.binding_ttl
+        simpat_clients = []
+
+        with self._lock:
+            self.conflicts = []
+            for record in records:
+                mac_int = record.mac_int
+                ip_user = by_ip_int.get(record.ip_int) if record.ip_int else None
+                user = None
+
+                if mac_int:
+                    user = by_mac_int.get(mac_int)
+                    if user is None:
+                        binding = bindings.get(mac_int)
+                        if binding is not None and (binding.last_seen >= cutoff or binding.source == 'manual'):
+                            # Si el usuario no está en el directorio (p. ej. el archivo se está
+                            # reemplazando) el vínculo se conserva y vence por TTL, no se borra aquí
+                            user = by_id.get(binding.user_id)
+                            if user is not None:
+                                binding.last_seen = timestamp
+                                if ip_user is not None and ip_user.id == user.id:
+                                    binding.ip_int = record.ip_int
+
+                if user is not None:
+                    if ip_user is not None and ip_user.id != user.id:
+                        self._conflict('ip_mismatch', record, user, ip_user, timestamp)
+                    elif ip_user is not None:
+                        # Usuario con varias IP registradas: la entrada de la IP que ocupa
+                        user = ip_user
+                elif ip_user is not None:
+                    if mac_int:
+                        holder = ip_user.mac_int or self._ip_holder(ip_user.id, record.ip_int, timestamp)
+                        if holder and holder != mac_int:
+                            self._conflict('ip_reused', record, None, ip_user, timestamp)
+                            continue
+                        self._add(Binding(mac_int, ip_user.id, record.ip_int, timestamp, timestamp))
+                    user = ip_user
+
+                if user is not None:
+                    record.simpat_user = user
+                    simpat_clients.append(record)
+
+            self._expire(timestamp)
+            if self._dirty or timestamp - self._saved_at >= SAVE_INTERVAL:
+                self.save()
+
+        return simpat_clients
+
+_resolvers = {}
+_resolvers_lock = threading.Lock()
+
+def get_resolver(bindings_file=DEFAULT_BINDINGS_FILE, **kwargs):
+    """
+    Retorna el resolvedor compartido del proceso para un archivo de vínculos
+    """
+    key = os.path.abspath(bindings_file) if bindings_file else None
+    with _resolvers_lock:
+        resolver = _resolvers.get(key)
+        if resolver is None:
+            resolver = IdentityResolver(bindings_file, **kwargs)
+            _resolvers[key] = resolver
+        return resolver
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Vínculos MAC → usuario de Simpat")
+    parser.add_argument('--file', default=DEFAULT_BINDINGS_FILE,
+                        help=f"Archivo de vínculos (por defecto {DEFAULT_BINDINGS_FILE})")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('list', help="Muestra los vínculos")
+    bind = subparsers.add_parser('bind', help="Vincula una MAC a un usuario (permanente)")
+    bind.add_argument('mac')
+    bind.add_argument('user_id')
+    unbind = subparsers.add_parser('unbind', help="Elimina el vínculo de una MAC")
+    unbind.add_argument('mac')
+    subparsers.add_parser('conflicts', help="Muestra los conflictos recientes")
+    args = parser.parse_args()
+
+    resolver = IdentityResolver(args.file)
+
+    if args.command == 'bind':
+        if not mac_to_int(args.mac):
+            print(f"❌ MAC inválida: {args.mac}")
+            return
+        resolver.bind(args.mac, args.user_id)
+        print(f"🔗 {args.mac} vinculada a {args.user_id}")
+    elif args.command == 'unbind':
+        if resolver.unbind(args.mac):
+            print(f"✂️ Vínculo de {args.mac} eliminado")
+        else:
+            print(f"❌ {args.mac} no tiene vínculo")
+    elif args.command == 'conflicts':
+        print(f"\n⚠️ Conflictos recientes: {len(resolver.history)}")
+        print("=" * 60)
+        for conflict in resolver.history:
+            print(f"   {conflict['timestamp']} {conflict['type']:<12} {conflict['mac']} {conflict['ip']}"
+                  f" (usuario por MAC: {conflict['user_id']}, por IP: {conflict['ip_user_id']})")
+    else:
+        print(f"\n🔗 Vínculos MAC → usuario: {len(resolver.bindings)}")
+        print("=" * 60)
+        for binding in sorted(resolver.bindings.values(), key=lambda item: item.user_id):
+            last_seen = datetime.fromtimestamp(binding.last_seen).strftime('%Y-%m-%d %H:%M')
+            print(f"   {int_to_mac(binding.mac_int)}  {binding.user_id:<20} "
+                  f"{int_to_ip(binding.ip_int) or '-':<15} {binding.source:<8} visto {last_seen}")
+
+if __name__ == "__main__":
+    main()
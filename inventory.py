@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+"""
+Inventario de dispositivos (UDM/APs) y carga de clientes por AP.
+
+Los dispositivos de stat/device cambian poco y son caros de descargar, así que
+se guardan en caché con un TTL largo (1 hora por defecto); los clientes de
+stat/sta usan un TTL corto (30 s). Ambos se cruzan en memoria por `ap_mac`:
+las consultas de carga por AP solo descargan clientes; con la caché de
+dispositivos vencida usan la copia anterior (marcada `stale`) y la renuevan en
+segundo plano. Si una descarga falla se sigue usando la copia anterior. Los
+errores de las descargas van a stderr.
+
+    python inventory.py aps
+    python inventory.py devices --json
+    python inventory.py export        # actualiza todos_dispositivos.json y dispositivos_conectados.json
+"""
+
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+
+import requests
+
+from api_request import fetch_clients_json, load_identity_resolver, load_simpat_directory, match_simpat_clients
+from metrics import metrics
+from resilience import CircuitOpenError
+from unifi_config import get_config
+from unifi_records import ClientRecord, int_to_mac, mac_to_int
+from unifi_session import UnifiAuthError, get_session_manager
+
+DEVICES_API_PATH = '/api/s/{site}/stat/device'
+DEFAULT_DEVICE_TTL = 3600
+DEFAULT_CLIENT_TTL = 30
+DEVICES_FILE = 'todos_dispositivos.json'
+CONNECTED_DEVICES_FILE = 'dispositivos_conectados.json'
+
+FETCH_ERRORS = (requests.RequestException, ValueError, CircuitOpenError, UnifiAuthError)
+
+class TtlCache:
+    """
+    Un valor con vigencia; `get` lo recarga con `loader` solo si venció
+    """
+
+    def __init__(self, loader, ttl):
+        self.loader = loader
+        self.ttl = ttl
+        self.value = None
+        self.fetched_at = 0.0
+        self.failed = False  # la última recarga falló (se sigue sirviendo la copia anterior)
+        self._lock = threading.Lock()
+
+    def fresh(self, now=None):
+        now = time.monotonic() if now is None else now
+        return self.value is not None and now - self.fetched_at < self.ttl
+
+    def get(self, force=False):
+        if not force and self.fresh():
+            return self.value
+        with self._lock:
+            # Otro hilo pudo recargarlo mientras se esperaba el candado
+            if not force and self.fresh():
+                return self.value
+            return self._reload()
+
+    def refresh_in_background(self):
+        """
+        Si venció, lo recarga en un hilo aparte sin esperar; no lanza otra recarga
+        si ya hay una en curso. Retorna True si la inició.
+        """
+        if self.fresh() or not self._lock.acquire(blocking=False):
+            return False
+
+        def reload():
+            try:
+                self._reload()
+            finally:
+                self._lock.release()
+
+        threading.Thread(target=reload, daemon=True).start()
+        return True
+
+    def _reload(self):
+        value = self.loader()
+        self.failed = value is None
+        if value is not None:
+            self.value = value
+            self.fetched_at = time.monotonic()
+        return self.value
+
+    def invalidate(self):
+        self.fetched_at = 0.0
+
+class Device:
+    """
+    Dispositivo de red (UDM, AP o switch) de stat/device
+    """
+    __slots__ = ('mac_int', 'name', 'ip', 'model', 'type', 'online')
+
+    def __init__(self, data):
+        self.mac_int = mac_to_int(data.get('mac'))
+        self.name = data.get('name') or data.get('model') or data.get('mac')
+        self.ip = data.get('ip')
+        self.model = data.get('model')
+        self.type = data.get('type')
+        # state 1 = conectado en UniFi
+        self.online = data.get('state') == 1
+
+    @property
+    def mac(self):
+        return int_to_mac(self.mac_int)
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'ip': self.ip,
+            'status': 'online' if self.online else 'offline',
+            'mac': self.mac or None,
+            'model': self.model,
+            'type': self.type,
+        }
+
+class Inventory:
+    """
+    Dispositivos (TTL largo) y clientes (TTL corto) de un sitio, cruzados por AP
+    """
+
+    def __init__(self, manager, site=None, device_ttl=DEFAULT_DEVICE_TTL, client_ttl=DEFAULT_CLIENT_TTL):
+        self.manager = manager
+        self.site = site or get_config().site
+        self._devices = TtlCache(self._load_devices, device_ttl)
+        self._clients = TtlCache(self._load_clients, client_ttl)
+
+    def _load_devices(self):
+        path = DEVICES_API_PATH.format(site=self.site)
+        try:
+            if not self.manager.ensure_authenticated():
+                return None
+            with metrics.timer('fetch', source='devices'):
+                response = self.manager.get(path)
+                if response.status_code != 200:
+                    print(f"❌ Error accediendo a los dispositivos: {response.status_code}", file=sys.stderr)
+                    metrics.inc('errors', stage='fetch_devices')
+                    return None
+                data = response.json().get('data') or []
+        except FETCH_ERRORS as e:
+            print(f"⚠️ Error leyendo los dispositivos: {e}", file=sys.stderr)
+            metrics.inc('errors', stage='fetch_devices')
+            return None
+
+        devices = {}
+        for item in data:
+            device = Device(item)
+            if device.mac_int:
+                devices[device.mac_int] = device
+        return devices
+
+    def _load_clients(self):
+        try:
+            if not self.manager.ensure_authenticated():
+                return None
+            stations = fetch_clients_json(self.manager, self.site)
+        except FETCH_ERRORS as e:
+            print(f"⚠️ Error leyendo los clientes: {e}", file=sys.stderr)
+            metrics.inc('errors', stage='fetch_json')
+            return None
+        if stations is None:
+            return None
+
+        records = [ClientRecord.from_api(station, site=self.site, controller=self.manager.base_url)
+                   for station in stations]
+        # El matching deja enlazado el SimpatUser en cada registro que pertenece a Simpat
+        match_simpat_clients(records, load_simpat_directory(), load_identity_resolver())
+        return records
+
+    def devices(self, force=False):
+        """
+        Dispositivos por MAC (entero); se descargan solo si venció el TTL largo
+        """
+        return self._devices.get(force) or {}
+
+    def clients(self, force=False):
+        """
+        Todos los clientes conectados (los de Simpat con su SimpatUser enlazado)
+        """
+        return self._clients.get(force) or []
+
+    def ap_load(self):
+        """
+        Carga por AP, de mayor a menor cantidad de clientes: total de clientes,
+        clientes de Simpat y usuarios de Simpat distintos. Solo espera a los
+        dispositivos si nunca se descargaron; vencidos, usa la copia anterior
+        (`stale` en cada fila) y los renueva en segundo plano.
+        """
+        if self._devices.value is None:
+            devices = self.devices()
+        else:
+            self._devices.refresh_in_background()
+            devices = self._devices.value
+        stale = not self._devices.fresh()
+        load = {}
+        for client in self.clients():
+            entry = load.get(client.ap_mac_int)
+            if entry is None:
+                entry = load[client.ap_mac_int] = {'clients': 0, 'simpat_clients': 0, 'users': set()}
+            entry['clients'] += 1
+            if client.simpat_user is not None:
+                entry['simpat_clients'] += 1
+                entry['users'].add(client.simpat_user.id)
+
+        result = []
+        for ap_mac_int, entry in load.items():
+            device = devices.get(ap_mac_int)
+            result.append({
+                'ap_mac': int_to_mac(ap_mac_int) or None,
+                'name': device.name if device else ('Sin AP' if not ap_mac_int else 'AP desconocido'),
+                'ip': device.ip if device else None,
+                'model': device.model if device else None,
+                'clients': entry['clients'],
+                'simpat_clients': entry['simpat_clients'],
+                'simpat_users': len(entry['users']),
+                'stale': stale,
+            })
+        result.sort(key=lambda row: (-row['clients'], row['name'] or ''))
+        return result
+
+    def export(self, devices_file=DEVICES_FILE, connected_file=CONNECTED_DEVICES_FILE):
+        """
+        Reescribe los archivos de inventario del repositorio con los dispositivos actuales.
+        Si los dispositivos no se pudieron descargar no se toca nada; retorna True si se escribió.
+        """
+        self._devices.get()
+        if self._devices.value is None:
+            print(f"❌ No se pudieron obtener los dispositivos; {devices_file} y {connected_file} no se modifican")
+            return False
+
+        devices = sorted(self._devices.value.values(), key=lambda device: device.name or '')
+        all_devices = [{'name': device.name, 'ip': device.ip, 'status': 'online' if device.online else 'offline'}
+                       for device in devices]
+        for file_name, items in ((devices_file, all_devices),
+                                 (connected_file, [item for item in all_devices if item['status'] == 'online'])):
+            # Escritura atómica: un corte a mitad no deja el archivo versionado truncado
+            tmp_file = f'{file_name}.tmp'
+            try:
+                with open(tmp_file, 'w', encoding='utf-8') as f:
+                    json.dump(items, f, ensure_ascii=False, indent=2)
+                os.replace(tmp_file, file_name)
+            except OSError as e:
+                print(f"❌ No se pudo guardar {file_name}: {e}")
+                return False
+            print(f"💾 {len(items)} dispositivos guardados en {file_name}")
+        return True
+
+    @property
+    def loaded(self):
+        """
+        ¿Hay una lista de clientes (actual o anterior) para calcular la carga por AP?
+        """
+        return self._clients.value is not None
+
+    @property
+    def failed(self):
+        """
+        ¿Falló la última descarga de dispositivos o de clientes?
+        """
+        return self._devices.failed or self._clients.failed
+
+_inventories = {}
+_inventories_lock = threading.Lock()
+
+def get_inventory(manager, site=None, **kwargs):
+    """
+    Inventario compartido del proceso para un controlador y sitio
+    """
+    key = (manager.base_url, site or get_config().site)
+    with _inventories_lock:
+        inventory = _inventories.get(key)
+        if inventory is None:
+            inventory = _inventories[key] = Inventory(manager, key[1], **kwargs)
+    return inventory
+
+def print_ap_load(rows):
+    print(f"\n📶 Carga por AP ({len(rows)} APs)")
+    print("=" * 60)
+    for row in rows:
+        print(f"   {row['name']:<24} {row['clients']:>4} clientes  "
+              f"{row['simpat_users']:>3} usuarios Simpat  {row['ap_mac'] or ''}")
+
+def watch_ap_load(inventory, as_json=False, watch=None):
+    """
+    Muestra la carga por AP; con `watch` la repite cada tantos segundos hasta Ctrl+C.
+    Retorna False si la última consulta no se pudo hacer.
+    """
+    ok = True
+    try:
+        while True:
+            # El detalle de las descargas (y sus errores) va a stderr; stdout queda para la tabla
+            with contextlib.redirect_stdout(sys.stderr):
+                rows = inventory.ap_load()
+            ok = inventory.loaded
+            if not ok:
+                print("❌ No se pudieron obtener los clientes; no hay carga por AP que mostrar", file=sys.stderr)
+            else:
+                if inventory.failed:
+                    print("⚠️ La última descarga falló: se muestran los datos anteriores", file=sys.stderr)
+                if as_json:
+                    print(json.dumps(rows, ensure_ascii=False), flush=True)
+                else:
+                    print_ap_load(rows)
+            if not watch:
+                break
+            time.sleep(watch)
+    except KeyboardInterrupt:
+        pass
+    return ok
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Inventario de dispositivos y carga de clientes por AP")
+    parser.add_argument('--device-ttl', type=float, default=DEFAULT_DEVICE_TTL,
+                        help=f"Vigencia de la lista de dispositivos en segundos (por defecto {DEFAULT_DEVICE_TTL})")
+    parser.add_argument('--client-ttl', type=float, default=DEFAULT_CLIENT_TTL,
+                        help=f"Vigencia de la lista de clientes en segundos (por defecto {DEFAULT_CLIENT_TTL})")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    aps = subparsers.add_parser('aps', help="Clientes y usuarios de Simpat por AP")
+    aps.add_argument('--json', action='store_true', help="Salida en JSON")
+    aps.add_argument('--watch', type=float, metavar='SEGUNDOS',
+                     help="Repite la consulta (los dispositivos se descargan solo al vencer su TTL)")
+    devices = subparsers.add_parser('devices', help="Dispositivos del sitio")
+    devices.add_argument('--json', action='store_true', help="Salida en JSON")
+    subparsers.add_parser('export', help=f"Actualiza {DEVICES_FILE} y {CONNECTED_DEVICES_FILE}")
+    args = parser.parse_args()
+
+    config = get_config()
+    if not config.complete:
+        print("❌ Faltan variables de entorno")
+        return
+
+    inventory = get_inventory(get_session_manager(config.url, config.username, config.password),
+                              device_ttl=args.device_ttl, client_ttl=args.client_ttl)
+
+    if args.command == 'export':
+        if not inventory.export():
+            sys.exit(1)
+        return
+
+    if args.command == 'devices':
+        items = [device.to_dict() for device in inventory.devices().values()]
+        if args.json:
+            print(json.dumps(items, ensure_ascii=False, indent=2))
+        else:
+            print(f"\n🖧 Dispositivos: {len(items)}")
+            print("=" * 60)
+            for item in items:
+                icon = '🟢' if item['status'] == 'online' else '🔴'
+                print(f"   {icon} {item['name']:<24} {item['ip'] or 'Sin IP':<16} {item['model'] or ''}")
+        return
+
+    if not watch_ap_load(inventory, args.json, args.watch):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Generador de carga para el recolector de clientes.
+
+Ejecuta sondeos de stat/sta en paralelo (con el mismo gestor de sesión que usa
+api_request) contra el controlador simulado o una URL dada, y reporta sondeos
+por segundo, latencias, errores y el costo de login/reintentos.
+
+    python load_test.py --clients 2000 --latency 0.02 --error-rate 0.05 --session-ttl 5
+"""
+
+import contextlib
+import io
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from api_request import fetch_clients_json
+from mock_unifi import MockConfig, start_mock_server
+from unifi_session import UnifiSessionManager
+
+DEFAULT_POLLS = 200
+DEFAULT_CONCURRENCY = 4
+
+def _percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+def run_load_test(url, username='admin', password='admin', polls=DEFAULT_POLLS,
+                  concurrency=DEFAULT_CONCURRENCY, site='default'):
+    """
+    Ejecuta `polls` sondeos con `concurrency` hilos y retorna las métricas
+    """
+    manager = UnifiSessionManager(url, username, password, cache_file=None,
+                                  pool_size=max(10, concurrency))
+    latencies = []
+    failures = []
+    client_counts = []
+    lock = threading.Lock()
+
+    def poll(_):
+        started = time.perf_counter()
+        try:
+            clients = fetch_clients_json(manager, site=site)
+            error = None if clients is not None else 'status != 200'
+        except Exception as e:
+            clients, error = None, type(e).__name__
+        elapsed = time.perf_counter() - started
+
+        with lock:
+            latencies.append(elapsed)
+            if error:
+                failures.append(error)
+            else:
+                client_counts.append(len(clients))
+
+    started = time.perf_counter()
+    # Los print de cada sondeo se descartan para no medir la consola
+    with contextlib.redirect_stdout(io.StringIO()):
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(poll, range(polls)))
+    wall_time = time.perf_counter() - started
+    manager.close()
+
+    errors_by_type = {}
+    for error in failures:
+        errors_by_type[error] = errors_by_type.get(error, 0) + 1
+
+    return {
+        'polls': polls,
+        'concurrency': concurrency,
+        'wall_time_s': round(wall_time, 3),
+        'polls_per_second': round(polls / wall_time, 1) if wall_time else 0.0,
+        'ok': polls - len(failures),
+        'errors': errors_by_type,
+        'logins': manager.login_count,
+        'latency_ms': {
+            'p50': round(_percentile(latencies, 0.50) * 1000, 1),
+            'p95': round(_percentile(latencies, 0.95) * 1000, 1),
+            'max': round(max(latencies, default=0.0) * 1000, 1),
+            'mean': round(statistics.fmean(latencies) * 1000, 1) if latencies else 0.0,
+        },
+        'clients_per_poll': max(client_counts, default=0),
+    }
+
+def print_report(report, mock_stats=None):
+    """
+    Muestra el resultado de la prueba de carga
+    """
+    print(f"\n📈 Prueba de carga: {report['polls']} sondeos, {report['concurrency']} en paralelo")
+    print("=" * 60)
+    print(f"⏱️ Tiempo total: {report['wall_time_s']} s ({report['polls_per_second']} sondeos/s)")
+    print(f"✅ Exitosos: {report['ok']} ({report['clients_per_poll']} clientes por sondeo)")
+    print(f"❌ Errores: {sum(report['errors'].values())} {report['errors'] or ''}")
+    latency = report['latency_ms']
+    print(f"📊 Latencia: p50 {latency['p50']} ms, p95 {latency['p95']} ms, máx {latency['max']} ms")
+    print(f"🔐 Logins del recolector: {report['logins']}")
+    if mock_stats:
+        print(f"🧪 Servidor: {mock_stats['requests']} peticiones, {mock_stats['logins']} logins, "
+              f"{mock_stats['unauthorized']} respuestas 401, {mock_stats['errors_injected']} errores inyectados")
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Prueba de carga del recolector de clientes UniFi")
+    parser.add_argument('--url', help="Controlador a probar (por defecto se inicia el simulado)")
+    parser.add_argument('--username', default='admin')
+    parser.add_argument('--password', default='admin')
+    parser.add_argument('--site', default='default')
+    parser.add_argument('--polls', type=int, default=DEFAULT_POLLS)
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument('--clients', type=int, default=100, help="Clientes del controlador simulado")
+    parser.add_argument('--latency', type=float, default=0.0, help="Latencia del controlador simulado")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Tasa de errores del controlador simulado")
+    parser.add_argument('--session-ttl', type=float, default=3600, help="Vigencia de sesión del controlador simulado")
+    args = parser.parse_args()
+
+    mock_server = None
+    target_url = args.url
+    if not target_url:
+        mock_server = start_mock_server(MockConfig(
+            clients=args.clients, latency=args.latency,
+            error_rate=args.error_rate, session_ttl=args.session_ttl,
+        ))
+        target_url = mock_server.url
+        print(f"🧪 Controlador simulado en {target_url}")
+
+    result = run_load_test(target_url, args.username, args.password, args.polls,
+                           args.concurrency, args.site)
+    print_report(result, dict(mock_server.state.stats) if mock_server else None)
+
+    if mock_server:
+        mock_server.shutdown()
@@ -0,0 +1,195 @@
+"""
+Métricas del recolector: contadores y tiempos por etapa de cada sondeo.
+
+    with metrics.timer('fetch', source='json'):
+        ...
+    metrics.inc('bytes_received', len(chunk), source='json')
+
+Se exponen en formato de texto de Prometheus (GET /metrics con
+start_metrics_server) y como log estructurado: end_poll() agrega una línea JSON
+por sondeo con el desglose de tiempos y conteos de ese sondeo.
+"""
+
+import json
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PREFIX = 'simpat'
+
+# Ayuda de las métricas conocidas (por nombre corto)
+DESCRIPTIONS = {
+    'login': 'Tiempo de autenticación contra el controlador',
+    'fetch': 'Tiempo de descarga de clientes por fuente (json/html)',
+    'parse': 'Tiempo de parseo por estrategia de extracción',
+    'match': 'Tiempo de matching de clientes contra usuarios Simpat',
+    'output': 'Tiempo de escritura de resultados',
+    'throughput': 'Tiempo de cálculo de tasas de transferencia',
+    'poll': 'Duración total de un sondeo',
+    'logins': 'Logins realizados',
+    'bytes_received': 'Bytes recibidos del controlador por fuente',
+    'clients_found': 'Clientes reportados por el controlador',
+    'matches': 'Clientes asignados a usuarios Simpat',
+    'retries': 'Reintentos de peticiones al controlador',
+    'stale_snapshots': 'Sondeos servidos con datos viejos (circuito abierto)',
+    'events': 'Eventos del controlador aplicados por tipo',
+    'resyncs': 'Resincronizaciones completas de la lista de clientes',
+    'errors': 'Errores por etapa',
+}
+
+def _series_key(name, labels):
+    return (name, tuple(sorted(labels.items())))
+
+def _label_value(value):
+    """
+    Valor de etiqueta escapado para Prometheus: barra invertida, comillas y saltos de línea
+    """
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _poll_key(name, labels):
+    return '.'.join([name] + [str(value) for _, value in sorted(labels.items())])
+
+class MetricsRegistry:
+    """
+    Contadores y temporizadores con etiquetas, acumulados en el proceso y por sondeo
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}   # (name, labels) -> valor
+        self.timers = {}     # (name, labels) -> [suma, cantidad, máximo]
+        self._poll_counts = {}
+        self._poll_timings = {}
+        self.log_file = None
+
+    def inc(self, name, value=1, **labels):
+        key = _series_key(name, labels)
+        poll_key = _poll_key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+            self._poll_counts[poll_key] = self._poll_counts.get(poll_key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        key = _series_key(name, labels)
+        poll_key = _poll_key(name, labels)
+        with self._lock:
+            stats = self.timers.get(key)
+            if stats is None:
+                stats = self.timers[key] = [0.0, 0, 0.0]
+            stats[0] += seconds
+            stats[1] += 1
+            stats[2] = max(stats[2], seconds)
+            self._poll_timings[poll_key] = self._poll_timings.get(poll_key, 0.0) + seconds
+
+    @contextmanager
+    def timer(self, name, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def render_prometheus(self):
+        """
+        Exposición en formato de texto de Prometheus
+        """
+        with self._lock:
+            counters = sorted(self.counters.items())
+            timers = sorted(self.timers.items())
+
+        def labels_text(labels):
+            if not labels:
+                return ''
+            return '{' + ','.join(f'{name}="{_label_value(value)}"' for name, value in labels) + '}'
+
+        lines = []
+        described = set()
+        for (name, labels), value in counters:
+            metric = f'{PREFIX}_{name}_total'
+            if metric not in described:
+                described.add(metric)
+                lines.append(f'# HELP {metric} {DESCRIPTIONS.get(name, name)}')
+                lines.append(f'# TYPE {metric} counter')
+            lines.append(f'{metric}{labels_text(labels)} {value}')
+
+        groups = {}
+        for (name, labels), stats in timers:
+            groups.setdefault(name, []).append((labels, stats))
+
+        for name, series in groups.items():
+            metric = f'{PREFIX}_{name}_seconds'
+            lines.append(f'# HELP {metric} {DESCRIPTIONS.get(name, name)}')
+            lines.append(f'# TYPE {metric} summary')
+            for labels, (total, count, _) in series:
+                lines.append(f'{metric}_sum{labels_text(labels)} {total:.6f}')
+                lines.append(f'{metric}_count{labels_text(labels)} {count}')
+            lines.append(f'# HELP {metric}_max Máximo de {metric}')
+            lines.append(f'# TYPE {metric}_max gauge')
+            for labels, (_, _, maximum) in series:
+                lines.append(f'{metric}_max{labels_text(labels)} {maximum:.6f}')
+
+        return '\n'.join(lines) + '\n'
+
+    def configure_log(self, log_file):
+        """
+        Archivo JSONL donde end_poll() agrega el resumen de cada sondeo (None para desactivar)
+        """
+        self.log_file = log_file
+
+    def end_poll(self, **fields):
+        """
+        Cierra el sondeo actual: retorna su resumen y, si hay log configurado, lo agrega como línea JSON
+        """
+        with self._lock:
+            record = {
+                'timestamp': datetime.now().isoformat(timespec='seconds'),
+                'event': 'poll',
+                'timings_ms': {key: round(seconds * 1000, 2) for key, seconds in sorted(self._poll_timings.items())},
+                'counts': dict(sorted(self._poll_counts.items())),
+            }
+            record.update(fields)
+            self._poll_counts = {}
+            self._poll_timings = {}
+
+        if self.log_file:
+            try:
+                with open(self.log_file, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(record, ensure_ascii=False) + '\n')
+            except OSError as e:
+                print(f"⚠️ No se pudo escribir el log de métricas: {e}")
+        return record
+
+# Registro compartido del proceso
+metrics = MetricsRegistry()
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """
+    Sirve GET /metrics
+    """
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split('?', 1)[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = self.server.registry.render_prometheus().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+def start_metrics_server(port, host='127.0.0.1', registry=None):
+    """
+    Inicia el endpoint /metrics en un hilo; retorna el servidor
+    """
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    server.registry = registry or metrics
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"📊 Métricas en http://{host}:{server.server_port}/metrics")
+    return server
@@ -0,0 +1,474 @@
+#!/usr/bin/env python3
+"""
+Controlador UniFi simulado para pruebas de carga sin un UDM real.
+
+Implementa /api/auth/login, /api/s/{site}/stat/sta, /api/s/{site}/stat/device
+y /network/{site}/clients/main (sirviendo las capturas HTML del repositorio),
+con cantidad de clientes, latencia, tasa de errores y expiración de sesión
+configurables. /mock/stats expone los contadores del servidor.
+
+/wss/s/{site}/events es un websocket mínimo (solo stdlib, RFC 6455) que envía
+eventos de conexión, desconexión y roaming; con --churn se genera uno cada
+tantos segundos y stat/sta refleja los mismos cambios.
+
+    python mock_unifi.py --port 8765 --clients 500 --latency 0.05 --error-rate 0.01
+    python mock_unifi.py --port 8765 --churn 2
+"""
+
+import base64
+import glob
+import hashlib
+import json
+import queue
+import random
+import re
+import secrets
+import struct
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_PORT = 8765
+DEFAULT_CLIENTS = 100
+DEFAULT_SESSION_TTL = 3600
+DEFAULT_AP_COUNT = 3
+
+STAT_PATH_RE = re.compile(r'^/api/s/(?P<site>[^/]+)/stat/(?P<kind>sta|device)$')
+CLIENTS_PAGE_RE = re.compile(r'^/network/(?P<site>[^/]+)/clients/main$')
+EVENTS_WS_RE = re.compile(r'^/wss/s/(?P<site>[^/]+)/events$')
+WS_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+WS_PING_INTERVAL = 15
+
+def _fake_jwt(expires_at):
+    """
+    Token con formato JWT (sin firma real) que incluye la expiración en `exp`
+    """
+    def encode(data):
+        return base64.urlsafe_b64encode(json.dumps(data).encode()).decode().rstrip('=')
+    return f"{encode({'alg': 'none'})}.{encode({'exp': int(expires_at)})}.{secrets.token_hex(8)}"
+
+def _ws_frame(payload, opcode=0x1):
+    """
+    Trama websocket del servidor (sin máscara, un solo fragmento)
+    """
+    if isinstance(payload, str):
+        payload = payload.encode('utf-8')
+    length = len(payload)
+    if length < 126:
+        header = struct.pack('!BB', 0x80 | opcode, length)
+    elif length < 1 << 16:
+        header = struct.pack('!BBH', 0x80 | opcode, 126, length)
+    else:
+        header = struct.pack('!BBQ', 0x80 | opcode, 127, length)
+    return header + payload
+
+class MockConfig:
+    """
+    Parámetros del controlador simulado
+    """
+
+    def __init__(self, clients=DEFAULT_CLIENTS, latency=0.0, jitter=0.0, error_rate=0.0,
+                 session_ttl=DEFAULT_SESSION_TTL, username=None, password=None,
+                 ap_count=DEFAULT_AP_COUNT, users_file='simpat_users.json', html_file=None,
+                 churn=0.0):
+        self.clients = clients
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.session_ttl = session_ttl
+        self.username = username
+        self.password = password
+        self.ap_count = ap_count
+        self.users_file = users_file
+        self.html_file = html_file
+        self.churn = churn
+
+class MockState:
+    """
+    Estado compartido del servidor: sesiones, datos generados y contadores
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.started = time.time()
+        self.sessions = {}
+        self.lock = threading.Lock()
+        self.stats = {'logins': 0, 'requests': 0, 'errors_injected': 0, 'unauthorized': 0, 'events_sent': 0}
+        self.devices = self._build_devices()
+        self.stations = self._build_stations()
+        self.offline = set()       # índices de estaciones desconectadas
+        self.subscribers = set()   # colas de los websockets de eventos abiertos
+        self.html = self._load_html()
+
+    def _build_devices(self):
+        devices = []
+        for i in range(self.config.ap_count):
+            devices.append({
+                'mac': f'f0:9f:c2:00:00:{i:02x}',
+                'ip': f'10.0.0.{100 + i}',
+                'name': f'UAP-AC-Pro {i + 1}',
+                'model': 'U7PG2',
+                'type': 'uap',
+                'state': 1,
+            })
+        return devices
+
+    def _build_stations(self):
+        """
+        Genera los clientes; los primeros usan las IPs de simpat_users.json para que haya coincidencias
+        """
+        try:
+            with open(self.config.users_file, 'r', encoding='utf-8') as f:
+                users = json.load(f).get('users', [])
+        except (OSError, ValueError):
+            users = []
+
+        stations = []
+        for i in range(self.config.clients):
+            if i < len(users):
+                ip = users[i]['ip']
+                hostname = users[i].get('hostname', f'host-{i}')
+            else:
+                ip = f'10.{1 + i // 65024}.{(i // 254) % 256}.{1 + i % 254}'
+                hostname = f'host-{i}'
+            stations.append({
+                'mac': f'02:00:{(i >> 24) & 0xff:02x}:{(i >> 16) & 0xff:02x}:{(i >> 8) & 0xff:02x}:{i & 0xff:02x}',
+                'ip': ip,
+                'hostname': hostname,
+                'ap_mac': self.devices[i % len(self.devices)]['mac'] if self.devices else None,
+                'tx_rate': random.randint(1_000, 2_000_000),
+                'rx_rate': random.randint(1_000, 2_000_000),
+            })
+        return stations
+
+    def _load_html(self):
+        html_file = self.config.html_file
+        if not html_file:
+            captures = sorted(glob.glob('unifi_response_*.html'))
+            html_file = captures[-1] if captures else None
+        if not html_file:
+            return '<!doctype html><html><body></body></html>'
+        with open(html_file, 'r', encoding='utf-8') as f:
+            return f.read()
+
+    def station_payload(self):
+        """
+        Clientes con contadores de bytes que crecen con el tiempo
+        """
+        elapsed = time.time() - self.started
+        data = []
+        with self.lock:
+            offline = set(self.offline)
+        for index, station in enumerate(self.stations):
+            if index in offline:
+                continue
+            data.append({
+                'mac': station['mac'],
+                'ip': station['ip'],
+                'hostname': station['hostname'],
+                'ap_mac': station['ap_mac'],
+                'tx_bytes': int(station['tx_rate'] * elapsed),
+                'rx_bytes': int(station['rx_rate'] * elapsed),
+            })
+        return data
+
+    def publish(self, message, data):
+        """
+        Envía un mensaje a todos los websockets de eventos abiertos
+        """
+        payload = json.dumps({'meta': {'rc': 'ok', 'message': message}, 'data': data})
+        with self.lock:
+            subscribers = list(self.subscribers)
+            self.stats['events_sent'] += len(subscribers)
+        for subscriber in subscribers:
+            subscriber.put(payload)
+
+    def _event(self, key, station, **fields):
+        event = {'key': key, 'user': station['mac'], 'hostname': station['hostname'],
+                 'time': int(time.time() * 1000), 'site_id': 'default'}
+        event.update(fields)
+        return event
+
+    def connect_station(self, index):
+        station = self.stations[index]
+        with self.lock:
+            self.offline.discard(index)
+        self.publish('events', [self._event('EVT_WU_Connected', station, ap=station['ap_mac'])])
+        # Como el controlador real, los datos completos (con IP) llegan en un sta:sync aparte
+        self.publish('sta:sync', [{'mac': station['mac'], 'ip': station['ip'], 'hostname': station['hostname'],
+                                   'ap_mac': station['ap_mac']}])
+
+    def disconnect_station(self, index):
+        station = self.stations[index]
+        with self.lock:
+            self.offline.add(index)
+        self.publish('events', [self._event('EVT_WU_Disconnected', station, ap=station['ap_mac'])])
+
+    def roam_station(self, index):
+        station = self.stations[index]
+        if len(self.devices) < 2:
+            return
+        previous = station['ap_mac']
+        station['ap_mac'] = random.choice([device['mac'] for device in self.devices if device['mac'] != previous])
+        self.publish('events', [self._event('EVT_WU_Roam', station, ap_from=previous, ap_to=station['ap_mac'])])
+
+    def churn_step(self):
+        """
+        Conecta, desconecta o mueve de AP una estación al azar
+        """
+        if not self.stations:
+            return
+        index = random.randrange(len(self.stations))
+        if index in self.offline:
+            self.connect_station(index)
+        elif random.random() < 0.5:
+            self.disconnect_station(index)
+        else:
+            self.roam_station(index)
+
+    def create_session(self):
+        token = _fake_jwt(time.time() + self.config.session_ttl)
+        csrf = secrets.token_hex(16)
+        with self.lock:
+            self.sessions[token] = time.time() + self.config.session_ttl
+            self.stats['logins'] += 1
+        return token, csrf
+
+    def valid_session(self, token):
+        with self.lock:
+            expires_at = self.sessions.get(token)
+            if expires_at is None:
+                return False
+            if expires_at < time.time():
+                del self.sessions[token]
+                return False
+            return True
+
+    def count(self, key):
+        with self.lock:
+            self.stats[key] += 1
+
+    def expire_sessions(self):
+        """
+        Invalida todas las sesiones (simula un reinicio del controlador)
+        """
+        with self.lock:
+            self.sessions.clear()
+
+class MockUnifiHandler(BaseHTTPRequestHandler):
+    """
+    Manejador HTTP del controlador simulado
+    """
+    server_version = 'MockUniFi/1.0'
+    protocol_version = 'HTTP/1.1'
+
+    @property
+    def state(self) -> MockState:
+        return self.server.state
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, content_type='application/json', headers=None):
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body)
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _session_token(self):
+        cookies = self.headers.get('Cookie', '')
+        for part in cookies.split(';'):
+            name, _, value = part.strip().partition('=')
+            if name == 'TOKEN':
+                return value
+        return None
+
+    def _simulate_conditions(self):
+        """
+        Aplica la latencia configurada y, según la tasa de errores, responde 500.
+        Retorna True si ya se envió una respuesta de error.
+        """
+        config = self.state.config
+        self.state.count('requests')
+        if config.latency or config.jitter:
+            time.sleep(config.latency + random.uniform(0, config.jitter))
+        if config.error_rate and random.random() < config.error_rate:
+            self.state.count('errors_injected')
+            self._send(500, {'meta': {'rc': 'error', 'msg': 'api.err.Internal'}, 'data': []})
+            return True
+        return False
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        raw_body = self.rfile.read(length) if length else b''
+
+        if self.path != '/api/auth/login':
+            self._send(404, {'meta': {'rc': 'error', 'msg': 'api.err.NotFound'}, 'data': []})
+            return
+        if self._simulate_conditions():
+            return
+
+        try:
+            credentials = json.loads(raw_body or b'{}')
+        except ValueError:
+            credentials = {}
+
+        config = self.state.config
+        if ((config.username and credentials.get('username') != config.username)
+                or (config.password and credentials.get('password') != config.password)):
+            self._send(401, {'meta': {'rc': 'error', 'msg': 'api.err.Invalid'}, 'data': []})
+            return
+
+        token, csrf = self.state.create_session()
+        self._send(200, {'username': credentials.get('username')}, headers={
+            'Set-Cookie': f'TOKEN={token}; Path=/; HttpOnly',
+            'X-CSRF-Token': csrf,
+        })
+
+    def do_GET(self):
+        path = self.path.split('?', 1)[0]
+
+        if path == '/mock/stats':
+            with self.state.lock:
+                stats = dict(self.state.stats, active_sessions=len(self.state.sessions))
+            self._send(200, stats)
+            return
+
+        events_match = EVENTS_WS_RE.match(path)
+        if events_match:
+            self._serve_events()
+            return
+
+        page_match = CLIENTS_PAGE_RE.match(path)
+        stat_match = STAT_PATH_RE.match(path)
+        if not page_match and not stat_match:
+            self._send(404, {'meta': {'rc': 'error', 'msg': 'api.err.NotFound'}, 'data': []})
+            return
+
+        if self._simulate_conditions():
+            return
+
+        if page_match:
+            # La página SPA se sirve aunque no haya sesión, como en UniFi OS
+            self._send(200, self.state.html, content_type='text/html; charset=utf-8')
+            return
+
+        if not self.state.valid_session(self._session_token()):
+            self.state.count('unauthorized')
+            self._send(401, {'meta': {'rc': 'error', 'msg': 'api.err.LoginRequired'}, 'data': []})
+            return
+
+        if stat_match.group('kind') == 'sta':
+            data = self.state.station_payload()
+        else:
+            data = self.state.devices
+        self._send(200, {'meta': {'rc': 'ok'}, 'data': data})
+
+    def _serve_events(self):
+        """
+        Websocket de eventos: handshake RFC 6455 y luego un mensaje de texto por evento
+        """
+        key = self.headers.get('Sec-WebSocket-Key')
+        if self.headers.get('Upgrade', '').lower() != 'websocket' or not key:
+            self._send(400, {'meta': {'rc': 'error', 'msg': 'api.err.WebsocketRequired'}, 'data': []})
+            return
+        if not self.state.valid_session(self._session_token()):
+            self.state.count('unauthorized')
+            self._send(401, {'meta': {'rc': 'error', 'msg': 'api.err.LoginRequired'}, 'data': []})
+            return
+
+        accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+        self.send_response(101)
+        self.send_header('Upgrade', 'websocket')
+        self.send_header('Connection', 'Upgrade')
+        self.send_header('Sec-WebSocket-Accept', accept)
+        self.end_headers()
+        self.close_connection = True
+
+        subscriber = queue.Queue()
+        with self.state.lock:
+            self.state.subscribers.add(subscriber)
+        try:
+            while True:
+                try:
+                    frame = _ws_frame(subscriber.get(timeout=WS_PING_INTERVAL))
+                except queue.Empty:
+                    frame = _ws_frame(b'', opcode=0x9)
+                self.wfile.write(frame)
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            with self.state.lock:
+                self.state.subscribers.discard(subscriber)
+
+class MockUnifiServer(ThreadingHTTPServer):
+    """
+    Servidor HTTP del controlador simulado
+    """
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Los clientes que cierran la conexión a mitad de una prueba de carga no son errores del servidor
+        if isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            return
+        super().handle_error(request, client_address)
+
+def start_mock_server(config=None, host='127.0.0.1', port=0):
+    """
+    Inicia el controlador simulado en un hilo; retorna el servidor (server.url tiene la URL base)
+    """
+    server = MockUnifiServer((host, port), MockUnifiHandler)
+    server.state = MockState(config or MockConfig())
+    server.url = f'http://{host}:{server.server_port}'
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    if server.state.config.churn:
+        threading.Thread(target=_churn_forever, args=(server.state,), daemon=True).start()
+    return server
+
+def _churn_forever(state):
+    while True:
+        time.sleep(state.config.churn)
+        state.churn_step()
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Controlador UniFi simulado")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--clients', type=int, default=DEFAULT_CLIENTS, help="Clientes conectados simulados")
+    parser.add_argument('--latency', type=float, default=0.0, help="Latencia fija por petición (segundos)")
+    parser.add_argument('--jitter', type=float, default=0.0, help="Latencia aleatoria adicional máxima (segundos)")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fracción de peticiones que responden 500")
+    parser.add_argument('--session-ttl', type=float, default=DEFAULT_SESSION_TTL, help="Vigencia de la sesión (segundos)")
+    parser.add_argument('--username', help="Usuario aceptado (por defecto cualquiera)")
+    parser.add_argument('--password', help="Contraseña aceptada (por defecto cualquiera)")
+    parser.add_argument('--html-file', help="Captura HTML a servir en /network/{site}/clients/main")
+    parser.add_argument('--churn', type=float, default=0.0,
+                        help="Segundos entre eventos simulados de conexión/desconexión/roaming (0 = sin eventos)")
+    args = parser.parse_args()
+
+    mock_config = MockConfig(
+        clients=args.clients, latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+        session_ttl=args.session_ttl, username=args.username, password=args.password,
+        html_file=args.html_file, churn=args.churn,
+    )
+    mock_server = start_mock_server(mock_config, args.host, args.port)
+    print(f"🧪 Controlador simulado en {mock_server.url} ({args.clients} clientes)")
+    print(f"💡 UNIFI_URL={mock_server.url} python api_request.py")
+
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        mock_server.shutdown()
+        print("\n👋 Controlador simulado detenido")
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Recolección concurrente de clientes en varios sitios y controladores UniFi.
+
+Cada sitio se consulta en paralelo (asyncio) con un límite de concurrencia; el
+timeout por sitio es un plazo total que incluye el login, los reintentos y la
+descarga, así que el hilo que consulta un sitio termina por sí solo y el tiempo
+total queda acotado por el sitio más lento y no por la suma de todos. Los
+resultados se combinan en una sola vista de Simpat.
+"""
+
+import asyncio
+import json
+import os
+import time
+
+import requests
+
+from api_request import (
+    display_results, fetch_clients_json, load_identity_resolver, load_simpat_directory,
+    match_simpat_clients,
+)
+from unifi_config import get_config, normalize_unifi_url
+from unifi_records import ClientRecord
+from unifi_session import CONNECT_TIMEOUT, get_session_manager
+
+DEFAULT_TARGETS_FILE = 'unifi_targets.json'
+DEFAULT_CONCURRENCY = 4
+DEFAULT_TIMEOUT = 15
+
+def load_targets(targets_file=DEFAULT_TARGETS_FILE):
+    """
+    Carga la lista de controladores y sitios a consultar.
+
+    Formato de `unifi_targets.json`:
+        [{"url": "https://udm1", "username": "...", "password": "...",
+          "sites": ["default", "oficina2"]}]
+    Usuario y contraseña son opcionales (se usan los del .env). Sin archivo,
+    se usa UNIFI_URL con los sitios de UNIFI_SITES (separados por coma) o UNIFI_SITE.
+    """
+    config = get_config()
+    if targets_file and os.path.exists(targets_file):
+        with open(targets_file, 'r', encoding='utf-8') as f:
+            raw_targets = json.load(f)
+    elif config.url:
+        raw_targets = [{'url': config.url, 'sites': config.sites}]
+    else:
+        return []
+
+    targets = []
+    for target in raw_targets:
+        targets.append({
+            'url': normalize_unifi_url(target['url']),
+            'username': target.get('username') or config.username,
+            'password': target.get('password') or config.password,
+            'sites': target.get('sites') or [config.site],
+        })
+    return targets
+
+def _fetch_site(target, site, timeout):
+    """
+    Autentica (o reutiliza la sesión) y obtiene los clientes de un sitio; corre en un hilo.
+    El plazo se pasa hasta requests para que la petición misma se corte: un hilo no se puede cancelar.
+    """
+    deadline = time.monotonic() + timeout
+    manager = get_session_manager(target['url'], target['username'], target['password'])
+    clients = fetch_clients_json(manager, site=site, timeout=(min(CONNECT_TIMEOUT, timeout), timeout),
+                                 deadline=deadline)
+    if clients is None:
+        raise RuntimeError('La API de clientes no respondió 200')
+    return clients
+
+async def collect_site(target, site, semaphore, timeout=DEFAULT_TIMEOUT):
+    """
+    Obtiene los clientes de un sitio respetando el límite de concurrencia y el timeout.
+    El cupo del semáforo se libera solo cuando el hilo terminó.
+    """
+    async with semaphore:
+        clients = await asyncio.to_thread(_fetch_site, target, site, timeout)
+
+    return [ClientRecord.from_api(client, site=site, controller=target['url']) for client in clients]
+
+async def collect_all_sites(targets, concurrency=DEFAULT_CONCURRENCY, timeout=DEFAULT_TIMEOUT):
+    """
+    Consulta todos los sitios en paralelo y combina los clientes de Simpat.
+    Retorna (clientes_simpat, errores); un sitio caído no invalida a los demás.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    jobs = [(target, site) for target in targets for site in target['sites']]
+
+    results = await asyncio.gather(
+        *(collect_site(target, site, semaphore, timeout) for target, site in jobs),
+        return_exceptions=True
+    )
+
+    all_clients = []
+    errors = []
+    for (target, site), result in zip(jobs, results):
+        if isinstance(result, BaseException):
+            reason = 'timeout' if isinstance(result, requests.Timeout) else str(result)
+            errors.append({'controller': target['url'], 'site': site, 'error': reason})
+        else:
+            all_clients.extend(result)
+
+    simpat_clients = match_simpat_clients(all_clients, load_simpat_directory(), load_identity_resolver())
+    return simpat_clients, errors
+
+def collect_multi_site(targets_file=DEFAULT_TARGETS_FILE, concurrency=DEFAULT_CONCURRENCY,
+                       timeout=DEFAULT_TIMEOUT):
+    """
+    Punto de entrada síncrono: consulta todos los sitios configurados y muestra los resultados
+    """
+    targets = load_targets(targets_file)
+    if not targets:
+        print(f"❌ No hay objetivos configurados ({targets_file} o UNIFI_URL)")
+        return None
+
+    total_sites = sum(len(target['sites']) for target in targets)
+    print(f"🌐 Consultando {total_sites} sitios en {len(targets)} controladores "
+          f"(concurrencia: {concurrency}, timeout: {timeout}s)")
+
+    started = time.perf_counter()
+    simpat_clients, errors = asyncio.run(collect_all_sites(targets, concurrency, timeout))
+    elapsed = time.perf_counter() - started
+
+    for error in errors:
+        print(f"⚠️ {error['controller']} / {error['site']}: {error['error']}")
+    print(f"⏱️ Recolección completada en {elapsed:.2f}s")
+
+    display_results(simpat_clients)
+    return simpat_clients
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Clientes de Simpat en varios sitios/controladores UniFi")
+    parser.add_argument('--targets', default=DEFAULT_TARGETS_FILE,
+                        help=f"Archivo JSON de controladores y sitios (por defecto {DEFAULT_TARGETS_FILE})")
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY,
+                        help="Máximo de sitios consultados a la vez")
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT,
+                        help="Plazo total por sitio en segundos (login, reintentos y descarga)")
+    args = parser.parse_args()
+
+    collect_multi_site(args.targets, args.concurrency, args.timeout)
@@ -0,0 +1,146 @@
+"""
+Salidas de resultados de clientes.
+
+Cada salida recibe los clientes uno por uno (begin → write → close), así que
+una lista grande se procesa sin construir el texto completo en memoria. Un
+ClientSnapshot viejo (servido con el circuito abierto) se marca en ambas:
+
+  - ConsoleSink: la vista con emojis en consola.
+  - NdjsonSink: un registro JSON por línea en un archivo con rotación por
+    tamaño (medido en bytes), o en stdout con "-". Las líneas se escriben en lotes.
+"""
+
+import json
+import os
+import sys
+from datetime import datetime
+
+DEFAULT_OUTPUT_FILE = 'clientes_simpat.ndjson'
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_MAX_BYTES = 10 * 1024 * 1024
+DEFAULT_BACKUP_COUNT = 5
+
+class ConsoleSink:
+    """
+    Vista en consola con emojis
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def begin(self, clients):
+        print(f"\n📱 CLIENTES DE SIMPAT CONECTADOS: {len(clients)}")
+        if getattr(clients, 'stale', False):
+            fetched_at = datetime.fromtimestamp(clients.fetched_at).strftime('%Y-%m-%d %H:%M:%S')
+            print(f"⚠️ DATOS VIEJOS: último sondeo bueno del {fetched_at}")
+        print("=" * 60)
+
+    def write(self, client):
+        self.count += 1
+        user = client.simpat_user
+        print(f"{self.count:2d}. 📱 {client.display_name or 'Sin nombre'}")
+        print(f"     🌐 IP: {client.ip or 'Sin IP'}")
+        print(f"     🔗 MAC: {client.mac or 'Sin MAC'}")
+        print(f"     👤 Simpat: {user.name if user else 'N/A'}")
+        print(f"     🆔 UserID: {user.id if user else 'N/A'}")
+        print()
+
+    def close(self):
+        pass
+
+class NdjsonSink:
+    """
+    Registros JSON por línea en un archivo rotativo o en stdout ("-")
+    """
+
+    def __init__(self, path=DEFAULT_OUTPUT_FILE, batch_size=DEFAULT_BATCH_SIZE,
+                 max_bytes=DEFAULT_MAX_BYTES, backup_count=DEFAULT_BACKUP_COUNT, stdout=None):
+        self.path = path
+        # Con "-": el stdout real, aunque el progreso se haya redirigido a stderr
+        self.stdout = stdout
+        self.batch_size = batch_size
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.count = 0
+        self.timestamp = None
+        self.stale = False
+        self._batch = []
+        self._stream = None
+
+    @property
+    def is_stdout(self):
+        return self.path == '-'
+
+    def _open(self):
+        if self.is_stdout:
+            self._stream = self.stdout or sys.stdout
+        else:
+            # Binario para que tell() y el tamaño de cada lote estén en bytes
+            self._stream = open(self.path, 'ab', buffering=1 << 16)
+
+    def _rotate(self):
+        """
+        archivo → archivo.1 → archivo.2 ...; se conservan `backup_count` respaldos
+        """
+        self._stream.close()
+        for index in range(self.backup_count - 1, 0, -1):
+            source = f'{self.path}.{index}'
+            if os.path.exists(source):
+                os.replace(source, f'{self.path}.{index + 1}')
+        if self.backup_count:
+            os.replace(self.path, f'{self.path}.1')
+        else:
+            os.remove(self.path)
+        self._open()
+
+    def begin(self, clients):
+        fetched_at = getattr(clients, 'fetched_at', None)
+        fetched = datetime.fromtimestamp(fetched_at) if fetched_at else datetime.now()
+        self.timestamp = fetched.isoformat(timespec='seconds')
+        self.stale = getattr(clients, 'stale', False)
+        if self._stream is None:
+            self._open()
+
+    def write(self, client):
+        record = client.to_dict()
+        record['timestamp'] = self.timestamp
+        record['stale'] = self.stale
+        self._batch.append(json.dumps(record, ensure_ascii=False))
+        self.count += 1
+        if len(self._batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self._batch:
+            return
+        chunk = '\n'.join(self._batch) + '\n'
+        self._batch = []
+        if self.is_stdout:
+            self._stream.write(chunk)
+            return
+        data = chunk.encode('utf-8')
+        if self.max_bytes and self._stream.tell() and self._stream.tell() + len(data) > self.max_bytes:
+            self._rotate()
+        self._stream.write(data)
+
+    def close(self):
+        if self._stream is None:
+            return
+        self.flush()
+        if self.is_stdout:
+            self._stream.flush()
+        else:
+            self._stream.close()
+        self._stream = None
+
+def build_sinks(output=DEFAULT_OUTPUT_FILE, quiet=False, stdout=None):
+    """
+    Salidas según la configuración: consola (salvo `quiet` o salida a stdout) y NDJSON si hay `output`.
+    `stdout` es el flujo para los registros con output="-" (por defecto sys.stdout).
+    """
+    sinks = []
+    if not quiet and output != '-':
+        sinks.append(ConsoleSink())
+    if output:
+        sinks.append(NdjsonSink(output, stdout=stdout))
+    return sinks
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Presencia diaria y semanal de los usuarios de Simpat (llegada, salida y minutos).
+
+Cada sondeo actualiza de forma incremental una fila por (día, usuario) en la
+tabla `presence_daily`: la llegada es el primer avistamiento del día, la salida
+el último, y los minutos suman el tiempo entre sondeos consecutivos en los que
+el usuario estuvo presente (huecos mayores a `max_gap` no cuentan). Los
+reportes leen solo esas filas agregadas, nunca los intervalos crudos, así que
+un mes de unos cientos de usuarios son unos miles de filas.
+
+    python presence.py daily 2025-09-01 2025-09-05
+    python presence.py weekly 2025-09-01 2025-09-30 --json
+    python presence.py month 2025-09
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from datetime import date, timedelta
+
+from history_store import DEFAULT_DB_FILE, DEFAULT_MAX_GAP, day_of, next_midnight
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS presence_daily (
+    day TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    hostname TEXT,
+    arrival REAL NOT NULL,
+    departure REAL NOT NULL,
+    seconds REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, user_id)
+);
+"""
+
+UPSERT = (
+    'INSERT INTO presence_daily (day, user_id, hostname, arrival, departure, seconds) '
+    'VALUES (?, ?, ?, ?, ?, ?) '
+    'ON CONFLICT(day, user_id) DO UPDATE SET '
+    'hostname = excluded.hostname, '
+    'arrival = MIN(arrival, excluded.arrival), '
+    'departure = MAX(departure, excluded.departure), '
+    'seconds = seconds + excluded.seconds'
+)
+
+def _time_of_day(seconds):
+    minutes = int(seconds // 60)
+    return f'{minutes // 60:02d}:{minutes % 60:02d}'
+
+def _week_of(day):
+    year, week, _ = date.fromisoformat(day).isocalendar()
+    return f'{year}-W{week:02d}'
+
+class PresenceAggregator:
+    """
+    Acumulador incremental de presencia por usuario y día
+    """
+
+    def __init__(self, db_file=DEFAULT_DB_FILE, max_gap=DEFAULT_MAX_GAP):
+        self.db_file = db_file
+        self.max_gap = max_gap
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(db_file, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+        # user_id -> último sondeo en que se vio al usuario
+        self._last_seen = {}
+        self._load_last_seen()
+
+    def _load_last_seen(self):
+        """
+        Recupera el último avistamiento reciente de cada usuario para continuar tras un reinicio
+        """
+        now = time.time()
+        rows = self.conn.execute(
+            'SELECT user_id, departure FROM presence_daily WHERE day >= ? AND departure >= ?',
+            (day_of(now - self.max_gap), now - self.max_gap)
+        )
+        for row in rows:
+            self._last_seen[row['user_id']] = max(row['departure'], self._last_seen.get(row['user_id'], 0))
+
+    def record_poll(self, clients, timestamp=None):
+        """
+        Suma un sondeo: un usuario con varios dispositivos cuenta una sola vez
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        day = day_of(timestamp)
+
+        present = {}
+        for record in clients:
+            user = record.simpat_user
+            if user and user.id:
+                present.setdefault(user.id, user.name)
+
+        rows = []
+        for user_id, hostname in present.items():
+            previous = self._last_seen.get(user_id)
+            self._last_seen[user_id] = timestamp
+
+            if previous is None or not 0 < timestamp - previous <= self.max_gap:
+                rows.append((day, user_id, hostname, timestamp, timestamp, 0.0))
+                continue
+
+            if day_of(previous) == day:
+                rows.append((day, user_id, hostname, timestamp, timestamp, timestamp - previous))
+                continue
+
+            # Cruzó la medianoche: cada día se queda con su parte del hueco
+            midnight = next_midnight(previous)
+            rows.append((day_of(previous), user_id, hostname, previous, midnight, midnight - previous))
+            rows.append((day, user_id, hostname, midnight, timestamp, timestamp - midnight))
+
+        with self._lock, self.conn:
+            self.conn.executemany(UPSERT, rows)
+
+        # Olvidar a quien ya no puede continuar su racha
+        stale = [user_id for user_id, seen in self._last_seen.items() if timestamp - seen > self.max_gap]
+        for user_id in stale:
+            del self._last_seen[user_id]
+
+    def daily(self, start_day, end_day, user_id=None):
+        """
+        Presencia por usuario y día: [{day, user_id, hostname, arrival, departure, minutes}]
+        """
+        query = ("SELECT day, user_id, hostname, "
+                 "strftime('%H:%M', arrival, 'unixepoch', 'localtime') AS arrival, "
+                 "strftime('%H:%M', departure, 'unixepoch', 'localtime') AS departure, "
+                 "CAST(ROUND(seconds / 60) AS INTEGER) AS minutes "
+                 "FROM presence_daily WHERE day BETWEEN ? AND ?")
+        params = [start_day, end_day]
+        if user_id:
+            query += ' AND user_id = ?'
+            params.append(user_id)
+
+        with self._lock:
+            rows = self.conn.execute(query + ' ORDER BY day, hostname', params).fetchall()
+        return [dict(row) for row in rows]
+
+    def summary(self, start_day, end_day, period='week', user_id=None):
+        """
+        Agrega los días por semana ISO ('week') o por todo el rango ('range'):
+        [{period, user_id, hostname, days, minutes, avg_arrival, avg_departure}].
+        La agregación se hace en SQLite sobre las filas diarias.
+        """
+        # Lunes de la semana de cada día, o un único grupo para todo el rango
+        group = "date(day, '-6 days', 'weekday 1')" if period == 'week' else "''"
+        # Segundos desde la medianoche local del día
+        midnight = "CAST(strftime('%s', day, 'utc') AS REAL)"
+        query = (f"SELECT {group} AS period, user_id, MAX(hostname) AS hostname, COUNT(*) AS days, "
+                 f"SUM(seconds) AS seconds, AVG(arrival - {midnight}) AS arrival, "
+                 f"AVG(departure - {midnight}) AS departure "
+                 f"FROM presence_daily WHERE day BETWEEN ? AND ?")
+        params = [start_day, end_day]
+        if user_id:
+            query += ' AND user_id = ?'
+            params.append(user_id)
+
+        with self._lock:
+            rows = self.conn.execute(query + ' GROUP BY 1, user_id', params).fetchall()
+
+        result = []
+        for row in rows:
+            result.append({
+                'period': _week_of(row['period']) if period == 'week' else f'{start_day}..{end_day}',
+                'user_id': row['user_id'],
+                'hostname': row['hostname'],
+                'days': row['days'],
+                'minutes': round(row['seconds'] / 60),
+                'avg_arrival': _time_of_day(row['arrival']),
+                'avg_departure': _time_of_day(row['departure']),
+            })
+        result.sort(key=lambda item: (item['period'], item['hostname'] or ''))
+        return result
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+def month_range(month):
+    """
+    'YYYY-MM' -> ('YYYY-MM-01', último día del mes)
+    """
+    first = date.fromisoformat(f'{month}-01')
+    last = (first.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+    return first.isoformat(), last.isoformat()
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Reportes de presencia de los usuarios de Simpat")
+    parser.add_argument('--db', default=DEFAULT_DB_FILE, help=f"Base de datos (por defecto {DEFAULT_DB_FILE})")
+    parser.add_argument('--user', help="Filtra por userID")
+    parser.add_argument('--json', action='store_true', help="Imprime el reporte en JSON")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    daily = subparsers.add_parser('daily', help="Llegada, salida y minutos por usuario por día")
+    daily.add_argument('start_day', help="YYYY-MM-DD")
+    daily.add_argument('end_day', help="YYYY-MM-DD")
+
+    weekly = subparsers.add_parser('weekly', help="Totales por usuario por semana ISO")
+    weekly.add_argument('start_day', help="YYYY-MM-DD")
+    weekly.add_argument('end_day', help="YYYY-MM-DD")
+
+    month = subparsers.add_parser('month', help="Totales por usuario en el mes")
+    month.add_argument('month', help="YYYY-MM")
+
+    args = parser.parse_args()
+    aggregator = PresenceAggregator(args.db)
+
+    if args.command == 'daily':
+        rows = aggregator.daily(args.start_day, args.end_day, args.user)
+        title = f"Presencia diaria ({args.start_day} a {args.end_day})"
+    elif args.command == 'weekly':
+        rows = aggregator.summary(args.start_day, args.end_day, 'week', args.user)
+        title = f"Presencia semanal ({args.start_day} a {args.end_day})"
+    else:
+        start_day, end_day = month_range(args.month)
+        rows = aggregator.summary(start_day, end_day, 'range', args.user)
+        title = f"Presencia del mes {args.month}"
+    aggregator.close()
+
+    if args.json:
+        print(json.dumps(rows, ensure_ascii=False, indent=2))
+        return
+
+    print(f"\n🏢 {title}: {len(rows)} registros")
+    print("=" * 70)
+    for row in rows:
+        if args.command == 'daily':
+            print(f"   {row['day']}  {row['hostname']:<30} {row['arrival']} - {row['departure']}"
+                  f"  {row['minutes'] // 60}h {row['minutes'] % 60:02d}m")
+        else:
+            print(f"   {row['period']:<12} {row['hostname']:<30} {row['days']:>2} días"
+                  f"  {row['minutes'] // 60:>4}h {row['minutes'] % 60:02d}m"
+                  f"  ({row['avg_arrival']} - {row['avg_departure']})")
+
+if __name__ == "__main__":
+    main()
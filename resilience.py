@@ -0,0 +1,136 @@
+"""
+Resiliencia de las llamadas al controlador UniFi.
+
+  - RetryPolicy: reintentos con backoff exponencial y jitter completo
+    (cada espera es aleatoria entre 0 y base * 2^intento, con tope).
+  - CircuitBreaker: tras varias fallas seguidas de un endpoint deja de
+    llamarlo durante `reset_timeout`; luego permite una prueba (semiabierto)
+    y se cierra si sale bien.
+  - ClientSnapshot: lista de clientes que recuerda cuándo se obtuvo y si es
+    una copia vieja servida mientras el circuito está abierto.
+"""
+
+import random
+import threading
+import time
+
+# Respuestas del controlador que vale la pena reintentar (sobrecarga o falla temporal)
+RETRYABLE_STATUS = frozenset({429, 500, 502, 503, 504})
+# Métodos que se pueden repetir sin efectos secundarios
+IDEMPOTENT_METHODS = frozenset({'GET', 'HEAD', 'OPTIONS'})
+
+class CircuitOpenError(Exception):
+    """
+    El circuito del endpoint está abierto: no se llama al controlador
+    """
+
+    def __init__(self, endpoint, retry_in):
+        super().__init__(f'Circuito abierto para {endpoint} (reintento en {retry_in:.0f}s)')
+        self.endpoint = endpoint
+        self.retry_in = retry_in
+
+class RetryPolicy:
+    """
+    Número de intentos y esperas entre ellos
+    """
+
+    def __init__(self, attempts=3, base_delay=0.5, max_delay=8.0):
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt, retry_after=None):
+        """
+        Espera antes del intento `attempt + 1`; respeta Retry-After si el controlador lo envía
+        """
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        if retry_after:
+            try:
+                delay = max(delay, min(self.max_delay, float(retry_after)))
+            except ValueError:
+                pass
+        return delay
+
+NO_RETRY = RetryPolicy(attempts=1)
+
+class CircuitBreaker:
+    """
+    Circuito de un endpoint: cerrado → abierto tras `failure_threshold` fallas seguidas → semiabierto
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, endpoint, failure_threshold=5, reset_timeout=30.0):
+        self.endpoint = endpoint
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def retry_in(self):
+        return max(0.0, self.opened_at + self.reset_timeout - time.monotonic())
+
+    @property
+    def is_open(self):
+        return self.state == self.OPEN and self.retry_in() > 0
+
+    def allow(self):
+        """
+        ¿Se puede llamar al endpoint ahora? En semiabierto solo pasa una llamada de prueba
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                if self.retry_in() > 0:
+                    return False
+                self.state = self.HALF_OPEN
+                self._trial_running = False
+            if self._trial_running:
+                return False
+            self._trial_running = True
+            return True
+
+    def check(self):
+        """
+        Como allow(), pero lanza CircuitOpenError si no se puede llamar
+        """
+        if not self.allow():
+            raise CircuitOpenError(self.endpoint, self.retry_in())
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                print(f"✅ Circuito cerrado para {self.endpoint}")
+            self.state = self.CLOSED
+            self.failures = 0
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    print(f"🚧 Circuito abierto para {self.endpoint} "
+                          f"({self.failures} fallas, pausa de {self.reset_timeout:.0f}s)")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+class ClientSnapshot(list):
+    """
+    Clientes de un sondeo; `stale` indica una copia del último sondeo bueno
+    """
+
+    def __init__(self, clients=(), fetched_at=None, stale=False):
+        super().__init__(clients)
+        self.fetched_at = time.time() if fetched_at is None else fetched_at
+        self.stale = stale
+
+    def as_stale(self):
+        return ClientSnapshot(self, self.fetched_at, stale=True)
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+CLI única de Simpat.
+
+    python simpat.py scrape [--mode json|html] [--output FILE] [--quiet]
+    python simpat.py explore [--json FILE] [--workers N]
+    python simpat.py users [--id ID | --ip IP | --name NOMBRE | --range RANGO | --search TEXTO] [--json]
+    python simpat.py serve [--port 8080] [--interval 30]
+    python simpat.py aps [--json] [--watch SEGUNDOS]
+
+Cada subcomando importa sus módulos solo al ejecutarse: `users` no carga
+requests, python-dotenv ni el scraper, así que arranca en decenas de
+milisegundos y se puede invocar desde hooks de shell.
+"""
+
+import argparse
+import sys
+
+def cmd_scrape(args):
+    from api_request import scrape_unifi_clients
+    from capture_store import configure_captures
+    from metrics import metrics
+
+    metrics.configure_log(args.metrics_log)
+    configure_captures(args.capture_dir)
+    scrape_unifi_clients(mode=args.mode, output=args.output, quiet=args.quiet)
+    return 0
+
+def cmd_explore(args):
+    from explore_endpoints import explore_endpoints
+
+    explore_endpoints(args.report_file, args.workers, args.timeout)
+    return 0
+
+def cmd_users(args):
+    import contextlib
+    import io
+    import json
+    from simpat_loader import SimpatLoader
+
+    # Los avisos del loader (carga, rango inválido) van a stderr para no ensuciar la salida de los hooks
+    with contextlib.redirect_stdout(io.StringIO()) as log:
+        loader = SimpatLoader(args.file)
+        if not loader.directory.loaded:
+            users = None
+        elif args.id:
+            users = [loader.get_user_by_id(args.id)]
+        elif args.ip:
+            users = [loader.get_user_by_ip(args.ip.strip())]
+        elif args.name:
+            users = [loader.get_user_by_name(args.name)]
+        elif args.range:
+            users = loader.get_users_by_ip_range(args.range)
+        elif args.search:
+            users = loader.search_users_by_name(args.search)
+        else:
+            users = loader.get_all_users()
+
+    messages = [line for line in log.getvalue().splitlines() if not line.startswith('✅')]
+    if messages:
+        print('\n'.join(messages), file=sys.stderr)
+    if users is None:
+        return 2
+    users = [user for user in users if user]
+
+    if args.json:
+        print(json.dumps([user.to_dict() for user in users], ensure_ascii=False))
+    else:
+        for user in users:
+            print(f"{user.id}\t{user.name}\t{user.ip_address}")
+    return 0 if users else 1
+
+def cmd_serve(args):
+    from snapshot_server import serve
+
+    serve(args.host, args.port, args.interval, args.mode)
+    return 0
+
+def cmd_aps(args):
+    from inventory import get_inventory, watch_ap_load
+    from unifi_config import get_config
+    from unifi_session import get_session_manager
+
+    config = get_config()
+    if not config.complete:
+        print("❌ Faltan variables de entorno", file=sys.stderr)
+        return 2
+    manager = get_session_manager(config.url, config.username, config.password)
+    ok = watch_ap_load(get_inventory(manager, device_ttl=args.device_ttl, client_ttl=args.client_ttl),
+                       args.json, args.watch)
+    return 0 if ok else 1
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='simpat', description="Herramientas de clientes Simpat en UniFi")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    # Los valores por defecto se repiten aquí para no importar los módulos al armar la ayuda
+    scrape = subparsers.add_parser('scrape', help="Clientes de Simpat conectados a UniFi")
+    scrape.add_argument('--mode', choices=['json', 'html'], default='json',
+                        help="Fuente de datos: API JSON (por defecto) o scraping HTML")
+    scrape.add_argument('--output', default='clientes_simpat.ndjson',
+                        help="Archivo NDJSON de resultados, '-' para stdout o '' para ninguno")
+    scrape.add_argument('--quiet', action='store_true',
+                        help="No muestra la lista de clientes; el progreso y los errores van a stderr")
+    scrape.add_argument('--metrics-log', metavar='FILE',
+                        help="Agrega el desglose de tiempos y conteos del sondeo a este archivo JSONL")
+    scrape.add_argument('--capture-dir', metavar='DIR',
+                        help="Guarda las respuestas crudas (deduplicadas y comprimidas) en este directorio")
+    scrape.set_defaults(handler=cmd_scrape)
+
+    explore = subparsers.add_parser('explore', help="Explora los endpoints de UniFi y mide sus latencias")
+    explore.add_argument('--json', dest='report_file',
+                         help="Exporta el reporte de latencias a este archivo JSON")
+    explore.add_argument('--workers', type=int, default=8, help="Pruebas simultáneas")
+    explore.add_argument('--timeout', type=float, default=5, help="Timeout por endpoint en segundos")
+    explore.set_defaults(handler=cmd_explore)
+
+    users = subparsers.add_parser('users', help="Busca usuarios de Simpat (sin filtros, lista todos)")
+    lookup = users.add_mutually_exclusive_group()
+    lookup.add_argument('--id', help="Usuario por userID")
+    lookup.add_argument('--ip', help="Usuario por IP")
+    lookup.add_argument('--name', help="Usuario por nombre exacto (sin distinguir mayúsculas)")
+    lookup.add_argument('--range', help="Usuarios en un rango (CIDR o prefijo, ej. 10.0.0)")
+    lookup.add_argument('--search', help="Usuarios cuyo nombre contiene el texto")
+    users.add_argument('--json', action='store_true', help="Salida en JSON")
+    users.add_argument('--file', default='simpat_users.json', help="Archivo de usuarios")
+    users.set_defaults(handler=cmd_users)
+
+    serve = subparsers.add_parser('serve', help="API local con el snapshot de clientes")
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=8080)
+    serve.add_argument('--interval', type=float, default=30, help="Segundos entre sondeos")
+    serve.add_argument('--mode', choices=['json', 'html'], default='json',
+                       help="Fuente de datos: API JSON (por defecto) o scraping HTML")
+    serve.set_defaults(handler=cmd_serve)
+
+    aps = subparsers.add_parser('aps', help="Clientes y usuarios de Simpat por AP")
+    aps.add_argument('--json', action='store_true', help="Salida en JSON")
+    aps.add_argument('--watch', type=float, metavar='SEGUNDOS', help="Repite la consulta cada tantos segundos")
+    aps.add_argument('--device-ttl', type=float, default=3600, help="Vigencia de la lista de dispositivos (s)")
+    aps.add_argument('--client-ttl', type=float, default=30, help="Vigencia de la lista de clientes (s)")
+    aps.set_defaults(handler=cmd_aps)
+
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.handler(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Demonio de sondeo: consulta UniFi periódicamente y emite solo los cambios
+(conexiones, desconexiones y cambios de IP) de los clientes de Simpat
+"""
+
+import json
+import time
+from datetime import datetime
+
+from api_request import collect_simpat_clients
+from capture_store import configure_captures
+from history_store import HistoryStore
+from metrics import metrics, start_metrics_server
+from presence import PresenceAggregator
+from unifi_config import get_config
+from unifi_session import get_session_manager
+
+DEFAULT_INTERVAL = 30
+DEFAULT_EVENTS_FILE = 'simpat_eventos.jsonl'
+
+def build_snapshot(clients):
+    """
+    Indexa la lista de clientes (ClientRecord) por su llave MAC/IP
+    """
+    snapshot = {}
+    for client in clients:
+        if client.key:
+            snapshot[client.key] = client
+    return snapshot
+
+def _delta(event, client, timestamp, **extra):
+    user = client.simpat_user
+    delta = {
+        'event': event,
+        'timestamp': timestamp,
+        'key': client.mac or client.ip,
+        'name': client.display_name,
+        'ip': client.ip or None,
+        'mac': client.mac or None,
+        'hostname': user.name if user else None,
+        'userID': user.id if user else None,
+    }
+    delta.update(extra)
+    return delta
+
+def diff_snapshots(previous, current, timestamp=None):
+    """
+    Compara dos snapshots y retorna solo los cambios: joined, left e ip_changed
+    """
+    timestamp = timestamp or datetime.now().isoformat(timespec='seconds')
+    deltas = []
+
+    for key, client in current.items():
+        old_client = previous.get(key)
+        if old_client is None:
+            deltas.append(_delta('joined', client, timestamp))
+        elif old_client.ip_int != client.ip_int:
+            deltas.append(_delta('ip_changed', client, timestamp, old_ip=old_client.ip or None))
+
+    for key, client in previous.items():
+        if key not in current:
+            deltas.append(_delta('left', client, timestamp))
+
+    return deltas
+
+def print_deltas(deltas):
+    """
+    Muestra los cambios en consola
+    """
+    icons = {'joined': '🟢', 'left': '🔴', 'ip_changed': '🔁'}
+    for delta in deltas:
+        who = delta['hostname'] or delta['name'] or delta['key']
+        line = f"{icons[delta['event']]} {delta['timestamp']} {delta['event']:<10} {who} ({delta['ip']})"
+        if delta['event'] == 'ip_changed':
+            line += f" ← {delta['old_ip']}"
+        print(line)
+
+def append_deltas(deltas, events_file):
+    """
+    Agrega los cambios al archivo de eventos (una línea JSON por evento)
+    """
+    try:
+        with open(events_file, 'a', encoding='utf-8') as f:
+            for delta in deltas:
+                f.write(json.dumps(delta, ensure_ascii=False) + '\n')
+    except OSError as e:
+        print(f"❌ Error guardando eventos: {e}")
+
+def run_daemon(interval=DEFAULT_INTERVAL, mode='json', events_file=DEFAULT_EVENTS_FILE,
+               history_file=None, metrics_port=None, metrics_log=None, capture_dir=None,
+               push_events=False, top_talkers=0):
+    """
+    Sondea UniFi cada `interval` segundos y emite solo los cambios respecto al sondeo anterior.
+    Con `history_file` cada sondeo se registra también en el historial de conexiones
+    y en el acumulado de presencia diaria (presence.py).
+    Con `metrics_port` se expone /metrics; con `metrics_log` cada sondeo agrega su
+    desglose de tiempos y conteos a ese archivo JSONL. Con `capture_dir` las respuestas
+    crudas se guardan ahí, deduplicadas y con retención (capture_store.py).
+    Con `push_events` los cambios llegan por el websocket de eventos del controlador
+    (event_stream.py) y la lista completa solo se descarga cada `interval` segundos.
+    Con `top_talkers` se muestran en cada sondeo los N clientes de mayor consumo (throughput.py).
+    """
+    print(f"🚀 Demonio iniciado (intervalo: {interval}s, eventos: {events_file or 'solo consola'})")
+    previous = {}
+    # Un cliente se considera continuo mientras falten menos de dos sondeos seguidos
+    max_gap = max(2 * interval, 60)
+    history = HistoryStore(history_file, max_gap=max_gap) if history_file else None
+    presence = PresenceAggregator(history_file, max_gap=max_gap) if history_file else None
+    metrics_server = start_metrics_server(metrics_port) if metrics_port else None
+    metrics.configure_log(metrics_log)
+    configure_captures(capture_dir)
+    if top_talkers:
+        # NumPy solo se importa si se piden las tasas de transferencia
+        from throughput import ThroughputTracker, print_top_talkers
+        tracker = ThroughputTracker()
+
+    def process(clients, full_list=True):
+        """
+        `full_list`: la lista viene de un sondeo o una resincronización completa, no de un evento
+        (los eventos no traen contadores de bytes)
+        """
+        nonlocal previous
+        if clients is None or clients.stale:
+            # Un sondeo fallido (o una copia vieja) no implica que todos se hayan desconectado
+            print("⚠️ Sondeo fallido, se conserva el estado anterior")
+            return
+
+        current = build_snapshot(clients)
+        deltas = diff_snapshots(previous, current)
+        previous = current
+
+        with metrics.timer('output'):
+            if history:
+                history.record_poll(clients)
+                presence.record_poll(clients)
+
+            if deltas:
+                print_deltas(deltas)
+                if events_file:
+                    append_deltas(deltas, events_file)
+            elif full_list:
+                print(f"✅ Sin cambios ({len(current)} clientes de Simpat conectados)")
+
+        if top_talkers and full_list:
+            with metrics.timer('throughput'):
+                tracker.record(clients, clients.fetched_at)
+                talkers = tracker.top_talkers(top_talkers)
+            if talkers:
+                print_top_talkers(talkers)
+
+    try:
+        if push_events:
+            run_push(process, interval)
+        else:
+            while True:
+                started = time.monotonic()
+                clients = collect_simpat_clients(mode=mode)
+                process(clients)
+                metrics.end_poll(mode=mode, ok=clients is not None,
+                                 stale=bool(clients is not None and clients.stale))
+
+                elapsed = time.monotonic() - started
+                time.sleep(max(0.0, interval - elapsed))
+    except KeyboardInterrupt:
+        print("\n👋 Demonio detenido")
+    finally:
+        if history:
+            history.close()
+            presence.close()
+        if metrics_server:
+            metrics_server.shutdown()
+
+def run_push(process, resync_interval):
+    """
+    Aplica los eventos del websocket del controlador; cada `resync_interval` descarga la lista completa
+    """
+    from event_stream import EventSubscriber
+
+    config = get_config()
+    if not config.complete:
+        print("❌ Error: Faltan variables de entorno")
+        return
+
+    def on_change(clients, reason):
+        # Un evento de un cliente ajeno a Simpat no produce cambios: solo se informa en las resincronizaciones
+        process(clients, full_list=reason == 'resync')
+        if reason == 'resync':
+            metrics.end_poll(mode='events', ok=True, stale=False)
+
+    manager = get_session_manager(config.url, config.username, config.password)
+    EventSubscriber(manager, config.site, on_change, resync_interval=resync_interval).run()
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Demonio de presencia de clientes de Simpat")
+    parser.add_argument('--interval', type=float, default=DEFAULT_INTERVAL,
+                        help=f"Segundos entre sondeos (por defecto {DEFAULT_INTERVAL})")
+    parser.add_argument('--mode', choices=['json', 'html'], default='json',
+                        help="Fuente de datos: API JSON (por defecto) o scraping HTML")
+    parser.add_argument('--events-file', default=DEFAULT_EVENTS_FILE,
+                        help="Archivo JSONL donde se agregan los cambios ('' para solo consola)")
+    parser.add_argument('--history', metavar='DB',
+                        help="Registra cada sondeo en este historial SQLite (ej: simpat_history.db)")
+    parser.add_argument('--metrics-port', type=int,
+                        help="Expone las métricas en http://127.0.0.1:PUERTO/metrics")
+    parser.add_argument('--metrics-log', metavar='FILE',
+                        help="Agrega el desglose de cada sondeo a este archivo JSONL")
+    parser.add_argument('--capture-dir', metavar='DIR',
+                        help="Guarda las respuestas crudas (deduplicadas y comprimidas) en este directorio")
+    parser.add_argument('--events', action='store_true',
+                        help="Recibe los cambios por el websocket de eventos; --interval pasa a ser "
+                             "el intervalo de resincronización completa")
+    parser.add_argument('--top', type=int, default=0, metavar='N',
+                        help="Muestra en cada sondeo los N clientes con mayor consumo (requiere numpy)")
+    args = parser.parse_args()
+
+    run_daemon(interval=args.interval, mode=args.mode, events_file=args.events_file,
+               history_file=args.history, metrics_port=args.metrics_port,
+               metrics_log=args.metrics_log, capture_dir=args.capture_dir,
+               push_events=args.events, top_talkers=args.top)
@@ -1,61 +1,246 @@
+import ipaddress
 import json
 import os
+import threading
+from bisect import bisect_left, bisect_right
 from typing import List, Dict, Optional
+from unifi_records import int_to_ip, int_to_mac, ip_to_int, mac_to_int
 
 class SimpatUser:
     """
-    Clase para representar un usuario de Simpat
+    Clase para representar un usuario de Simpat (IP y MAC empaquetadas como enteros)
     """
+    __slots__ = ('id', 'name', 'ip_int', 'mac_int', 'is_admin')
+    
     def __init__(self, user_data: Dict):
-        self.id = user_data.get('id', '')
-        self.name = user_data.get('name', '')
-        self.ip_address = user_data.get('ip_address', '')
+        # Acepta el formato del loader (id/name/ip_address) y el de
+        # simpat_users.json (userID/hostname/ip)
+        self.id = user_data.get('id') or user_data.get('userID') or ''
+        self.name = user_data.get('name') or user_data.get('hostname') or ''
+        self.ip_int = ip_to_int(user_data.get('ip_address') or user_data.get('ip'))
+        # MAC opcional del equipo principal: vínculo fijo para el resolvedor de identidad
+        self.mac_int = mac_to_int(user_data.get('mac_address') or user_data.get('mac'))
         self.is_admin = user_data.get('is_admin', False)
     
+    @property
+    def ip_address(self) -> str:
+        return int_to_ip(self.ip_int)
+    
+    @property
+    def mac_address(self) -> str:
+        return int_to_mac(self.mac_int)
+    
     def __str__(self):
         admin_status = "👑 Admin" if self.is_admin else "👤 Usuario"
         return f"{self.name} ({self.ip_address}) - {admin_status}"
     
     def to_dict(self):
-        return {
+        data = {
             'id': self.id,
             'name': self.name,
             'ip_address': self.ip_address,
             'is_admin': self.is_admin
         }
+        if self.mac_int:
+            data['mac_address'] = self.mac_address
+        return data
 
-class SimpatLoader:
+def normalize_name(name: str) -> str:
     """
-    Loader para cargar y gestionar usuarios de Simpat desde el archivo JSON
+    Normaliza un nombre para búsquedas: sin distinción de mayúsculas ni espacios extra
+    """
+    return ' '.join(name.split()).casefold()
+
+def parse_ip_range(ip_range: str) -> ipaddress.IPv4Network:
+    """
+    Convierte un rango a red IPv4. Acepta CIDR ("10.0.0.0/28") o prefijo por
+    octetos completos ("10.0.0" equivale a 10.0.0.0/24, "10.0.0.1" a una sola IP)
+    """
+    ip_range = ip_range.strip()
+    if '/' in ip_range:
+        return ipaddress.IPv4Network(ip_range, strict=False)
+    
+    octets = [octet for octet in ip_range.rstrip('.').split('.') if octet != '']
+    if not 1 <= len(octets) <= 4:
+        raise ValueError("se esperaban de 1 a 4 octetos")
+    
+    address = '.'.join(octets + ['0'] * (4 - len(octets)))
+    return ipaddress.IPv4Network(f"{address}/{8 * len(octets)}")
+
+def parse_users_data(data) -> List[SimpatUser]:
+    """
+    Convierte el contenido del JSON en usuarios; acepta {"users": [...]} o una lista
+    """
+    if isinstance(data, dict):
+        data = data.get('users', [])
+    if not isinstance(data, list):
+        raise ValueError("se esperaba una lista de usuarios")
+    return [SimpatUser(user_data) for user_data in data if isinstance(user_data, dict)]
+
+class DirectoryIndex:
+    """
+    Índices inmutables de un directorio: por ID, IP, MAC y nombre, y el índice
+    ordenado de IPs. Se construyen completos y se publican con una sola asignación.
+    """
+    __slots__ = ('users', 'loaded', 'by_id', 'by_ip', 'by_ip_int', 'by_mac_int', 'by_name',
+                 'simpat_ips', 'ip_keys', 'ip_users')
+    
+    def __init__(self, users: List[SimpatUser], loaded: bool = True):
+        by_id: Dict[str, SimpatUser] = {}
+        by_ip: Dict[str, SimpatUser] = {}
+        by_ip_int: Dict[int, SimpatUser] = {}
+        by_mac_int: Dict[int, SimpatUser] = {}
+        by_name: Dict[str, SimpatUser] = {}
+        simpat_ips: Dict[str, Dict] = {}
+        
+        for user in users:
+            # Ante duplicados gana el primero, igual que en una búsqueda lineal
+            by_id.setdefault(user.id, user)
+            by_name.setdefault(normalize_name(user.name), user)
+            if user.ip_int:
+                by_ip_int.setdefault(user.ip_int, user)
+                by_ip.setdefault(user.ip_address, user)
+                simpat_ips.setdefault(user.ip_address, {'hostname': user.name, 'userID': user.id})
+            if user.mac_int:
+                by_mac_int.setdefault(user.mac_int, user)
+        
+        ip_users = sorted((user for user in users if user.ip_int), key=lambda user: user.ip_int)
+        
+        self.users = users
+        self.loaded = loaded
+        self.by_id = by_id
+        self.by_ip = by_ip
+        self.by_ip_int = by_ip_int
+        self.by_mac_int = by_mac_int
+        self.by_name = by_name
+        self.simpat_ips = simpat_ips
+        self.ip_keys = [user.ip_int for user in ip_users]
+        self.ip_users = ip_users
+
+class SimpatDirectory:
+    """
+    Directorio de usuarios de Simpat en memoria, compartido por el loader y el scraper.
+    El archivo se parsea una sola vez y solo se vuelve a leer cuando cambian su
+    fecha de modificación o su tamaño.
+    
+    Los índices viven en `self.index` (DirectoryIndex) y una recarga reemplaza ese
+    único atributo: quien lea más de un índice debe tomar primero `index = directory.index`
+    para no mezclar dos versiones del directorio.
     """
     
     def __init__(self, json_file_path: str = "simpat_users.json"):
         self.json_file_path = json_file_path
-        self.users: List[SimpatUser] = []
-        self.load_users()
+        self._signature = None
+        self._lock = threading.Lock()
+        self.index = DirectoryIndex([], loaded=False)
     
-    def load_users(self) -> bool:
+    # Accesos a un solo índice de la versión vigente
+    @property
+    def users(self) -> List[SimpatUser]:
+        return self.index.users
+    
+    @property
+    def loaded(self) -> bool:
+        return self.index.loaded
+    
+    @property
+    def by_id(self) -> Dict[str, SimpatUser]:
+        return self.index.by_id
+    
+    @property
+    def by_ip(self) -> Dict[str, SimpatUser]:
+        return self.index.by_ip
+    
+    @property
+    def by_ip_int(self) -> Dict[int, SimpatUser]:
+        return self.index.by_ip_int
+    
+    @property
+    def by_mac_int(self) -> Dict[int, SimpatUser]:
+        return self.index.by_mac_int
+    
+    @property
+    def by_name(self) -> Dict[str, SimpatUser]:
+        return self.index.by_name
+    
+    @property
+    def simpat_ips(self) -> Dict[str, Dict]:
+        return self.index.simpat_ips
+    
+    def refresh(self) -> bool:
         """
-        Carga los usuarios desde el archivo JSON
+        Recarga el archivo solo si cambió; retorna True si hubo recarga
         """
         try:
-            if not os.path.exists(self.json_file_path):
-                print(f"❌ Error: No se encontró el archivo {self.json_file_path}")
+            stat = os.stat(self.json_file_path)
+            signature = (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            signature = 'missing'
+        
+        if signature == self._signature:
+            return False
+        
+        with self._lock:
+            if signature == self._signature:
                 return False
+            self._signature = signature
             
-            with open(self.json_file_path, 'r', encoding='utf-8') as file:
-                users_data = json.load(file)
+            if signature == 'missing':
+                print(f"❌ Error: No se encontró el archivo {self.json_file_path}")
+                self.index = DirectoryIndex([], loaded=False)
+                return True
             
-            self.users = [SimpatUser(user_data) for user_data in users_data]
-            print(f"✅ Se cargaron {len(self.users)} usuarios desde {self.json_file_path}")
-            return True
+            try:
+                with open(self.json_file_path, 'r', encoding='utf-8') as file:
+                    users = parse_users_data(json.load(file))
+            except json.JSONDecodeError as e:
+                # Se conservan los usuarios anteriores hasta que el archivo sea válido
+                print(f"❌ Error al decodificar JSON: {e}")
+                return False
+            except Exception as e:
+                print(f"❌ Error al cargar usuarios: {e}")
+                return False
             
-        except json.JSONDecodeError as e:
-            print(f"❌ Error al decodificar JSON: {e}")
-            return False
-        except Exception as e:
-            print(f"❌ Error al cargar usuarios: {e}")
-            return False
+            self.index = DirectoryIndex(users)
+            print(f"✅ Se cargaron {len(users)} usuarios desde {self.json_file_path}")
+            return True
+
+_directories: Dict[str, SimpatDirectory] = {}
+_directories_lock = threading.Lock()
+
+def get_directory(json_file_path: str = "simpat_users.json") -> SimpatDirectory:
+    """
+    Retorna el directorio compartido del proceso para un archivo, recargado si cambió
+    """
+    key = os.path.abspath(json_file_path)
+    with _directories_lock:
+        directory = _directories.get(key)
+        if directory is None:
+            directory = SimpatDirectory(json_file_path)
+            _directories[key] = directory
+    
+    directory.refresh()
+    return directory
+
+class SimpatLoader:
+    """
+    Loader para cargar y gestionar usuarios de Simpat desde el archivo JSON
+    """
+    
+    def __init__(self, json_file_path: str = "simpat_users.json"):
+        self.json_file_path = json_file_path
+        self.directory = get_directory(json_file_path)
+    
+    @property
+    def users(self) -> List[SimpatUser]:
+        return self.directory.users
+    
+    def load_users(self) -> bool:
+        """
+        Carga los usuarios desde el archivo JSON (solo lo vuelve a leer si cambió)
+        """
+        self.directory.refresh()
+        return self.directory.loaded
     
     def get_all_users(self) -> List[SimpatUser]:
         """
@@ -67,28 +252,19 @@ class SimpatLoader:
         """
         Busca un usuario por su ID
         """
-        for user in self.users:
-            if user.id == user_id:
-                return user
-        return None
+        return self.directory.by_id.get(user_id)
     
     def get_user_by_ip(self, ip_address: str) -> Optional[SimpatUser]:
         """
         Busca un usuario por su dirección IP
         """
-        for user in self.users:
-            if user.ip_address == ip_address:
-                return user
-        return None
+        return self.directory.by_ip.get(ip_address)
     
     def get_user_by_name(self, name: str) -> Optional[SimpatUser]:
         """
         Busca un usuario por su nombre (búsqueda exacta)
         """
-        for user in self.users:
-            if user.name.lower() == name.lower():
-                return user
-        return None
+        return self.directory.by_name.get(normalize_name(name))
     
     def search_users_by_name(self, search_term: str) -> List[SimpatUser]:
         """
@@ -109,11 +285,22 @@ class SimpatLoader:
         """
         return [user for user in self.users if not user.is_admin]
     
-    def get_users_by_ip_range(self, ip_prefix: str) -> List[SimpatUser]:
+    def get_users_by_ip_range(self, ip_range: str) -> List[SimpatUser]:
         """
-        Busca usuarios por rango de IP (ej: "10.0.0" para 10.0.0.x)
+        Busca usuarios por rango de IP en CIDR (ej: "10.0.0.0/28") o por prefijo
+        de octetos completos (ej: "10.0.0" para 10.0.0.x), ordenados por IP
         """
-        return [user for user in self.users if user.ip_address.startswith(ip_prefix)]
+        try:
+            network = parse_ip_range(ip_range)
+        except ValueError as e:
+            print(f"❌ Rango de IP inválido '{ip_range}': {e}")
+            return []
+        
+        # Las dos listas deben ser de la misma versión del directorio
+        index = self.directory.index
+        start = bisect_left(index.ip_keys, int(network.network_address))
+        end = bisect_right(index.ip_keys, int(network.broadcast_address))
+        return index.ip_users[start:end]
     
     def print_users_summary(self):
         """
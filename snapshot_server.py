@@ -0,0 +1,387 @@
+#!/usr/bin/env python3
+"""
+API HTTP local de solo lectura con el último snapshot de clientes de Simpat.
+
+Un solo hilo sondea el controlador cada `interval` segundos y guarda el
+resultado en memoria; los lectores consultan este servicio en lugar de hacer
+login y sondear cada uno por su cuenta.
+
+    GET /clients              clientes de Simpat conectados
+    GET /present              usuarios presentes (con su cantidad de equipos)
+    GET /users/{userID}       presencia y equipos de un usuario
+    GET /traffic              contadores tx/rx de cada cliente (cambia en cada sondeo)
+    GET /events               Server-Sent Events: un evento por cada cambio
+    GET /metrics              métricas del recolector (Prometheus)
+
+Las respuestas llevan ETag; con If-None-Match se responde 304 si no hubo
+cambios. Con `?wait=SEGUNDOS` (long-poll) la petición espera a que el ETag
+cambie antes de responder. La versión, los ETag de presencia y los eventos
+solo cambian con la presencia (usuario, MAC, IP, AP, datos viejos); los
+contadores de tráfico van aparte en /traffic para no invalidarlos en cada sondeo.
+
+    python snapshot_server.py --port 8080 --interval 30
+"""
+
+import hashlib
+import json
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from api_request import collect_simpat_clients, load_simpat_directory
+from metrics import metrics
+
+DEFAULT_PORT = 8080
+DEFAULT_INTERVAL = 30
+MAX_WAIT = 300
+SSE_HEARTBEAT = 15
+
+PRESENCE_PATHS = ('/clients', '/present')
+
+def _encode(data):
+    body = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return body, '"%s"' % hashlib.sha1(body).hexdigest()[:20]
+
+def _presence(client):
+    """
+    Cliente sin los contadores de tráfico, que cambian en cada sondeo
+    """
+    data = client.to_dict()
+    del data['tx_bytes'], data['rx_bytes']
+    return data
+
+def _traffic(client):
+    return {
+        'mac': client.mac or None,
+        'ip': client.ip or None,
+        'user_id': client.simpat_user.id if client.simpat_user else None,
+        'tx_bytes': client.tx_bytes,
+        'rx_bytes': client.rx_bytes,
+    }
+
+class SnapshotStore:
+    """
+    Último snapshot con sus respuestas ya serializadas; notifica a los que esperan un cambio
+    """
+
+    def __init__(self):
+        self.version = 0
+        self.fetched_at = None
+        self.stale = False
+        self.clients = []
+        self.by_user = {}      # userID -> [ClientRecord]
+        self.responses = {}    # ruta -> (cuerpo, etag)
+        self._user_cache = {}
+        self._changed = threading.Condition()
+
+    def update(self, clients):
+        """
+        Reemplaza el snapshot; la versión solo avanza si cambió la presencia.
+        /traffic se reemplaza siempre, sin avanzar la versión ni notificar.
+        """
+        by_user = {}
+        for client in clients:
+            if client.simpat_user:
+                by_user.setdefault(client.simpat_user.id, []).append(client)
+        # Orden estable: el controlador no garantiza el mismo orden entre sondeos
+        ordered = sorted(clients, key=lambda client: (client.mac_int, client.ip_int))
+
+        responses = {
+            '/clients': _encode({'stale': clients.stale, 'clients': [_presence(client) for client in ordered]}),
+            '/present': _encode({
+                'stale': clients.stale,
+                'users': [
+                    {'user_id': user_id, 'hostname': devices[0].simpat_user.name, 'devices': len(devices)}
+                    for user_id, devices in sorted(by_user.items(), key=lambda item: item[1][0].simpat_user.name)
+                ],
+            }),
+        }
+
+        traffic = _encode({'fetched_at': clients.fetched_at, 'clients': [_traffic(client) for client in ordered]})
+
+        with self._changed:
+            previous_users = set(self.by_user)
+            self.fetched_at = clients.fetched_at
+            self.responses['/traffic'] = traffic
+            changed = any(self.responses.get(path, (None, None))[1] != etag
+                          for path, (_, etag) in responses.items())
+            if not changed:
+                return None
+
+            self.clients = clients
+            self.stale = clients.stale
+            self.by_user = by_user
+            responses['/traffic'] = traffic
+            self.responses = responses
+            self._user_cache = {}
+            self.version += 1
+            self._changed.notify_all()
+
+        return {
+            'version': self.version,
+            'clients': len(clients),
+            'present': len(by_user),
+            'stale': clients.stale,
+            'joined': sorted(set(by_user) - previous_users),
+            'left': sorted(previous_users - set(by_user)),
+        }
+
+    def user_response(self, user_id):
+        """
+        (cuerpo, etag) de /users/{userID}, o None si el usuario no existe
+        """
+        with self._changed:
+            cached = self._user_cache.get(user_id)
+            if cached is not None:
+                return cached
+            devices = self.by_user.get(user_id, [])
+            stale = self.stale
+
+        if devices:
+            user = devices[0].simpat_user
+        else:
+            user = load_simpat_directory().by_id.get(user_id)
+            if user is None:
+                return None
+
+        response = _encode({
+            'user_id': user.id,
+            'hostname': user.name,
+            'present': bool(devices),
+            'stale': stale,
+            'devices': [_presence(device) for device in devices],
+        })
+        with self._changed:
+            self._user_cache[user_id] = response
+        return response
+
+    def wait_for_change(self, version, timeout):
+        """
+        Espera hasta `timeout` segundos a que la versión sea distinta de `version`
+        """
+        with self._changed:
+            return self._changed.wait_for(lambda: self.version != version, timeout)
+
+class SnapshotHandler(BaseHTTPRequestHandler):
+    """
+    Manejador HTTP de la API de snapshot
+    """
+    server_version = 'SimpatSnapshot/1.0'
+    protocol_version = 'HTTP/1.1'
+
+    @property
+    def store(self) -> SnapshotStore:
+        return self.server.store
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body=b'', content_type='application/json; charset=utf-8', headers=None):
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        if body or status != 304:
+            self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+    def _resolve(self, path):
+        if path in PRESENCE_PATHS or path == '/traffic':
+            return self.store.responses.get(path)
+        if path.startswith('/users/'):
+            return self.store.user_response(unquote(path[len('/users/'):]))
+        return None
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        path = url.path.rstrip('/') or '/'
+
+        if path == '/events':
+            self._stream_events()
+            return
+        if path == '/metrics':
+            self._send(200, metrics.render_prometheus().encode('utf-8'),
+                       content_type='text/plain; version=0.0.4; charset=utf-8')
+            return
+
+        if self.store.version == 0 and (path in PRESENCE_PATHS or path == '/traffic'):
+            self._send(503, {'error': 'Aún no hay un sondeo exitoso'}, headers={'Retry-After': '5'})
+            return
+
+        try:
+            wait = min(float(parse_qs(url.query).get('wait', ['0'])[0]), MAX_WAIT)
+        except ValueError:
+            wait = 0.0
+        if path == '/traffic':
+            # Cambia en cada sondeo sin avanzar la versión: no hay cambio que esperar
+            wait = 0.0
+
+        version = self.store.version
+        response = self._resolve(path)
+        if response is None:
+            self._send(404, {'error': f'No encontrado: {path}'})
+            return
+
+        if_none_match = self.headers.get('If-None-Match')
+        deadline = time.monotonic() + wait
+        # Long-poll: se responde en cuanto cambie este recurso (no solo el snapshot) o al vencer la espera
+        while if_none_match == response[1] and time.monotonic() < deadline:
+            if not self.store.wait_for_change(version, deadline - time.monotonic()):
+                break
+            version = self.store.version
+            response = self._resolve(path) or response
+
+        body, etag = response
+        headers = {
+            'ETag': etag,
+            'Cache-Control': 'no-cache',
+            'X-Snapshot-Version': str(self.store.version),
+        }
+        if self.store.fetched_at:
+            headers['X-Snapshot-Fetched-At'] = datetime.fromtimestamp(self.store.fetched_at).isoformat(timespec='seconds')
+
+        if if_none_match == etag:
+            self._send(304, headers=headers)
+        else:
+            self._send(200, body, headers=headers)
+
+    def _stream_events(self):
+        """
+        Server-Sent Events: un evento `snapshot` por cada cambio y comentarios de latido
+        """
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream; charset=utf-8')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+
+        subscription = self.server.subscribe()
+        try:
+            while True:
+                event = subscription.get(SSE_HEARTBEAT)
+                if event is None:
+                    self.wfile.write(b': ping\n\n')
+                else:
+                    data = json.dumps(event, ensure_ascii=False)
+                    self.wfile.write(f"id: {event['version']}\nevent: snapshot\ndata: {data}\n\n".encode('utf-8'))
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            self.server.unsubscribe(subscription)
+
+class Subscription:
+    """
+    Eventos pendientes de un cliente SSE; si el cliente no lee, se conservan solo los más recientes
+    """
+    MAX_PENDING = 100
+
+    def __init__(self):
+        self._events = []
+        self._ready = threading.Condition()
+
+    def put(self, event):
+        with self._ready:
+            self._events.append(event)
+            del self._events[:-self.MAX_PENDING]
+            self._ready.notify()
+
+    def get(self, timeout):
+        with self._ready:
+            if not self._ready.wait_for(lambda: self._events, timeout):
+                return None
+            return self._events.pop(0)
+
+class SnapshotServer(ThreadingHTTPServer):
+    """
+    Servidor HTTP con el snapshot compartido y los suscriptores SSE
+    """
+    daemon_threads = True
+
+    def __init__(self, address, store=None):
+        super().__init__(address, SnapshotHandler)
+        self.store = store or SnapshotStore()
+        self._subscribers = set()
+        self._subscribers_lock = threading.Lock()
+
+    def subscribe(self):
+        subscription = Subscription()
+        with self._subscribers_lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._subscribers_lock:
+            self._subscribers.discard(subscription)
+
+    def publish(self, clients):
+        """
+        Actualiza el snapshot y avisa a los suscriptores si cambió
+        """
+        event = self.store.update(clients)
+        if event is None:
+            return None
+        with self._subscribers_lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            subscription.put(event)
+        return event
+
+def poll_forever(server, interval=DEFAULT_INTERVAL, mode='json', stop=None):
+    """
+    Sondea el controlador y publica cada resultado en el servidor
+    """
+    stop = stop or threading.Event()
+    while not stop.is_set():
+        started = time.monotonic()
+        # El progreso del sondeo no se muestra (sí los errores); solo un resumen por cambio
+        clients = collect_simpat_clients(mode=mode, quiet=True)
+
+        if clients is None:
+            print("⚠️ Sondeo fallido, se conserva el snapshot anterior")
+        else:
+            event = server.publish(clients)
+            if event:
+                marker = ' (datos viejos)' if event['stale'] else ''
+                print(f"🔄 Snapshot v{event['version']}: {event['present']} usuarios, "
+                      f"{event['clients']} equipos{marker}")
+        metrics.end_poll(mode=mode, ok=clients is not None,
+                         stale=bool(clients is not None and clients.stale))
+
+        stop.wait(max(0.0, interval - (time.monotonic() - started)))
+
+def serve(host='127.0.0.1', port=DEFAULT_PORT, interval=DEFAULT_INTERVAL, mode='json'):
+    """
+    Inicia la API y sondea hasta Ctrl+C
+    """
+    snapshot_server = SnapshotServer((host, port))
+    threading.Thread(target=snapshot_server.serve_forever, daemon=True).start()
+    print(f"🚀 API de snapshot en http://{host}:{snapshot_server.server_port} "
+          f"(sondeo cada {interval}s)")
+
+    try:
+        poll_forever(snapshot_server, interval, mode)
+    except KeyboardInterrupt:
+        snapshot_server.shutdown()
+        print("\n👋 API de snapshot detenida")
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="API local con el snapshot de clientes de Simpat")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--interval', type=float, default=DEFAULT_INTERVAL,
+                        help=f"Segundos entre sondeos (por defecto {DEFAULT_INTERVAL})")
+    parser.add_argument('--mode', choices=['json', 'html'], default='json',
+                        help="Fuente de datos: API JSON (por defecto) o scraping HTML")
+    args = parser.parse_args()
+
+    serve(args.host, args.port, args.interval, args.mode)
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Tasas de transferencia por cliente y por usuario a partir de sondeos sucesivos.
+
+Cada sondeo se guarda como una fila de arreglos NumPy (tx, rx, visto) en un
+búfer circular de `history` sondeos; cada cliente (por MAC) tiene una columna
+fija, así que las tasas, los reinicios de contador y el top de consumo se
+calculan con operaciones vectorizadas sobre columnas alineadas, sin recorrer
+diccionarios en Python.
+
+Un contador menor que el del sondeo anterior se toma como reinicio (el
+cliente se reconectó o el AP se reinició): los bytes de ese intervalo son el
+valor nuevo del contador. Las columnas de clientes que no aparecen en ningún
+sondeo del búfer se reutilizan.
+
+    tracker = ThroughputTracker()
+    tracker.record(clients)                  # cada sondeo
+    tracker.top_talkers(10)
+    tracker.user_rates()
+"""
+
+import time
+
+import numpy as np
+
+DEFAULT_HISTORY = 10
+DEFAULT_CAPACITY = 1024
+
+class ThroughputTracker:
+    """
+    Búfer circular de contadores tx/rx por cliente, alineado por columna
+    """
+
+    def __init__(self, history=DEFAULT_HISTORY, capacity=DEFAULT_CAPACITY):
+        self.history = history
+        self.count = 0                  # sondeos registrados
+        self.times = np.full(history, np.nan)
+        self.tx = np.zeros((history, capacity), dtype=np.int64)
+        self.rx = np.zeros((history, capacity), dtype=np.int64)
+        self.seen = np.zeros((history, capacity), dtype=bool)
+        self.user_column = np.full(capacity, -1, dtype=np.int32)
+        self._columns = {}              # llave del cliente -> columna
+        self._clients = [None] * capacity  # columna -> último ClientRecord
+        self._free = []
+        self._size = 0                  # columnas usadas (incluye las libres)
+        self._user_index = {}           # userID -> índice
+        self._users = []                # índice -> SimpatUser
+
+    @property
+    def capacity(self):
+        return self.tx.shape[1]
+
+    def _release_stale(self):
+        """
+        Libera las columnas de clientes que no aparecen en ningún sondeo del búfer
+        """
+        stale = np.flatnonzero(~self.seen[:, :self._size].any(axis=0))
+        for column in stale.tolist():
+            client = self._clients[column]
+            if client is None:
+                continue  # ya estaba libre
+            self._columns.pop(client.key, None)
+            self._clients[column] = None
+            self.user_column[column] = -1
+            self._free.append(column)
+
+    def _expand(self):
+        extra = self.capacity
+        self.tx = np.concatenate([self.tx, np.zeros((self.history, extra), dtype=np.int64)], axis=1)
+        self.rx = np.concatenate([self.rx, np.zeros((self.history, extra), dtype=np.int64)], axis=1)
+        self.seen = np.concatenate([self.seen, np.zeros((self.history, extra), dtype=bool)], axis=1)
+        self.user_column = np.concatenate([self.user_column, np.full(extra, -1, dtype=np.int32)])
+        self._clients.extend([None] * extra)
+
+    def _reserve(self, keys):
+        """
+        Garantiza columnas para las llaves nuevas antes de asignarlas: primero reutiliza
+        las de clientes viejos y, si no alcanza, duplica la capacidad
+        """
+        def missing():
+            return sum(1 for key in keys if key not in self._columns)
+
+        def available():
+            return len(self._free) + self.capacity - self._size
+
+        if available() >= missing():
+            return
+        self._release_stale()
+        while available() < missing():
+            self._expand()
+
+    def _column(self):
+        if self._free:
+            return self._free.pop()
+        column = self._size
+        self._size += 1
+        return column
+
+    def _user(self, user):
+        index = self._user_index.get(user.id)
+        if index is None:
+            index = self._user_index[user.id] = len(self._users)
+            self._users.append(user)
+        return index
+
+    def record(self, clients, timestamp=None):
+        """
+        Registra un sondeo (lista de ClientRecord con tx_bytes/rx_bytes acumulados)
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        keys = [client.key for client in clients]
+        self._reserve(keys)
+        columns_by_key = self._columns
+        columns = np.empty(len(clients), dtype=np.intp)
+        users = np.empty(len(clients), dtype=np.int32)
+        tx = np.empty(len(clients), dtype=np.int64)
+        rx = np.empty(len(clients), dtype=np.int64)
+
+        for i, client in enumerate(clients):
+            key = keys[i]
+            column = columns_by_key.get(key)
+            if column is None:
+                column = columns_by_key[key] = self._column()
+            self._clients[column] = client
+            columns[i] = column
+            user = client.simpat_user
+            users[i] = self._user(user) if user is not None else -1
+            tx[i] = client.tx_bytes
+            rx[i] = client.rx_bytes
+
+        slot = self.count % self.history
+        self.seen[slot] = False
+        self.seen[slot, columns] = True
+        self.tx[slot, columns] = tx
+        self.rx[slot, columns] = rx
+        self.user_column[columns] = users
+        self.times[slot] = timestamp
+        self.count += 1
+
+    def _window_slots(self, window):
+        """
+        Filas del búfer de los últimos `window` intervalos, en orden cronológico
+        """
+        steps = min(window, self.count - 1, self.history - 1)
+        if steps < 1:
+            return None
+        last = self.count - 1
+        return np.arange(last - steps, last + 1) % self.history
+
+    def rates(self, window=1):
+        """
+        Tasas (bytes/s) de tx y rx por columna en los últimos `window` intervalos.
+        NaN para los clientes sin dos sondeos consecutivos en la ventana o ausentes en el último.
+        """
+        n = self._size
+        slots = self._window_slots(window)
+        if slots is None:
+            empty = np.full(n, np.nan)
+            return empty, empty.copy()
+
+        seen = self.seen[slots, :n]
+        valid = seen[1:] & seen[:-1]
+        elapsed = (valid * np.diff(self.times[slots])[:, None]).sum(axis=0)
+        usable = (elapsed > 0) & seen[-1]
+
+        def rate(counters):
+            counters = counters[slots, :n]
+            delta = np.diff(counters, axis=0)
+            # Reinicio de contador: lo transferido desde el reinicio es el valor nuevo
+            delta = np.where(delta < 0, counters[1:], delta)
+            transferred = (delta * valid).sum(axis=0)
+            result = np.full(n, np.nan)
+            np.divide(transferred, elapsed, out=result, where=usable)
+            return result
+
+        return rate(self.tx), rate(self.rx)
+
+    def top_talkers(self, n=10, window=1):
+        """
+        Los `n` clientes con mayor tasa total (tx + rx), de mayor a menor
+        """
+        tx_rate, rx_rate = self.rates(window)
+        total = np.nan_to_num(tx_rate + rx_rate, nan=-1.0)
+        candidates = np.flatnonzero(total >= 0)
+        if len(candidates) > n:
+            candidates = candidates[np.argpartition(-total[candidates], n - 1)[:n]]
+        candidates = candidates[np.argsort(-total[candidates], kind='stable')]
+
+        result = []
+        for column in candidates.tolist():
+            client = self._clients[column]
+            user = client.simpat_user
+            result.append({
+                'name': client.display_name,
+                'ip': client.ip or None,
+                'mac': client.mac or None,
+                'userID': user.id if user else None,
+                'hostname': user.name if user else None,
+                'tx_rate': float(tx_rate[column]),
+                'rx_rate': float(rx_rate[column]),
+            })
+        return result
+
+    def user_rates(self, window=1):
+        """
+        Tasas por usuario de Simpat (suma de sus equipos), de mayor a menor
+        """
+        tx_rate, rx_rate = self.rates(window)
+        users = self.user_column[:self._size]
+        mask = (users >= 0) & ~np.isnan(tx_rate)
+        user_count = len(self._users)
+        tx_total = np.bincount(users[mask], weights=tx_rate[mask], minlength=user_count)
+        rx_total = np.bincount(users[mask], weights=rx_rate[mask], minlength=user_count)
+        devices = np.bincount(users[mask], minlength=user_count)
+
+        order = np.argsort(-(tx_total + rx_total), kind='stable')
+        return [
+            {
+                'userID': self._users[index].id,
+                'hostname': self._users[index].name,
+                'devices': int(devices[index]),
+                'tx_rate': float(tx_total[index]),
+                'rx_rate': float(rx_total[index]),
+            }
+            for index in order.tolist() if devices[index]
+        ]
+
+def format_rate(bytes_per_second):
+    """
+    Tasa legible en bits por segundo
+    """
+    bits = bytes_per_second * 8
+    for unit in ('bps', 'Kbps', 'Mbps'):
+        if bits < 1000:
+            return f'{bits:.1f} {unit}'
+        bits /= 1000
+    return f'{bits:.1f} Gbps'
+
+def print_top_talkers(talkers):
+    print(f"\n📈 Mayor consumo ({len(talkers)} clientes)")
+    print("=" * 60)
+    for talker in talkers:
+        who = talker['hostname'] or talker['name'] or talker['mac']
+        print(f"   {who:<28} ⬆️ {format_rate(talker['tx_rate']):>12}  ⬇️ {format_rate(talker['rx_rate']):>12}")
@@ -0,0 +1,62 @@
+"""
+Configuración del controlador UniFi (.env y variables de entorno).
+
+Se lee una sola vez por proceso y solo cuando se necesita: importar este
+módulo no carga python-dotenv ni requests, así que los comandos que no hablan
+con el controlador (como `simpat.py users`) arrancan rápido.
+"""
+
+import os
+from functools import lru_cache
+from urllib.parse import urlsplit
+
+class UnifiConfig:
+    """
+    Datos de conexión al controlador
+    """
+    __slots__ = ('url', 'username', 'password', 'site', 'sites')
+
+    def __init__(self, url, username, password, site='default', sites=None):
+        self.url = url
+        self.username = username
+        self.password = password
+        self.site = site
+        self.sites = sites or [site]
+
+    @property
+    def complete(self):
+        return bool(self.url and self.username and self.password)
+
+def normalize_unifi_url(url):
+    """
+    Asegura que la URL tenga esquema (https:// por defecto) y puerto (8443 por defecto)
+    """
+    if not url:
+        return url
+
+    url = url.rstrip('/')
+    if not url.startswith(('http://', 'https://')):
+        url = f'https://{url}'
+
+    if urlsplit(url).port is None:
+        url = f'{url}:8443'
+
+    return url
+
+@lru_cache(maxsize=None)
+def get_config() -> UnifiConfig:
+    """
+    Lee el .env (si existe) y las variables de entorno; el resultado queda en caché
+    """
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    site = os.getenv('UNIFI_SITE', 'default')
+    sites = [s.strip() for s in os.getenv('UNIFI_SITES', site).split(',') if s.strip()]
+    return UnifiConfig(
+        url=normalize_unifi_url(os.getenv('UNIFI_URL')),
+        username=os.getenv('UNIFI_USERNAME'),
+        password=os.getenv('UNIFI_PASSWORD'),
+        site=site,
+        sites=sites,
+    )
@@ -0,0 +1,236 @@
+"""
+Representación compacta de clientes de UniFi.
+
+Los clientes se guardan en objetos con __slots__ (sin __dict__ por instancia) con
+la IP y la MAC empaquetadas como enteros. Para historial en bloque, ClientColumns
+guarda muchos snapshots en arreglos columnares (array) en lugar de objetos.
+"""
+
+import socket
+import struct
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Las MAC ocupan 48 bits; las llaves de clientes sin MAC se ubican por encima
+_IP_KEY_FLAG = 1 << 48
+
+def ip_to_int(ip: Optional[str]) -> int:
+    """
+    Convierte una IPv4 en entero; 0 si no hay IP o no es válida.
+    Solo acepta la forma completa de cuatro octetos: inet_aton aceptaría "10.1"
+    como 10.0.0.1 y una IP mal escrita apuntaría a otro equipo.
+    """
+    if not ip:
+        return 0
+    try:
+        return struct.unpack('!I', socket.inet_pton(socket.AF_INET, ip))[0]
+    except (OSError, TypeError):
+        return 0
+
+def int_to_ip(value: int) -> str:
+    """
+    Convierte un entero en IPv4; cadena vacía para 0
+    """
+    if not value:
+        return ''
+    return socket.inet_ntoa(struct.pack('!I', value))
+
+def mac_to_int(mac: Optional[str]) -> int:
+    """
+    Convierte una MAC (aa:bb:cc:dd:ee:ff, aa-bb-... o aabbcc...) en entero; 0 si no es válida
+    """
+    if not mac:
+        return 0
+    digits = mac.replace(':', '').replace('-', '').replace('.', '')
+    if len(digits) != 12:
+        return 0
+    try:
+        return int(digits, 16)
+    except ValueError:
+        return 0
+
+def int_to_mac(value: int) -> str:
+    """
+    Convierte un entero en MAC con formato aa:bb:cc:dd:ee:ff; cadena vacía para 0
+    """
+    if not value:
+        return ''
+    digits = f'{value:012x}'
+    return ':'.join(digits[i:i + 2] for i in range(0, 12, 2))
+
+def _counter(value) -> int:
+    """
+    Contador de bytes de la API; 0 si falta o no es numérico, para que una estación
+    con datos raros no haga fallar todo el sondeo
+    """
+    try:
+        return int(value or 0)
+    except (TypeError, ValueError):
+        return 0
+
+class ClientRecord:
+    """
+    Cliente conectado a UniFi (estación de stat/sta o extraída del HTML)
+    """
+    __slots__ = ('mac_int', 'ip_int', 'ap_mac_int', 'name', 'hostname', 'site',
+                 'controller', 'tx_bytes', 'rx_bytes', 'simpat_user')
+
+    def __init__(self, mac_int: int = 0, ip_int: int = 0, ap_mac_int: int = 0,
+                 name: Optional[str] = None, hostname: Optional[str] = None,
+                 site: Optional[str] = None, controller: Optional[str] = None,
+                 tx_bytes: int = 0, rx_bytes: int = 0, simpat_user=None):
+        self.mac_int = mac_int
+        self.ip_int = ip_int
+        self.ap_mac_int = ap_mac_int
+        self.name = name
+        self.hostname = hostname
+        self.site = site
+        self.controller = controller
+        self.tx_bytes = tx_bytes
+        self.rx_bytes = rx_bytes
+        self.simpat_user = simpat_user  # Referencia compartida al SimpatUser, no una copia
+
+    @classmethod
+    def from_api(cls, data: Dict, site: Optional[str] = None,
+                 controller: Optional[str] = None) -> 'ClientRecord':
+        """
+        Crea el registro a partir del dict de la API (o del extractor HTML)
+        """
+        return cls(
+            mac_int=mac_to_int(data.get('mac')),
+            ip_int=ip_to_int(data.get('ip') or data.get('ip_address')),
+            ap_mac_int=mac_to_int(data.get('ap_mac')),
+            name=data.get('name'),
+            hostname=data.get('hostname'),
+            site=site,
+            controller=controller,
+            tx_bytes=_counter(data.get('tx_bytes')),
+            rx_bytes=_counter(data.get('rx_bytes')),
+        )
+
+    @property
+    def ip(self) -> str:
+        return int_to_ip(self.ip_int)
+
+    @property
+    def mac(self) -> str:
+        return int_to_mac(self.mac_int)
+
+    @property
+    def ap_mac(self) -> str:
+        return int_to_mac(self.ap_mac_int)
+
+    @property
+    def display_name(self) -> Optional[str]:
+        return self.name or self.hostname
+
+    @property
+    def key(self) -> int:
+        """
+        Llave estable del cliente: su MAC, o su IP (marcada) si no tiene MAC
+        """
+        if self.mac_int:
+            return self.mac_int
+        return _IP_KEY_FLAG | self.ip_int if self.ip_int else 0
+
+    def to_dict(self) -> Dict:
+        """
+        Representación JSON del cliente
+        """
+        user = self.simpat_user
+        return {
+            'name': self.display_name,
+            'ip': self.ip or None,
+            'mac': self.mac or None,
+            'ap_mac': self.ap_mac or None,
+            'site': self.site,
+            'controller': self.controller,
+            'tx_bytes': self.tx_bytes,
+            'rx_bytes': self.rx_bytes,
+            'simpat_user': {'hostname': user.name, 'userID': user.id} if user else None,
+        }
+
+    def __repr__(self):
+        return f"ClientRecord(mac={self.mac!r}, ip={self.ip!r}, name={self.display_name!r})"
+
+class ClientColumns:
+    """
+    Historial columnar de snapshots: una fila por cliente y por snapshot, con cada
+    campo en su propio arreglo de enteros. Los usuarios se guardan como índice a
+    una tabla de IDs internados (-1 si el cliente no es de Simpat).
+    """
+    __slots__ = ('timestamps', 'offsets', 'mac', 'ip', 'ap_mac', 'tx_bytes',
+                 'rx_bytes', 'user_index', 'user_ids', '_user_positions')
+
+    def __init__(self):
+        self.timestamps = array('d')  # Un valor por snapshot
+        self.offsets = array('Q', [0])  # Fila inicial de cada snapshot (+ fin)
+        self.mac = array('Q')
+        self.ip = array('I')
+        self.ap_mac = array('Q')
+        self.tx_bytes = array('Q')
+        self.rx_bytes = array('Q')
+        self.user_index = array('i')
+        self.user_ids: List[str] = []
+        self._user_positions: Dict[str, int] = {}
+
+    def _intern_user(self, user_id: str) -> int:
+        position = self._user_positions.get(user_id)
+        if position is None:
+            position = len(self.user_ids)
+            self.user_ids.append(user_id)
+            self._user_positions[user_id] = position
+        return position
+
+    def append(self, timestamp: float, records: Iterable[ClientRecord]):
+        """
+        Agrega un snapshot completo
+        """
+        for record in records:
+            self.mac.append(record.mac_int)
+            self.ip.append(record.ip_int)
+            self.ap_mac.append(record.ap_mac_int)
+            self.tx_bytes.append(max(0, record.tx_bytes))
+            self.rx_bytes.append(max(0, record.rx_bytes))
+            user = record.simpat_user
+            self.user_index.append(self._intern_user(user.id) if user else -1)
+
+        self.timestamps.append(timestamp)
+        self.offsets.append(len(self.mac))
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    @property
+    def row_count(self) -> int:
+        return len(self.mac)
+
+    def snapshot_rows(self, index: int) -> Tuple[int, int]:
+        """
+        Rango de filas [inicio, fin) del snapshot `index`
+        """
+        return self.offsets[index], self.offsets[index + 1]
+
+    def iter_snapshots(self) -> Iterator[Tuple[float, List[Tuple[ClientRecord, Optional[str]]]]]:
+        """
+        Reconstruye los snapshots como (timestamp, [(registro, userID o None)])
+        """
+        for index, timestamp in enumerate(self.timestamps):
+            start, end = self.snapshot_rows(index)
+            rows = []
+            for row in range(start, end):
+                user_position = self.user_index[row]
+                record = ClientRecord(
+                    mac_int=self.mac[row], ip_int=self.ip[row], ap_mac_int=self.ap_mac[row],
+                    tx_bytes=self.tx_bytes[row], rx_bytes=self.rx_bytes[row],
+                )
+                rows.append((record, self.user_ids[user_position] if user_position >= 0 else None))
+            yield timestamp, rows
+
+    def nbytes(self) -> int:
+        """
+        Memoria ocupada por las columnas (sin contar la tabla de IDs)
+        """
+        columns = (self.timestamps, self.offsets, self.mac, self.ip, self.ap_mac,
+                   self.tx_bytes, self.rx_bytes, self.user_index)
+        return sum(column.itemsize * len(column) for column in columns)
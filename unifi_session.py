@@ -0,0 +1,391 @@
+"""
+Gestor de sesiones autenticadas de UniFi.
+
+Mantiene un pool de conexiones keep-alive y guarda en disco la cookie de
+autenticación y el X-CSRF-Token junto con su expiración, de modo que las
+siguientes ejecuciones reutilizan la sesión sin volver a hacer login.
+Solo se vuelve a autenticar cuando el controlador responde 401.
+
+Las peticiones GET se reintentan con backoff ante timeouts, errores de conexión
+y respuestas 429/5xx, y cada endpoint tiene su propio circuito (resilience.py).
+"""
+
+import base64
+import contextlib
+import json
+import os
+import threading
+import time
+
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+
+from metrics import metrics
+from resilience import IDEMPOTENT_METHODS, NO_RETRY, RETRYABLE_STATUS, CircuitBreaker, RetryPolicy
+# normalize_unifi_url se reexporta para los módulos que lo importaban desde aquí
+from unifi_config import normalize_unifi_url
+
+DEFAULT_CACHE_FILE = '.unifi_session.json'
+# Vigencia asumida cuando la cookie no indica su expiración
+DEFAULT_SESSION_TTL = 3600
+# Margen para no reutilizar una sesión que está a punto de expirar
+EXPIRY_MARGIN = 60
+# Timeouts separados: establecer la conexión debe ser rápido, la respuesta puede tardar más
+CONNECT_TIMEOUT = 3.05
+READ_TIMEOUT = 10
+
+def remaining_timeout(timeout, deadline):
+    """
+    Timeout (conexión, lectura) acotado a lo que falta para `deadline` (time.monotonic);
+    lanza requests.Timeout si el plazo ya venció. Sin `deadline` retorna `timeout` tal cual.
+    """
+    if deadline is None:
+        return timeout
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise requests.Timeout('Se agotó el plazo de la consulta')
+    connect, read = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+    return (min(connect, remaining), min(read, remaining))
+
+class UnifiAuthError(Exception):
+    """
+    Error de autenticación contra el controlador UniFi
+    """
+
+def _jwt_expiry(token):
+    """
+    Lee el campo `exp` de un token JWT sin validar la firma
+    """
+    try:
+        payload = token.split('.')[1]
+        payload += '=' * (-len(payload) % 4)
+        return float(json.loads(base64.urlsafe_b64decode(payload))['exp'])
+    except (IndexError, KeyError, TypeError, ValueError):
+        return None
+
+class UnifiSessionManager:
+    """
+    Sesión autenticada y reutilizable contra un controlador UniFi
+    """
+
+    def __init__(self, base_url: str, username: str, password: str,
+                 cache_file: str = DEFAULT_CACHE_FILE, pool_size: int = 10,
+                 verify: bool = False, connect_timeout: float = CONNECT_TIMEOUT,
+                 read_timeout: float = READ_TIMEOUT, retry_policy: RetryPolicy = None,
+                 failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.base_url = normalize_unifi_url(base_url)
+        self.username = username
+        self.password = password
+        self.cache_file = cache_file
+        self.csrf_token = None
+        self.expires_at = 0.0
+        self.login_count = 0
+        self.authenticated = False
+        self.timeout = (connect_timeout, read_timeout)
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.breakers = {}
+        self._lock = threading.Lock()
+
+        self.session = requests.Session()
+        self.session.verify = verify
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        if not verify:
+            # Deshabilitar advertencias SSL (certificado autofirmado del controlador)
+            urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+    @property
+    def cache_key(self):
+        return f'{self.username}@{self.base_url}'
+
+    def _read_cache_file(self):
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def load_cached_session(self) -> bool:
+        """
+        Restaura cookies y CSRF desde el caché en disco si siguen vigentes
+        """
+        if not self.cache_file:
+            return False
+
+        entry = self._read_cache_file().get(self.cache_key)
+        if not entry or entry.get('expires_at', 0) <= time.time() + EXPIRY_MARGIN:
+            return False
+
+        for cookie in entry.get('cookies', []):
+            self.session.cookies.set(
+                cookie['name'], cookie['value'],
+                domain=cookie.get('domain', ''), path=cookie.get('path', '/'),
+                expires=cookie.get('expires'), secure=cookie.get('secure', False)
+            )
+
+        self._set_csrf_token(entry.get('csrf_token'))
+        self.expires_at = entry['expires_at']
+        self.authenticated = True
+        return True
+
+    def save_session(self):
+        """
+        Guarda cookies, CSRF y expiración en el caché en disco (permisos 600)
+        """
+        if not self.cache_file:
+            return
+
+        data = self._read_cache_file()
+        data[self.cache_key] = {
+            'cookies': [
+                {
+                    'name': cookie.name,
+                    'value': cookie.value,
+                    'domain': cookie.domain,
+                    'path': cookie.path,
+                    'expires': cookie.expires,
+                    'secure': cookie.secure,
+                }
+                for cookie in self.session.cookies
+            ],
+            'csrf_token': self.csrf_token,
+            'expires_at': self.expires_at,
+        }
+
+        tmp_file = f'{self.cache_file}.tmp'
+        try:
+            fd = os.open(tmp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+            os.replace(tmp_file, self.cache_file)
+        except OSError as e:
+            print(f"⚠️ No se pudo guardar la sesión en caché: {e}")
+
+    def invalidate(self):
+        """
+        Descarta la sesión actual (en memoria)
+        """
+        self.session.cookies.clear()
+        self._set_csrf_token(None)
+        self.expires_at = 0.0
+        self.authenticated = False
+
+    def _set_csrf_token(self, token):
+        self.csrf_token = token
+        if token:
+            self.session.headers['X-CSRF-Token'] = token
+        else:
+            self.session.headers.pop('X-CSRF-Token', None)
+
+    def _session_expiry(self):
+        """
+        Calcula la expiración de la sesión a partir de las cookies recibidas
+        """
+        expiries = []
+        for cookie in self.session.cookies:
+            jwt_exp = _jwt_expiry(cookie.value) if cookie.name == 'TOKEN' else None
+            if jwt_exp:
+                expiries.append(jwt_exp)
+            elif cookie.expires:
+                expiries.append(float(cookie.expires))
+
+        return min(expiries) if expiries else time.time() + DEFAULT_SESSION_TTL
+
+    def login(self, deadline=None) -> bool:
+        """
+        Se autentica contra /api/auth/login y guarda la sesión en caché
+        """
+        print("🔐 Autenticándose...")
+        self.invalidate()
+        self.login_count += 1
+        metrics.inc('logins')
+
+        with metrics.timer('login'):
+            response = self.session.post(
+                f'{self.base_url}/api/auth/login',
+                json={'username': self.username, 'password': self.password},
+                timeout=remaining_timeout(self.timeout, deadline)
+            )
+
+        if response.status_code != 200:
+            print(f"❌ Error de autenticación: {response.status_code}")
+            metrics.inc('errors', stage='login')
+            return False
+
+        self._set_csrf_token(response.headers.get('X-CSRF-Token'))
+        self.expires_at = self._session_expiry()
+        self.authenticated = True
+        self.save_session()
+
+        print("✅ Autenticación exitosa")
+        return True
+
+    def ensure_authenticated(self, deadline=None) -> bool:
+        """
+        Garantiza una sesión válida: en memoria, desde caché o con un login nuevo
+        """
+        with self._lock:
+            if self.authenticated:
+                return True
+            if self.load_cached_session():
+                print("♻️ Reutilizando sesión en caché")
+                return True
+            return self.login(deadline)
+
+    def _relogin(self, stale_token, deadline=None):
+        """
+        Repite el login tras un 401, salvo que otro hilo ya lo haya hecho
+        """
+        with self._lock:
+            if self.authenticated and self.session.cookies.get('TOKEN') != stale_token:
+                return True
+            return self.login(deadline)
+
+    def breaker(self, path: str) -> CircuitBreaker:
+        """
+        Circuito del endpoint (uno por ruta)
+        """
+        breaker = self.breakers.get(path)
+        if breaker is None:
+            with self._lock:
+                breaker = self.breakers.setdefault(path, CircuitBreaker(
+                    f'{self.base_url}{path}', self.failure_threshold, self.reset_timeout))
+        return breaker
+
+    def circuit_open(self, path: str) -> bool:
+        breaker = self.breakers.get(path)
+        return breaker is not None and breaker.is_open
+
+    def _send(self, method, url, deadline=None, **kwargs):
+        """
+        Envía la petición; ante un 401 se autentica de nuevo y repite una vez
+        """
+        token = self.session.cookies.get('TOKEN')
+        response = self.session.request(method, url, **kwargs)
+
+        if response.status_code == 401:
+            # Se consume el cuerpo para devolver la conexión al pool en lugar de cerrarla
+            response.content
+            response.close()
+            print("🔄 Sesión expirada, autenticando de nuevo...")
+            if not self._relogin(token, deadline):
+                raise UnifiAuthError(f'No se pudo autenticar en {self.base_url}')
+            response = self.session.request(method, url, **kwargs)
+
+        return response
+
+    def request(self, method: str, path: str, retry: bool = True, deadline: float = None,
+                **kwargs) -> requests.Response:
+        """
+        Hace una petición autenticada con reintentos (solo métodos idempotentes) y
+        circuito por endpoint. Lanza CircuitOpenError si el circuito está abierto.
+        Con `deadline` (time.monotonic) el login, los intentos y las esperas entre ellos
+        quedan dentro de ese plazo: no se reintenta si la espera lo superaría.
+        Con stream=True el éxito no se registra al llegar los encabezados: usar `stream()`,
+        que lo registra (o la falla) después de leer el cuerpo.
+        """
+        if not self.ensure_authenticated(deadline):
+            raise UnifiAuthError(f'No se pudo autenticar en {self.base_url}')
+
+        timeout = kwargs.get('timeout') or self.timeout
+        url = f'{self.base_url}{path}'
+        breaker = self.breaker(path)
+        policy = self.retry_policy if retry and method.upper() in IDEMPOTENT_METHODS else NO_RETRY
+
+        for attempt in range(policy.attempts):
+            breaker.check()
+            last_attempt = attempt + 1 >= policy.attempts
+            kwargs['timeout'] = remaining_timeout(timeout, deadline)
+            try:
+                response = self._send(method, url, deadline, **kwargs)
+            except UnifiAuthError:
+                breaker.record_failure()
+                raise
+            except requests.RequestException as e:
+                breaker.record_failure()
+                delay = policy.delay(attempt)
+                if last_attempt or (deadline is not None and time.monotonic() + delay >= deadline):
+                    raise
+                metrics.inc('retries')
+                print(f"⏳ {type(e).__name__} en {path}, reintento en {delay:.1f}s")
+                time.sleep(delay)
+                continue
+
+            if response.status_code in RETRYABLE_STATUS:
+                breaker.record_failure()
+                delay = policy.delay(attempt, response.headers.get('Retry-After'))
+                if last_attempt or (deadline is not None and time.monotonic() + delay >= deadline):
+                    return response
+                response.content
+                response.close()
+                metrics.inc('retries')
+                print(f"⏳ Respuesta {response.status_code} en {path}, reintento en {delay:.1f}s")
+                time.sleep(delay)
+                continue
+
+            if not kwargs.get('stream'):
+                breaker.record_success()
+            break
+
+        # UniFi OS rota el token CSRF en algunas respuestas
+        updated_token = response.headers.get('X-Updated-CSRF-Token')
+        if updated_token and updated_token != self.csrf_token:
+            self._set_csrf_token(updated_token)
+            self.save_session()
+
+        return response
+
+    def get(self, path: str, **kwargs) -> requests.Response:
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path: str, **kwargs) -> requests.Response:
+        return self.request('POST', path, **kwargs)
+
+    @contextlib.contextmanager
+    def stream(self, path: str, **kwargs):
+        """
+        GET con stream=True para consumir el cuerpo por partes. El circuito registra el
+        resultado al terminar el bloque: solo es éxito una respuesta 2xx cuyo cuerpo se
+        leyó completo dentro del bloque; un corte, un cuerpo truncado o abandonado y
+        cualquier otro estado cuentan como falla aunque los encabezados hayan llegado bien.
+        """
+        breaker = self.breaker(path)
+        response = self.request('GET', path, stream=True, **kwargs)
+        try:
+            yield response
+        except BaseException:
+            breaker.record_failure()
+            raise
+        else:
+            # requests marca _content_consumed al agotar iter_content() o leer .content
+            if 200 <= response.status_code < 300 and response._content_consumed:
+                breaker.record_success()
+            elif response.status_code not in RETRYABLE_STATUS:
+                # Las respuestas 429/5xx ya se contaron como falla en request()
+                breaker.record_failure()
+        finally:
+            response.close()
+
+    def close(self):
+        self.session.close()
+
+_managers = {}
+_managers_lock = threading.Lock()
+
+def get_session_manager(base_url: str, username: str, password: str, **kwargs) -> UnifiSessionManager:
+    """
+    Retorna el gestor de sesión compartido del proceso para un controlador/usuario
+    """
+    key = (normalize_unifi_url(base_url), username)
+    with _managers_lock:
+        manager = _managers.get(key)
+        if manager is None:
+            manager = UnifiSessionManager(base_url, username, password, **kwargs)
+            _managers[key] = manager
+        return manager